@@ -1,13 +1,15 @@
 import os
 import json
+import hashlib
 import uuid 
 from datetime import datetime, timedelta
 from types import SimpleNamespace
 from functools import wraps
+from contextlib import contextmanager
 from pydantic import ValidationError as PydanticValidationError
-import requests
 from urllib.parse import urlparse
 import time
+import threading
 from uuid import UUID, uuid4
 import re
 from flask_login import UserMixin, login_user, LoginManager, logout_user, current_user
@@ -19,20 +21,36 @@ from flask_bcrypt import Bcrypt
 import logging
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-from sentence_transformers import SentenceTransformer, util
+from embeddings import embedding_model_key, encode_normalized, get_embedding_model, sidecar_available, text_hash
+from embedding_index import NamespaceMatrices, create_embedding_store, sync_namespace
+from ivf_index import create_vector_index
 # --- Flask-Dance for Google OAuth ---
 # LLM related imports
-from groq import RateLimitError, Groq
-from typing import Optional, List,Union
+from typing import Callable, Optional, List,Union
 from pydantic import BaseModel, Field
-import fitz  # PyMuPDF
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, g, flash
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import StrOutputParser
+from flask import Flask, request, jsonify, render_template, redirect, url_for, session, g, flash, make_response, has_request_context
+from werkzeug.http import is_resource_modified
 import secrets
-from supabase import create_client
+import click
+from auth_tokens import TokenError, create_token_verifier
+from job_catalog import LISTING_FIELDS, create_job_catalog, decode_cursor, encode_cursor
+from job_stats import empty_stats, stat_delta
+from repositories import create_repositories
+from resume_cache import create_resume_cache
+from task_queue import create_task_queue
+from stage_graph import StageGraph
+from experience_timeline import duration_years, total_experience_years
+from knockout_rules import KNOCKOUT_PASS_THRESHOLD, KnockoutRuleCache, ResumeFeatures
+from lazy import LazyModule, LazyObject
+from llm_gateway import LazyChatPrompt, LLMGateway, completion_usage, prompt_fingerprint
+from tracing import create_slow_trace_log, record_span, span, start_trace
+from metrics import (
+    observe_llm_call, observe_prompt_payload, observe_request, render_metrics, track_db, track_mail, track_pdf
+)
+from llm_cache import ResponseCache
+from prompt_serializer import PromptSerializer
+from rate_limiter import Priority, create_rate_limit_scheduler, estimate_tokens, llm_priority, set_priority, reset_priority
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -45,9 +63,38 @@ os.environ['GROQ_API_KEY'] = os.getenv('GROQ_API_KEY')
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+# Heavy SDKs load on first use rather than at import, so workers (and the CLI) start quickly;
+# warm_up() pays for them ahead of the first request when WARM_UP is set.
+groq = LazyModule('groq')
+fitz = LazyModule('fitz')  # PyMuPDF
+requests = LazyModule('requests')
+
+
+def _create_supabase_client():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+
+supabase = LazyObject(_create_supabase_client, 'supabase')
 app = Flask(__name__)
 
+
+@contextmanager
+def supabase_call(name: str):
+    """Records a Supabase call's latency and errors under `name` (e.g. 'jobs.select') and traces it."""
+    with track_db(name), span(f"db.{name}"):
+        yield
+
+
+def _request_memo() -> Optional[dict]:
+    """This request's memo of repository reads; None outside requests (worker.py, CLI commands)."""
+    return g.setdefault('repository_memo', {}) if has_request_context() else None
+
+
+# Table access goes through the repositories (see repositories.py). DATA_BACKEND=sqlite swaps
+# Supabase for a local file; sign-in and resume storage still use the Supabase client.
+repos = create_repositories(supabase, supabase_call, _request_memo)
+
 # --- App config settings ---
 app.config['UPLOAD_FOLDER'] = 'uploads'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -59,26 +106,6 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 
 
 
-# print("DEBUG: Initializing SentenceTransformer model...")
-# embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-# print("DEBUG: SentenceTransformer model initialized.")
-embedding_model = None
-
-def get_embedding_model():
-    global embedding_model
-    if embedding_model is None:
-        try:
-            print("DEBUG: Initializing SentenceTransformer model...")
-            # embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-            embedding_model = SentenceTransformer("paraphrase-MiniLM-L3-v2")
-            print("DEBUG: SentenceTransformer model initialized.")
-        except Exception as e:
-            logging.error(f"Failed to load embedding model: {e}")
-            raise
-    return embedding_model
-
-
-
 bcrypt = Bcrypt(app)
 
 
@@ -92,6 +119,80 @@ app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = ('JobStir Recruitment', app.config['MAIL_USERNAME'])
 mail = Mail(app)
 
+
+def send_mail(msg: Message, kind: str):
+    """Sends an email, recording SMTP latency and errors by kind."""
+    with track_mail(kind), span(f"mail.{kind}"):
+        mail.send(msg)
+
+# --- Background application processing ---
+# When enabled, candidate_apply only persists the upload and returns 202; `python worker.py` runs the pipeline.
+app.config['ASYNC_APPLICATIONS'] = os.getenv('ASYNC_APPLICATIONS', 'False').lower() == 'true'
+# Used to build external links (e.g. exam URLs in emails) when no browser request is active.
+app.config['APP_BASE_URL'] = os.getenv('APP_BASE_URL', 'https://www.jobstir.tech')
+application_queue = create_task_queue()
+
+# --- LLM call priorities ---
+# Candidate-facing pages are served first, then HR pages; anything outside a request
+# (e.g. worker.py) runs at background priority.
+HR_ENDPOINTS = {
+    'hr_job_upload', 'hr_dashboard', 'approve_candidate', 'project_insights', 'rescreen_job', 'top_candidates',
+    'job_applicants', 'application_details',
+}
+
+# --- Request tracing ---
+# With TRACING_ENABLED=true every response carries a Server-Timing header with its span timeline,
+# and requests slower than SLOW_REQUEST_THRESHOLD_MS are appended to the SLOW_REQUEST_LOG JSONL file.
+slow_trace_log = create_slow_trace_log()
+
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+    if slow_trace_log is not None:
+        g.trace, g.trace_token = start_trace(request.endpoint or 'unmatched')
+        g.trace.attributes.update(method=request.method, path=request.path)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started_at', None)
+    if started is not None:
+        observe_request(request.endpoint or 'unmatched', request.method, response.status_code, time.perf_counter() - started)
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.attributes['status'] = response.status_code
+        total_ms = slow_trace_log.finish(trace, g.pop('trace_token'))
+        response.headers['Server-Timing'] = trace.server_timing(total_ms)
+    return response
+
+@app.teardown_request
+def finish_unhandled_trace(exc=None):
+    # after_request does not run when a view raises; still end (and possibly log) the trace.
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.attributes['status'] = 500
+        trace.attributes['error'] = repr(exc)
+        slow_trace_log.finish(trace, g.pop('trace_token'))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint. If METRICS_TOKEN is set, requires 'Authorization: Bearer <token>'."""
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return "Unauthorized", 401
+    body, content_type = render_metrics()
+    return body, 200, {'Content-Type': content_type}
+
+@app.before_request
+def set_llm_priority():
+    priority = Priority.INTERACTIVE_HR if request.endpoint in HR_ENDPOINTS else Priority.INTERACTIVE_CANDIDATE
+    g.llm_priority_token = set_priority(priority)
+
+@app.teardown_request
+def reset_llm_priority(exc=None):
+    token = g.pop('llm_priority_token', None)
+    if token is not None:
+        reset_priority(token)
+
 # --- Helper Class ---
 class AttrDict(dict):
     """A dictionary that allows for attribute-style access."""
@@ -130,6 +231,16 @@ class KnockoutCriterion(BaseModel):
 class KnockoutQuestions(BaseModel):
     criteria: List[KnockoutCriterion]
 
+def _fetch_auth_user(access_token: str) -> Optional[str]:
+    """Remote check of an access token that cannot be verified locally; returns the user id."""
+    with supabase_call('auth.get_user'):
+        response = supabase.auth.get_user(access_token)
+    return str(response.user.id) if response and response.user else None
+
+
+token_verifier = create_token_verifier(SUPABASE_URL, SUPABASE_SERVICE_KEY, _fetch_auth_user)
+
+
 # Update your login_required decorator
 def login_required(f):
     @wraps(f)
@@ -138,19 +249,24 @@ def login_required(f):
             flash("Please log in to access this page.", "warning")
             return redirect(url_for('login'))
         
-        # Optional: Verify the session is still valid with Supabase
+        # Verify the stored Supabase token locally; Supabase is only asked when that isn't possible.
+        user_session = session.get('user_session') or {}
         try:
-            user = supabase.auth.get_user()
-            if not user.user:
-                flash("Your session has expired. Please log in again.", "warning")
-                session.clear()
-                return redirect(url_for('login'))
-        except:
-            # If verification fails, clear session and redirect to login
+            with span('auth.verify'):
+                claims, current_session = token_verifier.authenticate(user_session)
+            if claims.get('sub') != session['user_info'].get('id'):
+                raise TokenError("access token belongs to another user")
+        except TokenError as e:
+            logging.info(f"Session rejected: {e}")
             flash("Your session has expired. Please log in again.", "warning")
             session.clear()
             return redirect(url_for('login'))
-            
+        if current_session is not user_session:
+            # The token was renewed with the refresh token; keep the new pair in the cookie,
+            # which makes the ledger's copy of it unnecessary.
+            session['user_session'] = current_session
+            token_verifier.discard_renewal(user_session.get('refresh_token'))
+
         return f(*args, **kwargs)
     return decorated_function
 def hr_required(f):
@@ -165,6 +281,10 @@ def hr_required(f):
 
 def extract_text_from_pdf(file_content: bytes) -> str:
     """Extracts text from a PDF file's byte content."""
+    with track_pdf(), span('pdf.extract'):
+        return _extract_text_from_pdf(file_content)
+
+def _extract_text_from_pdf(file_content: bytes) -> str:
     try:
         # Open the PDF directly from the in-memory byte content
         with fitz.open(stream=file_content, filetype="pdf") as doc:
@@ -281,13 +401,40 @@ class Exam(BaseModel):
     questions: List[ExamQuestion] = Field(..., description="List of exam questions")
 
 # LLM Chain Setup
-llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
-parser = StrOutputParser()
-
-# Initialize Groq client for chat completions (used in get_resume_score_with_breakdown)
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-resume_extraction_prompt = ChatPromptTemplate.from_messages([
+# Every LLM call goes through the gateway: pooled keep-alive connections, one retry/backoff policy,
+# and per-call latency reporting. `llm_gateway.client` is the raw Groq client (used in get_resume_score_with_breakdown).
+# A shared token-bucket scheduler admits calls by priority so all workers stay under the Groq RPM/TPM quota.
+# Temperature-0 completions are cached so re-scoring identical inputs costs nothing;
+# LLM_CACHE_DISABLED_CHAINS (comma-separated chain names) opts chains out.
+llm_gateway = LLMGateway(
+    max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', 20)),
+    scheduler=create_rate_limit_scheduler(),
+    response_cache=ResponseCache(
+        max_entries=int(os.getenv('LLM_CACHE_SIZE', 1024)),
+        ttl=float(os.getenv('LLM_CACHE_TTL', 24 * 3600))
+    ),
+    cache_disabled_chains=[name.strip() for name in os.getenv('LLM_CACHE_DISABLED_CHAINS', '').split(',') if name.strip()]
+)
+llm_gateway.add_listener(observe_llm_call)
+llm_gateway.add_listener(lambda record: record_span(f"llm.{record.name}" + (".cached" if record.cached else ""), record.latency))
+
+# Chain inputs are serialized compactly (no indentation, empty fields pruned, whitespace collapsed)
+# and cut to a per-input token budget; input tokens are what run into the Groq TPM limit.
+prompt_serializer = PromptSerializer(listener=observe_prompt_payload)
+RESUME_PROMPT_TOKEN_BUDGET = int(os.getenv('RESUME_PROMPT_TOKEN_BUDGET', 2500))
+JOB_DESC_TOKEN_BUDGET = int(os.getenv('JOB_DESC_TOKEN_BUDGET', 3000))
+README_TOKEN_BUDGET = int(os.getenv('README_TOKEN_BUDGET', 4000))
+
+
+def resume_payload(chain_name: str, resume_json: dict) -> str:
+    return prompt_serializer.json(chain_name, resume_json, token_budget=RESUME_PROMPT_TOKEN_BUDGET)
+
+
+def job_desc_payload(chain_name: str, job_description: str) -> str:
+    return prompt_serializer.text(chain_name, job_description, token_budget=JOB_DESC_TOKEN_BUDGET)
+
+
+resume_extraction_prompt = LazyChatPrompt([
     ("system",
      "You are a professional resume parser. Extract and align the following fields from the resume text into a JSON object:\n\n"
      "name (string), email (string), phone (string), "
@@ -303,7 +450,8 @@ resume_extraction_prompt = ChatPromptTemplate.from_messages([
      "You must always return valid JSON fenced by a markdown code block. Do not return any additional text."),
     ("human", "{text}")
 ])
-extraction_chain = resume_extraction_prompt | llm | parser
+# Resume extractions have their own content-addressed cache (see parse_resume_pdf), so skip the response cache here.
+extraction_chain = llm_gateway.chain("resume_extraction", resume_extraction_prompt, model="llama-3.3-70b-versatile", temperature=0, cache=False)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 class ResumeExtractionError(Exception):
     """Custom exception for errors during resume extraction."""
@@ -314,58 +462,82 @@ def extract_resume_info_llm(text: str) -> dict:
     Extracts structured resume information using the LLM chain.
     Raises ResumeExtractionError on failure.
     """
-    max_retries = 3
-    initial_retry_delay = 5
     raw_json_str = ""  # Initialize for error logging
 
-    for attempt in range(max_retries):
-        try:
-            raw_json_str = extraction_chain.invoke({"text": text})
-            cleaned_json_str = re.sub(r'^```(?:json)?\n|```$', '', raw_json_str.strip(), flags=re.MULTILINE)
-            
-            if not cleaned_json_str:
-                raise ResumeExtractionError("LLM returned an empty response.")
-
-            parsed_dict = json.loads(cleaned_json_str)
-            print(parsed_dict)  # For debugging purposes
-            # Handle the case where the LLM returns a list of phone numbers
-            if isinstance(parsed_dict.get('phone'), list):
-                logging.debug("Multiple phone numbers found; converting list to a single string.")
-                parsed_dict['phone'] = ', '.join(map(str, parsed_dict['phone']))
-
-            validated_info = ResumeInfo(**parsed_dict)
-            extracted_data = validated_info.model_dump(exclude_none=True)
-            
-            logging.info("Successfully extracted and validated resume data.")
-            
-            return extracted_data
-            
-        except RateLimitError as e:
-            logging.warning(f"Rate limit hit (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                sleep_time = initial_retry_delay * (2 ** attempt)
-                time.sleep(sleep_time)
-            else:
-                # Raise the custom exception after the final attempt
-                raise ResumeExtractionError("Failed due to persistent rate limits.") from e
-            
-        except (json.JSONDecodeError, PydanticValidationError) as e:
-            # For parsing/validation errors, fail immediately and raise the custom exception
-            logging.error(f"Failed to parse or validate LLM output. Raw response: {raw_json_str}")
-            raise ResumeExtractionError(f"Invalid data structure from LLM: {e}") from e
+    try:
+        raw_json_str = extraction_chain.invoke({"text": prompt_serializer.text("resume_extraction", text)})
+        cleaned_json_str = re.sub(r'^```(?:json)?\n|```$', '', raw_json_str.strip(), flags=re.MULTILINE)
+        
+        if not cleaned_json_str:
+            raise ResumeExtractionError("LLM returned an empty response.")
+
+        parsed_dict = json.loads(cleaned_json_str)
+        print(parsed_dict)  # For debugging purposes
+        # Handle the case where the LLM returns a list of phone numbers
+        if isinstance(parsed_dict.get('phone'), list):
+            logging.debug("Multiple phone numbers found; converting list to a single string.")
+            parsed_dict['phone'] = ', '.join(map(str, parsed_dict['phone']))
+
+        validated_info = ResumeInfo(**parsed_dict)
+        extracted_data = validated_info.model_dump(exclude_none=True)
+        
+        logging.info("Successfully extracted and validated resume data.")
+        
+        return extracted_data
+        
+    except groq.RateLimitError as e:
+        # The gateway has already retried with backoff
+        raise ResumeExtractionError("Failed due to persistent rate limits.") from e
+        
+    except ResumeExtractionError:
+        raise
 
-        except Exception as e:
-            # Catch any other unexpected errors
-            logging.error(f"An unexpected error occurred during resume extraction. Raw response: {raw_json_str}")
-            raise ResumeExtractionError(f"An unexpected error occurred: {e}") from e
+    except (json.JSONDecodeError, PydanticValidationError) as e:
+        # For parsing/validation errors, fail immediately and raise the custom exception
+        logging.error(f"Failed to parse or validate LLM output. Raw response: {raw_json_str}")
+        raise ResumeExtractionError(f"Invalid data structure from LLM: {e}") from e
+
+    except Exception as e:
+        # Catch any other unexpected errors
+        logging.error(f"An unexpected error occurred during resume extraction. Raw response: {raw_json_str}")
+        raise ResumeExtractionError(f"An unexpected error occurred: {e}") from e
+
+# Changing the extraction prompt or model produces a new version, so stale cache entries are never served.
+RESUME_PROMPT_VERSION = prompt_fingerprint(resume_extraction_prompt, "llama-3.3-70b-versatile")
+resume_cache = create_resume_cache()
+
+def parse_resume_pdf(file_content: bytes) -> tuple:
+    """
+    Returns (resume_text, extracted_info) for an uploaded PDF.
+    Identical uploads are served from the resume cache without any PDF parsing or LLM call.
+    extracted_info is None when no text could be extracted from the PDF.
+    Raises ResumeExtractionError if the LLM extraction fails.
+    """
+    cache_key = resume_cache.make_key(file_content, RESUME_PROMPT_VERSION)
+    cached = resume_cache.get(cache_key)
+    if cached:
+        logging.info("Resume cache hit; skipping PDF parsing and LLM extraction.")
+        extracted_info = cached['extracted_info']
+        if isinstance(extracted_info, dict) and 'total_experience_years' not in extracted_info:
+            extracted_info['total_experience_years'] = total_experience_years(extracted_info.get('experience', []))
+        return cached['resume_text'], extracted_info
+
+    resume_text = extract_text_from_pdf(file_content)
+    if not resume_text:
+        return "", None
+
+    extracted_info = extract_resume_info_llm(resume_text)
+    # Experience is computed once here and stored with the resume; screening and scoring read it back.
+    if isinstance(extracted_info, dict):
+        extracted_info['total_experience_years'] = total_experience_years(extracted_info.get('experience', []))
+    resume_cache.set(cache_key, {"resume_text": resume_text, "extracted_info": extracted_info})
+    return resume_text, extracted_info
 
 # New LLM Chain for Knockout Questions
-knockout_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0, max_tokens=5000)
-knockout_parser = StrOutputParser()
 
 # In app_trial.py, use this ultra-strict prompt for knockout generation
 
-knockout_question_prompt = ChatPromptTemplate.from_messages([
+knockout_question_prompt = LazyChatPrompt([
     ("system",
      """You are 'Recruiter-Prime v6.0', a JSON-only extraction AI. Your single function is to extract hard knockout criteria from a job description.
 
@@ -397,7 +569,16 @@ Now, process the following job description according to these unbreakable rules.
     ("human", "Analyze this Job Description:\n{job_desc}")
 ])
 
-knockout_chain = knockout_question_prompt | knockout_llm | knockout_parser
+def _parse_knockout_questions(raw: str) -> KnockoutQuestions:
+    """Validates the model's knockout criteria, tolerating text around the JSON object."""
+    match = re.search(r'\{.*\}', raw, re.DOTALL)
+    if not match:
+        raise json.JSONDecodeError("No valid JSON object found in LLM response.", raw, 0)
+    return KnockoutQuestions(**json.loads(match.group(0)))
+
+
+knockout_chain = llm_gateway.chain("knockout_generation", knockout_question_prompt, model="llama-3.3-70b-versatile", temperature=0, max_tokens=5000,
+                                   validate=_parse_knockout_questions)
 
 # --- Define a custom exception for this specific task ---
 class KnockoutGenerationError(Exception):
@@ -409,92 +590,47 @@ def generate_knockout_questions_llm(job_description: str) -> dict:
     Generates structured knockout questions from a job description.
     Raises KnockoutGenerationError on failure.
     """
+    # Rate limits are retried by the gateway; this loop only re-asks when the output is malformed
+    # (malformed replies are never cached, so each retry reaches the model).
     max_retries = 3
-    initial_retry_delay = 5
 
     for attempt in range(max_retries):
         try:
             # 1. Invoke the LLM
-            raw_json_str = knockout_chain.invoke({"job_desc": job_description})
-            
-            # 2. Reliably find the JSON object in the response
-            match = re.search(r'\{.*\}', raw_json_str, re.DOTALL)
-            if not match:
-                raise json.JSONDecodeError("No valid JSON object found in LLM response.", raw_json_str, 0)
+            raw_json_str = knockout_chain.invoke({"job_desc": job_desc_payload("knockout_generation", job_description)})
             
-            json_content = match.group(0)
-            
-            # 3. Parse and validate the data
-            parsed_dict = json.loads(json_content)
-            validated_knockout = KnockoutQuestions(**parsed_dict)
+            # 2. Find, parse and validate the JSON object in the response
+            validated_knockout = _parse_knockout_questions(raw_json_str)
             
             logging.info("Successfully generated and validated knockout questions.")
             return validated_knockout.model_dump(exclude_none=True)
             
-        except RateLimitError as e:
-            logging.warning(f"Rate limit hit (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt >= max_retries - 1: # If it's the last attempt
-                raise KnockoutGenerationError("Failed due to persistent rate limits.") from e
-            time.sleep(initial_retry_delay * (2 ** attempt))
+        except groq.RateLimitError as e:
+            raise KnockoutGenerationError("Failed due to persistent rate limits.") from e
 
-        except (json.JSONDecodeError, ValidationError) as e:
+        except (json.JSONDecodeError, PydanticValidationError) as e:
             # This is the key improvement: retry on flaky LLM output
             logging.warning(f"Parsing/validation failed (attempt {attempt + 1}/{max_retries}): {e}")
             if attempt >= max_retries - 1: # If it's the last attempt
                 raise KnockoutGenerationError("Failed to parse or validate LLM response after multiple attempts.") from e
-            time.sleep(initial_retry_delay) # Wait a short time before retrying
     
     # This line is reached if the loop completes without a successful return
     raise KnockoutGenerationError("Failed to generate knockout questions after all retries.")
 
 def _parse_duration_to_years(duration_str: str) -> float:
+    """Years covered by one duration string (month-precise; see experience_timeline.py)."""
+    return duration_years(duration_str)
+
+
+def resume_experience_years(resume_json: dict) -> float:
     """
-    An improved helper function to parse different duration formats into a total number of years.
-    It more accurately handles same-year ranges and prioritizes explicit year/month text.
+    Distinct years of experience for a parsed resume, with overlapping roles merged.
+    Uses the value stored at extraction time and only recomputes it for older records.
     """
-    if not duration_str:
-        return 0.0
-
-    duration_str = duration_str.strip()
-    total_years = 0.0
-
-    # --- IMPROVEMENT 1: Prioritize explicit "X years Y months" text first ---
-    years_match = re.search(r'(\d+)\s*year', duration_str, re.IGNORECASE)
-    months_match = re.search(r'(\d+)\s*month', duration_str, re.IGNORECASE)
-
-    if years_match or months_match:
-        if years_match:
-            total_years += float(years_match.group(1))
-        if months_match:
-            total_years += float(months_match.group(1)) / 12.0
-        return round(total_years, 2)
-
-    # --- Case 2: Handle date ranges like "2021 - 2023" or "Jan 2022 - Present" ---
-    # Use word boundaries (\b) to avoid matching year-like numbers in company names
-    range_match = re.findall(r'\b(\d{4})\b', duration_str)
-    
-    if len(range_match) >= 1:
-        start_year = int(range_match[0])
-        end_year = 0
-
-        if 'present' in duration_str.lower() or 'current' in duration_str.lower():
-            end_year = datetime.now().year
-        elif len(range_match) == 2:
-            end_year = int(range_match[1])
-
-        if end_year > 0:
-            # --- IMPROVEMENT 2: More precise calculation for date ranges ---
-            year_diff = end_year - start_year
-            # If the duration is within the same year, count it as a partial year (e.g., 0.5)
-            # instead of a full 1.0, as it's likely less than a full year's experience.
-            if year_diff == 0:
-                return 0.5
-            return float(year_diff)
-            
-    # Return 0.0 if no parsable format is found
-    return 0.0
-
-KNOCKOUT_PASS_THRESHOLD = 50
+    stored = resume_json.get('total_experience_years')
+    if isinstance(stored, (int, float)) and not isinstance(stored, bool):
+        return float(stored)
+    return total_experience_years(resume_json.get('experience', []))
 
 
 # Add these new Pydantic models with your other models
@@ -507,7 +643,7 @@ class ValidationResult(BaseModel):
 class ValidationResponse(BaseModel):
     results: List[ValidationResult]
 
-validation_prompt = ChatPromptTemplate.from_messages([
+validation_prompt = LazyChatPrompt([
     ("system",
      """You are 'Recruiter-Prime v4.1', the final validation layer for knockout criteria.
 
@@ -540,127 +676,48 @@ CRITERIA TYPES & RULES
 ======================
 OUTPUT FORMAT
 ======================
-Return ONLY valid JSON with the exact structure below:
-{{{{
-  "results": [
-    {{{{
-      "criterion_type": "<experience_years|education|location>",
-      "is_met": true|false,
-      "reasoning": "<brief reason>",
-      "evidence": "<exact text snippet from resume JSON>"
-    }}}}
-  ]
-}}}}
-
-- Response MUST start with '{{{{' and end with '}}}}'.
-- No markdown, no extra explanations outside JSON.
+Return ONLY valid JSON with exactly this structure, no markdown and no text outside the JSON:
+{{"results":[{{"criterion_type":"<experience_years|education|location>","is_met":true|false,"reasoning":"<brief reason>","evidence":"<exact text snippet from resume JSON>"}}]}}
 
 ======================
-FEW-SHOT EXAMPLES
+EXAMPLES
 ======================
-
-Example 1 - Experience met
-Resume JSON:
-{{{{
-  "experience": [
-    {{"duration": "2019-2023", "title": "Software Engineer"}}
-  ]
-}}}}
-Criteria:
-{{{{
-  "criteria": [
-    {{"type": "experience_years", "value": 3}}
-  ]
-}}}}
-Output:
-{{{{
-  "results": [
-    {{{{
-      "criterion_type": "experience_years",
-      "is_met": true,
-      "reasoning": "4 years >= 3 required",
-      "evidence": "duration: 2019-2023"
-    }}}}
-  ]
-}}}}
-
-Example 2 - Education met
-Resume JSON:
-{{{{
-  "education": [
-    {{"degree": "B.Sc. in Computer Science"}}
-  ]
-}}}}
-Criteria:
-{{{{
-  "criteria": [
-    {{"type": "education", "value": "Bachelor's degree in Computer Science"}}
-  ]
-}}}}
-Output:
-{{{{
-  "results": [
-    {{{{
-      "criterion_type": "education",
-      "is_met": true,
-      "reasoning": "B.Sc equals Bachelor's in Computer Science",
-      "evidence": "degree: B.Sc. in Computer Science"
-    }}}}
-  ]
-}}}}
-
-Example 3 - Location not met
-Resume JSON:
-{{{{
-  "location": "San Francisco"
-}}}}
-Criteria:
-{{{{
-  "criteria": [
-    {{"type": "location", "value": "New York City"}}
-  ]
-}}}}
-Output:
-{{{{
-  "results": [
-    {{{{
-      "criterion_type": "location",
-      "is_met": false,
-      "reasoning": "Candidate location is San Francisco, required is New York City",
-      "evidence": "location: San Francisco"
-    }}}}
-  ]
-}}}}
-
-
-
+1. Resume: {{"experience":[{{"duration":"2019-2023","title":"Software Engineer"}}]}}
+   Criteria: {{"criteria":[{{"type":"experience_years","value":3}}]}}
+   Output: {{"results":[{{"criterion_type":"experience_years","is_met":true,"reasoning":"4 years >= 3 required","evidence":"duration: 2019-2023"}}]}}
+2. Resume: {{"education":[{{"degree":"B.Sc. in Computer Science"}}]}}
+   Criteria: {{"criteria":[{{"type":"education","value":"Bachelor's degree in Computer Science"}}]}}
+   Output: {{"results":[{{"criterion_type":"education","is_met":true,"reasoning":"B.Sc equals Bachelor's in Computer Science","evidence":"degree: B.Sc. in Computer Science"}}]}}
+3. Resume: {{"location":"San Francisco"}}
+   Criteria: {{"criteria":[{{"type":"location","value":"New York City"}}]}}
+   Output: {{"results":[{{"criterion_type":"location","is_met":false,"reasoning":"Candidate location is San Francisco, required is New York City","evidence":"location: San Francisco"}}]}}
 """),
     ("human", 
      "**Candidate Resume (JSON):**\n{resume_json}\n\n"
      "**Knockout Criteria to Validate:**\n{criteria_json}\n\n"
      "Check each criterion and return the JSON result array.")
 ])
+# NOTE: You might want to use a less powerful model here to save costs if needed,
+# but llama-3.3-70b-versatile will provide the highest quality analysis.
+def _parse_validation_response(raw: str) -> ValidationResponse:
+    match = re.search(r'\{.*\}', raw, re.DOTALL)
+    if not match:
+        raise json.JSONDecodeError("No valid JSON object found in validation response.", raw, 0)
+    return ValidationResponse(**json.loads(match.group(0)))
+
+
+validation_chain = llm_gateway.chain("knockout_validation", validation_prompt, model="llama-3.3-70b-versatile", temperature=0, max_tokens=5000,
+                                     validate=_parse_validation_response)
+
 # This is the new function that replaces 'check_knockout_criteria'
 def validate_knockout_criteria_llm(resume_json: dict, criteria: dict) -> dict:
     """Uses a dedicated validation chain to check criteria against a resume."""
-    # NOTE: You might want to use a less powerful model here to save costs if needed,
-    # but llama-3.3-70b-versatile will provide the highest quality analysis.
-    validation_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0, max_tokens=5000)
-    validation_chain = validation_prompt | validation_llm | StrOutputParser()
-    
     try:
         raw_response = validation_chain.invoke({
-            "resume_json": json.dumps(resume_json, indent=2),
-            "criteria_json": json.dumps(criteria, indent=2)
+            "resume_json": resume_payload("knockout_validation", resume_json),
+            "criteria_json": prompt_serializer.json("knockout_validation", criteria)
         })
-        
-        match = re.search(r'\{.*\}', raw_response, re.DOTALL)
-        if not match:
-            raise json.JSONDecodeError("No valid JSON object found in validation response.", raw_response, 0)
-        
-        json_content = match.group(0)
-        parsed_dict = json.loads(json_content)
-        validated_response = ValidationResponse(**parsed_dict)
+        validated_response = _parse_validation_response(raw_response)
         
         # Process the results from the AI validator
         met_criteria = []
@@ -707,104 +764,260 @@ def validate_knockout_criteria_llm(resume_json: dict, criteria: dict) -> dict:
         return {"passed": False, "score": 0, "met_criteria": [], "missed_criteria": [], "reason": f"Failed during validation: {e}"}
 
 
-def _check_experience(criterion: dict, total_years: float) -> bool:
-    try: return total_years >= float(criterion.get('value', 999))
-    except (ValueError, TypeError): return False
+# Knockout criteria are compiled once per job (see knockout_rules.py); each application only
+# evaluates the precompiled predicates against its resume features.
+knockout_rule_cache = KnockoutRuleCache(max_entries=int(os.getenv('KNOCKOUT_RULE_CACHE_SIZE', 512)))
 
-def _check_education(criterion: dict, education_entries: list) -> bool:
-    DEGREE_ALIASES = {"bachelor": ["b.sc", "b.s.", "b.a.", "bachelor"], "master": ["m.sc", "m.s.", "master"], "phd": ["ph.d.", "phd", "doctorate"]}
-    required_keywords = [k.lower() for k in criterion.get('keywords', [])]
-    if not required_keywords: return False
-    education_text = ' '.join(f"{edu.get('degree', '')}" for edu in education_entries).lower()
-    for keyword in required_keywords:
-        aliases = DEGREE_ALIASES.get(keyword, [keyword])
-        if any(alias in education_text for alias in aliases):
-            return True
-    return False
 
-def _check_location(criterion: dict, resume_json: dict) -> bool:
-    try:
-        required_location = str(criterion.get('value', 'a_very_unlikely_string')).lower()
-        searchable_text = json.dumps(resume_json.get('experience', []) + resume_json.get('education', [])).lower()
-        if required_location in searchable_text: return True
-        # Check top-level contact info as well
-        return required_location in f"{resume_json.get('name', '')} {resume_json.get('phone', '')}".lower()
-    except Exception: return False
+# The job board is read on every visit to / and candidate_apply but only changes when HR posts a
+# job, so it is served from memory (see job_catalog.py); hr_job_upload invalidates it.
+job_catalog = create_job_catalog(repos.jobs.all, repos.jobs.get)
+JOBS_PAGE_SIZE = int(os.getenv('JOBS_PAGE_SIZE', 12))
+MAX_JOBS_PAGE_SIZE = 100
 
-#########################################################################
 
+# Job descriptions are embedded once, when the job is posted (or by `flask sync-job-embeddings`).
+# Small catalogs are searched exactly from one in-memory matrix; past ANN_MIN_ITEMS jobs an IVF
+# index shared by all workers through mmap takes over (see ivf_index.py).
+JOB_EMBEDDING_NAMESPACE = 'jobs'
+RECOMMENDED_JOBS_COUNT = 5
+embedding_store = create_embedding_store()
+job_index = create_vector_index(embedding_store, JOB_EMBEDDING_NAMESPACE, embedding_model_key())
+_job_embeddings_backfill_lock = threading.Lock()
+_job_embeddings_backfilled = False
 
-def check_knockout_criteria_python(resume_json: dict, job_obj: dict) -> dict:
-    knockout_data = job_obj.get("knockout_questions_json", {})
-    if isinstance(knockout_data, str):
-        try:
-            knockout_data = json.loads(knockout_data)
-        except json.JSONDecodeError:
-            knockout_data = {}
 
-    all_criteria = knockout_data.get("criteria", [])
-    if not all_criteria:
-        return {
-            "passed": True,
-            "score": 100,
-            "met_criteria": [],
-            "missed_criteria": [],
-            "reason": "No knockout criteria defined."
-        }
+def index_job_embedding(job_id: str, job_description: str):
+    """Embeds one job's description and makes it visible to this worker's matrix right away."""
+    if not job_description:
+        embedding_store.delete(JOB_EMBEDDING_NAMESPACE, [job_id])
+    else:
+        with span('embedding.encode'):
+            vector = encode_normalized([job_description])[0]
+        embedding_store.upsert(JOB_EMBEDDING_NAMESPACE, job_id, vector, embedding_model_key(), text_hash(job_description))
+    job_index.refresh(force=True)
 
-    met_criteria = []
-    missed_criteria = []
 
-    total_candidate_years = sum(
-        _parse_duration_to_years(exp.get('duration', ''))
-        for exp in resume_json.get('experience', [])
+def sync_job_embeddings() -> dict:
+    """Brings the job embeddings in line with the jobs table: new, edited and deleted jobs."""
+    jobs = repos.jobs.all(('id', 'job_description'))
+    result = sync_namespace(
+        embedding_store, JOB_EMBEDDING_NAMESPACE,
+        {str(job['id']): job.get('job_description') for job in jobs},
+        encode_normalized, embedding_model_key(), text_hash
     )
+    job_index.refresh(force=True)
+    return result
+
+
+def recommend_jobs(resume_text: str, count: int = RECOMMENDED_JOBS_COUNT) -> list:
+    """The jobs whose descriptions are most similar to the resume, best first."""
+    global _job_embeddings_backfilled
+    job_index.refresh()
+    if not len(job_index) and not _job_embeddings_backfilled:
+        # First request after a deploy with an empty store: embed the existing catalog once.
+        with _job_embeddings_backfill_lock:
+            if not _job_embeddings_backfilled:
+                logging.info(f"Job embeddings are empty; backfilling: {sync_job_embeddings()}")
+                _job_embeddings_backfilled = True
+
+    with span('embedding.encode'):
+        resume_embedding = encode_normalized([resume_text])[0]
+    # Ask for a few extra in case some were deleted from Supabase since the last sync.
+    matches = job_index.top_k(resume_embedding, count * 2)
+    if not matches:
+        return []
+
+    jobs = repos.jobs.by_ids([job_id for job_id, _ in matches], ('id', 'job_title', 'company_name'))
+    jobs_by_id = {str(job['id']): job for job in jobs}
+
+    recommended = []
+    for job_id, score in matches:
+        job = jobs_by_id.get(job_id)
+        if job is None:
+            continue
+        recommended.append({
+            'job_id': job['id'],
+            'job_title': job['job_title'],
+            'company_name': job['company_name'],
+            'score': score
+        })
+    return recommended[:count]
 
-    for criterion in all_criteria:
-        ctype = criterion.get("type", "").lower()
 
-        if ctype == "experience_years":
-            if _check_experience(criterion, total_candidate_years):
-                met_criteria.append(criterion)
-            else:
-                missed_criteria.append(criterion)
+# Applicant profiles are embedded while the application is evaluated and stored per job
+# ('applicants:<job_id>'), so HR can rank a job's applicants without re-encoding anything.
+# Per-job applicant counts are small, so each job gets an exact matrix rather than an IVF index.
+applicant_embeddings = NamespaceMatrices(
+    embedding_store, embedding_model_key(),
+    max_namespaces=int(os.getenv('APPLICANT_INDEX_MAX_JOBS', 256)),
+    refresh_interval=float(os.getenv('JOB_EMBEDDINGS_REFRESH_SECONDS', 5))
+)
+_applicant_embeddings_synced = set()
 
-        elif ctype == "education":
-            if _check_education(criterion, resume_json.get("education", [])):
-                met_criteria.append(criterion)
-            else:
-                missed_criteria.append(criterion)
 
-        elif ctype == "location":
-            if _check_location(criterion, resume_json):
-                met_criteria.append(criterion)
-            else:
-                missed_criteria.append(criterion)
+def applicant_namespace(job_id) -> str:
+    return f"applicants:{job_id}"
 
-    total_criteria_count = len(all_criteria)
-    met_count = len(met_criteria)
-    score = (met_count / total_criteria_count) * 100 if total_criteria_count > 0 else 100
-    passed = score >= 50
 
-    final_reason = f"Candidate met {met_count} of {total_criteria_count} mandatory criteria ({int(score)}%)."
+def _as_text(value) -> str:
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value if item)
+    return str(value or '')
 
-    return {
-        "passed": passed,
-        "score": int(score),
-        "met_criteria": met_criteria,
-        "missed_criteria": missed_criteria,
-        "reason": final_reason
+
+def candidate_profile_text(extracted_info: dict) -> str:
+    """
+    What a parsed resume says the candidate does, most telling parts first: the embedding
+    model only reads the first ~128 tokens. Contact details are left out.
+    """
+    info = extracted_info or {}
+    experience = [e for e in info.get('experience') or [] if isinstance(e, dict)]
+    projects = [p for p in info.get('projects') or [] if isinstance(p, dict)]
+    education = [e for e in info.get('education') or [] if isinstance(e, dict)]
+
+    lines = []
+    if info.get('skills'):
+        lines.append("Skills: " + ', '.join(str(skill) for skill in info['skills']))
+    if experience:
+        lines.append("Experience: " + '; '.join(
+            ' at '.join(filter(None, (e.get('title'), e.get('company')))) for e in experience
+        ))
+    if projects:
+        lines.append("Projects: " + '; '.join(str(p.get('title') or '') for p in projects))
+    if education:
+        lines.append("Education: " + '; '.join(
+            ' in '.join(filter(None, (e.get('degree'), e.get('concentration')))) for e in education
+        ))
+    lines.extend(_as_text(e.get('description')) for e in experience)
+    lines.extend(_as_text(p.get('description')) for p in projects)
+    return '\n'.join(line for line in lines if line.strip())
+
+
+def embed_candidate_profile(extracted_info: dict):
+    """The normalized profile vector, or None if the profile is empty or encoding failed."""
+    text = candidate_profile_text(extracted_info)
+    if not text:
+        return None
+    try:
+        with span('embedding.encode'):
+            return encode_normalized([text])[0]
+    except Exception as e:
+        logging.error(f"Could not embed candidate profile: {e}")
+        return None
+
+
+def store_applicant_embedding(job_id, application_id, extracted_info: dict, vector):
+    if vector is None:
+        return
+    embedding_store.upsert(
+        applicant_namespace(job_id), str(application_id), vector,
+        embedding_model_key(), text_hash(candidate_profile_text(extracted_info))
+    )
+
+
+def sync_applicant_embeddings(job_id) -> dict:
+    """Embeds a job's applications that have no (or an outdated) profile embedding."""
+    applications = repos.applications.for_job(job_id, ('id', 'extracted_info'), page_size=RESCREEN_PAGE_SIZE)
+    result = sync_namespace(
+        embedding_store, applicant_namespace(job_id),
+        {str(application['id']): candidate_profile_text(application.get('extracted_info')) for application in applications},
+        encode_normalized, embedding_model_key(), text_hash
+    )
+    _applicant_embeddings_synced.add(str(job_id))
+    return result
+
+
+def check_knockout_criteria_python(resume_json: dict, job_obj: dict) -> dict:
+    rules = knockout_rule_cache.get(job_obj)
+    return rules.evaluate(ResumeFeatures(resume_json, resume_experience_years))
+
+
+RESCREEN_PAGE_SIZE = 1000
+RESCREEN_UPDATE_BATCH = 500
+
+
+def rescreen_job_applications(job: dict) -> dict:
+    """
+    Re-runs knockout screening for every application of a job and writes back only the
+    `knockout_analysis` values that changed. Applications that end up with the same
+    result are updated together, RESCREEN_UPDATE_BATCH ids per request.
+    """
+    started = time.perf_counter()
+    knockout_rule_cache.invalidate(job['id'])
+    rules = knockout_rule_cache.get(job)
+
+    applications = repos.applications.for_job(job['id'], ('id', 'extracted_info', 'knockout_analysis'),
+                                              page_size=RESCREEN_PAGE_SIZE)
+    loaded_at = time.perf_counter()
+
+    results = [rules.evaluate(ResumeFeatures(a.get('extracted_info') or {}, resume_experience_years)) for a in applications]
+    screened_at = time.perf_counter()
+
+    changed_by_result = {}
+    for application, result in zip(applications, results):
+        if application.get('knockout_analysis') != result:
+            key = json.dumps(result, sort_keys=True)
+            changed_by_result.setdefault(key, (result, []))[1].append(application['id'])
+
+    updates = 0
+    for result, ids in changed_by_result.values():
+        for i in range(0, len(ids), RESCREEN_UPDATE_BATCH):
+            repos.applications.update_many(ids[i:i + RESCREEN_UPDATE_BATCH], {"knockout_analysis": result})
+            updates += 1
+
+    summary = {
+        "job_id": job['id'],
+        "applications": len(applications),
+        "changed": sum(len(ids) for _, ids in changed_by_result.values()),
+        "update_requests": updates,
+        "load_ms": round((loaded_at - started) * 1000, 1),
+        "screening_ms": round((screened_at - loaded_at) * 1000, 1),
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
     }
+    logging.info(f"Knockout re-screen for job {job['id']}: {summary}")
+    return summary
+
+
+def bump_job_stats(job_id, before: Optional[dict], after: Optional[dict]):
+    """
+    Applies an application's change to its job's dashboard counters. A failure only logs:
+    the write it describes already happened, and `flask reconcile-job-stats` repairs the drift.
+    """
+    delta = stat_delta(before, after)
+    if not any(delta.values()):
+        return
+    try:
+        repos.job_stats.bump(job_id, delta)
+    except Exception as e:
+        logging.error(f"Could not update dashboard counters for job {job_id} by {delta}: {e}")
+
+
+def reconcile_job_stats(job_id) -> dict:
+    """Recounts a job's applications into its counters row, in the database."""
+    return repos.job_stats.reconcile(job_id)
+
+
+def load_job_stats(job_ids: list) -> dict:
+    """
+    Counters by job id. The migration backfills every existing job, so a job without a row has
+    no applications yet.
+    """
+    if not job_ids:
+        return {}
+    stats = {str(row['job_id']): row for row in repos.job_stats.get_many(job_ids)}
+    for job_id in job_ids:
+        stats.setdefault(str(job_id), empty_stats(job_id))
+    return stats
 
 # --- Main validation function (Orchestrator) ---
 MATCH_THRESHOLD = 70
-evaluation_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
 
 
-matching_prompt = ChatPromptTemplate.from_messages([
-    ("system",
-     "**Role:** You are a hyper-critical AI recruitment analyst. Your task is to score a candidate's fit for a job, focusing entirely on tangible, demonstrated alignment. You must penalize superficial strengths.\n\n"
-     "**Instructions:** Return only an integer score between 0 and 100.\n\n"
+EVALUATOR_ROLE = "**Role:** You are a hyper-critical AI recruitment analyst. Your task is to score a candidate's fit for a job, focusing entirely on tangible, demonstrated alignment. You must penalize superficial strengths.\n\n"
+
+# Scoring rubric shared by the score-only and the structured (single-call) evaluation prompts.
+EVALUATION_RUBRIC = (
      "**Evaluation Criteria:**\n\n"
      "🔹 **1. Skills Match (35 points):**\n"
      "- Compare candidate skills directly against the job's required skills.\n"
@@ -827,15 +1040,30 @@ matching_prompt = ChatPromptTemplate.from_messages([
      "**Scoring Philosophy:**\n"
      "- A 'Career Changer' will score low in Experience but can still get a moderate score from Skills and Projects.\n"
      "- A 'Keyword Stuffer' will score very low because their Skills score will be halved and their Holistic Review score will be poor.\n"
+)
+
+matching_prompt = LazyChatPrompt([
+    ("system",
+     EVALUATOR_ROLE +
+     "**Instructions:** Return only an integer score between 0 and 100.\n\n" +
+     EVALUATION_RUBRIC +
      "- Do NOT return explanations. Return only a clean integer score between 0–100."
-    
      ),
     ("human",
      "**Candidate Resume (structured JSON):**\n{resume}\n\n"
      "**Job Description:**\n{job_desc}\n\n"
      "📊 Score this candidate based on the criteria above. Return only the numeric score.")
 ])
-evaluation_chain = matching_prompt | evaluation_llm | parser
+def _require_score(raw: str) -> int:
+    """The 0-100 score in a reply to the score-only prompt; raises ValueError if there is none."""
+    match = re.search(r'\d+', raw)
+    if not match or not 0 <= int(match.group(0)) <= 100:
+        raise ValueError(f"No 0-100 score in evaluation response: {raw[:80]!r}")
+    return int(match.group(0))
+
+
+evaluation_chain = llm_gateway.chain("evaluation", matching_prompt, model="llama-3.3-70b-versatile", temperature=0,
+                                     validate=_require_score)
 
 OVERRIDE_SCORE_CAP = 40
 
@@ -844,12 +1072,8 @@ def apply_quantitative_logic(score: int, resume_json: dict, job_reqs: dict) -> d
     Applies a simple, hard-coded logic check to the AI's score and returns a
     full evaluation dictionary.
     """
-    total_experience = 0
-    if resume_json.get('experience'):
-        for exp in resume_json['experience']:
-            # Assumes you have a helper function _parse_duration_to_years
-            total_experience += _parse_duration_to_years(exp.get('duration', ''))
-            
+    total_experience = resume_experience_years(resume_json)
+
     required_experience = job_reqs.get('required_years', 0)
     
     # --- This is the main logic check ---
@@ -887,43 +1111,34 @@ def parse_score(raw: str) -> int:
 
 def evaluate_candidate_llm(resume_json: dict, job_requirements: dict) -> dict:
     """Evaluates candidate eligibility using an LLM and validates with quantitative logic."""
-    max_retries = 3
-    initial_retry_delay = 5
     job_description = job_requirements.get('description', '') # Extract description from the job data
 
-    for attempt in range(max_retries):
-        try:
-            result_raw = evaluation_chain.invoke({
-                "resume": json.dumps(resume_json, indent=2), 
-                "job_desc": job_description
-            })
-            
-            initial_score = parse_score(result_raw)
-            
-            # --- FIX STARTS HERE ---
-            # Call the logic function and get the complete evaluation dictionary.
-            final_evaluation = apply_quantitative_logic(initial_score, resume_json, job_requirements)
-            
-            # Simply return the dictionary, as it already contains the final score, decision, and reason.
-            return final_evaluation
-            # --- FIX ENDS HERE ---
-
-        except RateLimitError as e:
-            print(f"Rate limit hit during evaluation (attempt {attempt + 1}/{max_retries}): {e}")
-            sleep_time = initial_retry_delay * (2 ** attempt)
-            match = re.search(r'Please try again in (\d+\.?\d*)s', str(e))
-            if match:
-                try: sleep_time = max(sleep_time, float(match.group(1)))
-                except ValueError: pass
-            if attempt < max_retries - 1: time.sleep(sleep_time)
-            else: return {"score": 0, "decision": "Not Recommended", "reason": "Rate limit consistently hit."}
-        except Exception as e:
-            # This is where your error message was printed from
-            print(f"An unexpected error occurred during evaluation: {e}")
-            return {"score": 0, "decision": "Not Recommended", "reason": f"Error during evaluation: {str(e)}"}
+    try:
+        result_raw = evaluation_chain.invoke({
+            "resume": resume_payload("evaluation", resume_json),
+            "job_desc": job_desc_payload("evaluation", job_description)
+        })
+        
+        initial_score = parse_score(result_raw)
+        
+        # --- FIX STARTS HERE ---
+        # Call the logic function and get the complete evaluation dictionary.
+        final_evaluation = apply_quantitative_logic(initial_score, resume_json, job_requirements)
+        
+        # Simply return the dictionary, as it already contains the final score, decision, and reason.
+        return final_evaluation
+        # --- FIX ENDS HERE ---
+
+    except groq.RateLimitError as e:
+        print(f"Rate limit hit during evaluation after all retries: {e}")
+        return {"score": 0, "decision": "Not Recommended", "reason": "Rate limit consistently hit."}
+    except Exception as e:
+        # This is where your error message was printed from
+        print(f"An unexpected error occurred during evaluation: {e}")
+        return {"score": 0, "decision": "Not Recommended", "reason": f"Error during evaluation: {str(e)}"}
 
 
-detailed_feedback_prompt = ChatPromptTemplate.from_messages([
+detailed_feedback_prompt = LazyChatPrompt([
     ("system",
      """You are an expert AI Principal Technical Recruiter. Your task is to write a supportive, insightful, and professional feedback paragraph for a rejected candidate. Your response MUST be a single, concise paragraph and must NOT include the candidate's score.
 
@@ -959,8 +1174,7 @@ First, analyze the candidate's entire profile to identify their archetype and th
      "Job Description:\n{job_desc}\n\n"
      "Based on the protocols, provide a single, supportive paragraph of feedback.")
 ])
-feedback_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
-feedback_chain = detailed_feedback_prompt | feedback_llm | parser
+feedback_chain = llm_gateway.chain("detailed_feedback", detailed_feedback_prompt, model="llama-3.3-70b-versatile", temperature=0)
 # --- Define a custom exception for this task ---
 class FeedbackGenerationError(Exception):
     """Custom exception for failures during feedback generation."""
@@ -971,42 +1185,26 @@ def generate_detailed_feedback(resume_json: dict, job_description: str, score: i
     Generates detailed feedback for non-eligible candidates.
     Raises FeedbackGenerationError on failure.
     """
-    max_retries = 3
-    initial_retry_delay = 5
-
-    for attempt in range(max_retries):
-        try:
-            # On success, return the feedback string directly
-            feedback = feedback_chain.invoke({
-                "resume": json.dumps(resume_json, indent=2), 
-                "job_desc": job_description, 
-                "score": score
-            })
-            return feedback
-
-        except RateLimitError as e:
-            logging.warning(f"Rate limit hit during feedback generation (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt >= max_retries - 1:
-                # After the last retry, raise the custom exception
-                raise FeedbackGenerationError("Failed due to persistent rate limits.") from e
-            
-            # Your existing backoff logic is good
-            sleep_time = initial_retry_delay * (2 ** attempt)
-            match = re.search(r'Please try again in (\d+\.?\d*)s', str(e))
-            if match:
-                try: sleep_time = max(sleep_time, float(match.group(1)))
-                except ValueError: pass
-            time.sleep(sleep_time)
+    try:
+        # On success, return the feedback string directly
+        feedback = feedback_chain.invoke({
+            "resume": resume_payload("detailed_feedback", resume_json),
+            "job_desc": job_desc_payload("detailed_feedback", job_description),
+            "score": score
+        })
+        return feedback
 
-        except Exception as e:
-            # For any other error, log it and raise the custom exception immediately
-            logging.error(f"An unexpected error occurred during feedback generation: {e}")
-            raise FeedbackGenerationError(f"Could not generate feedback due to an internal error: {e}") from e
+    except groq.RateLimitError as e:
+        # The gateway has already retried with backoff
+        logging.warning(f"Rate limit hit during feedback generation after all retries: {e}")
+        raise FeedbackGenerationError("Failed due to persistent rate limits.") from e
 
-    # This line is technically unreachable but good practice to have
-    raise FeedbackGenerationError("Failed to generate feedback after all retries.")
+    except Exception as e:
+        # For any other error, log it and raise the custom exception immediately
+        logging.error(f"An unexpected error occurred during feedback generation: {e}")
+        raise FeedbackGenerationError(f"Could not generate feedback due to an internal error: {e}") from e
 
-selection_reason_prompt = ChatPromptTemplate.from_messages([
+selection_reason_prompt = LazyChatPrompt([
     ("system",
      """You are an expert AI replica of a Senior Hiring Manager. Your task is to write a concise, strategic paragraph explaining a hiring decision.
 
@@ -1037,42 +1235,150 @@ Synthesize the candidate's skills, experience, and projects to explain *why* the
      "Job Description:\n{job_desc}\n\n"
      "Based on the protocol, provide the strategic reason for this hiring decision:")
 ])
-selection_reason_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
-selection_reason_chain = selection_reason_prompt | selection_reason_llm | parser
+selection_reason_chain = llm_gateway.chain("selection_reason", selection_reason_prompt, model="llama-3.3-70b-versatile", temperature=0)
 
 def generate_selection_reason(resume_json: dict, job_description: str, score: int) -> str:
     """Generates a detailed reason for selecting an eligible candidate."""
-    max_retries = 3
-    initial_retry_delay = 5
-    for attempt in range(max_retries):
-        try: return selection_reason_chain.invoke({"resume": json.dumps(resume_json, indent=2), "job_desc": job_description, "score": score})
-        except RateLimitError as e:
-            print(f"Rate limit hit during selection reason generation (attempt {attempt + 1}/{max_retries}): {e}")
-            sleep_time = initial_retry_delay * (2 ** attempt)
-            match = re.search(r'Please try again in (\d+\.?\d*)s', str(e))
-            if match:
-                try: sleep_time = max(sleep_time, float(match.group(1)))
-                except ValueError: pass
-            if attempt < max_retries - 1: time.sleep(sleep_time)
-            else: return "Could not generate detailed selection reason due to API rate limits."
-        except Exception as e: return f"Could not generate detailed selection reason due to an internal error: {str(e)}"
+    try: return selection_reason_chain.invoke({"resume": resume_payload("selection_reason", resume_json), "job_desc": job_desc_payload("selection_reason", job_description), "score": score})
+    except groq.RateLimitError as e:
+        print(f"Rate limit hit during selection reason generation after all retries: {e}")
+        return "Could not generate detailed selection reason due to API rate limits."
+    except Exception as e: return f"Could not generate detailed selection reason due to an internal error: {str(e)}"
 
 #######################################################
 
+# --- Structured (single-call) evaluation ---
+# EVALUATION_MODE=structured asks for score, decision and reason in one round trip;
+# EVALUATION_MODE=two_step keeps the score-then-narrative flow.
+EVALUATION_MODE = os.getenv('EVALUATION_MODE', 'structured').lower()
+
+
+class StructuredEvaluation(BaseModel):
+    score: int = Field(..., ge=0, le=100)
+    decision: str
+    reason: str
+
+
+structured_evaluation_prompt = LazyChatPrompt([
+    ("system",
+     EVALUATOR_ROLE +
+     "**Instructions:** Score the candidate against the criteria below, make the hiring decision and explain it, all in one response.\n\n" +
+     EVALUATION_RUBRIC +
+     "\n--- **Decision & Reason** ---\n"
+     "- decision is \"Recommended\" if and only if score >= " + str(MATCH_THRESHOLD) + ", otherwise \"Not Recommended\".\n"
+     "- If Recommended: reason is one confident, strategic paragraph naming the candidate's primary strength, one or two supporting points, "
+     "and how they meet the key requirements of this job. If their expertise is in a different field, say so plainly instead of inventing a fit.\n"
+     "- If Not Recommended: reason is one supportive, professional feedback paragraph that acknowledges their relevant background, pinpoints the "
+     "specific gap and suggests a targeted action (e.g., a certification or a project). For career changers explain how to **bridge** their skills; "
+     "for frequent short tenures mention **stability**; for overqualified candidates explain the mismatch in **scope**.\n"
+     "- Never mention the numeric score in the reason.\n\n"
+     "--- **Output** ---\n"
+     "Return ONLY a JSON object, no markdown or other text:\n"
+     '{{"score": <integer 0-100>, "decision": "Recommended" or "Not Recommended", "reason": "<one paragraph>"}}'
+     ),
+    ("human",
+     "**Candidate Resume (structured JSON):**\n{resume}\n\n"
+     "**Job Description:**\n{job_desc}\n\n"
+     "Evaluate this candidate and return the JSON object.")
+])
+def _parse_structured_evaluation(raw: str) -> StructuredEvaluation:
+    """Validates the model's JSON answer, tolerating code fences or text around the object."""
+    match = re.search(r'\{.*\}', raw, re.DOTALL)
+    if not match:
+        raise ValueError("No JSON object in structured evaluation response.")
+    return StructuredEvaluation(**json.loads(match.group(0)))
+
+
+structured_evaluation_chain = llm_gateway.chain(
+    "structured_evaluation", structured_evaluation_prompt, model="llama-3.3-70b-versatile", temperature=0, max_tokens=800,
+    validate=_parse_structured_evaluation
+)
+
+# Small follow-up used only when the quantitative override flips the model's decision:
+# it rewrites the existing assessment instead of re-sending the resume and job description.
+reason_revision_prompt = LazyChatPrompt([
+    ("system",
+     "You revise hiring assessments. Rewrite the assessment so it supports the final decision, using the adjustment note as the main reason. "
+     "If the decision is \"Not Recommended\", write one supportive, professional feedback paragraph that acknowledges the candidate's strengths, "
+     "names the gap and suggests a concrete next step. If it is \"Recommended\", write one confident paragraph on why the candidate fits. "
+     "Never mention numeric scores. Return only the paragraph."),
+    ("human",
+     "Final decision: {decision}\n\nAdjustment note: {adjustment}\n\nOriginal assessment:\n{assessment}")
+])
+reason_revision_chain = llm_gateway.chain(
+    "evaluation_reason_revision", reason_revision_prompt, model="llama-3.1-8b-instant", temperature=0, max_tokens=300
+)
+
+
+def _job_description_of(job_requirements: dict) -> str:
+    # Job rows from the jobs table use 'job_description'; older callers pass 'description'.
+    return job_requirements.get('description') or job_requirements.get('job_description', '')
+
+
+def evaluate_structured(resume_json: dict, job_requirements: dict) -> dict:
+    """
+    Single-call evaluation: score, decision and reason come back together and
+    apply_quantitative_logic is applied afterwards. Only when that flips the model's decision
+    is a short 8B call made to rewrite the reason. Falls back to the two-step flow if the
+    response cannot be parsed.
+    """
+    try:
+        raw = structured_evaluation_chain.invoke({
+            "resume": resume_payload("structured_evaluation", resume_json),
+            "job_desc": job_desc_payload("structured_evaluation", _job_description_of(job_requirements))
+        })
+        evaluation = _parse_structured_evaluation(raw)
+    except groq.RateLimitError as e:
+        logging.error(f"Rate limit hit during structured evaluation after all retries: {e}")
+        return {"score": 0, "decision": "Not Recommended", "reason": "Error during initial AI scoring."}
+    except (json.JSONDecodeError, PydanticValidationError, ValueError) as e:
+        logging.warning(f"Structured evaluation returned malformed output ({e}); falling back to two-step evaluation.")
+        return evaluate_two_step(resume_json, job_requirements)
+    except Exception as e:
+        logging.error(f"Failed to get structured evaluation from LLM: {e}")
+        return {"score": 0, "decision": "Not Recommended", "reason": "Error during initial AI scoring."}
+
+    final_evaluation = apply_quantitative_logic(evaluation.score, resume_json, job_requirements)
+    model_decision = "Recommended" if evaluation.decision.strip().lower() == "recommended" else "Not Recommended"
+
+    if final_evaluation["decision"] == model_decision:
+        final_evaluation["reason"] = evaluation.reason
+        return final_evaluation
+
+    logging.info(f"Decision changed from '{model_decision}' to '{final_evaluation['decision']}'; revising the reason.")
+    try:
+        final_evaluation["reason"] = reason_revision_chain.invoke({
+            "decision": final_evaluation["decision"],
+            "adjustment": final_evaluation["reason"],
+            "assessment": prompt_serializer.text("evaluation_reason_revision", evaluation.reason)
+        })
+    except Exception as e:
+        # Keep the override's own explanation, which is accurate if terse.
+        logging.error(f"Failed to revise evaluation reason: {e}")
+    return final_evaluation
+
+
 def get_evaluation_with_reason(resume_json: dict, job_requirements: dict) -> dict:
+    """Evaluates a candidate, returning {score, decision, reason}, using the configured EVALUATION_MODE."""
+    if EVALUATION_MODE == 'structured':
+        return evaluate_structured(resume_json, job_requirements)
+    return evaluate_two_step(resume_json, job_requirements)
+
+
+def evaluate_two_step(resume_json: dict, job_requirements: dict) -> dict:
     """
     Orchestrates the entire candidate evaluation process:
     1. Gets a base score from an AI.
     2. Applies quantitative override logic.
     3. Fetches a detailed reason based on the final decision.
     """
-    job_description = job_requirements.get('description', '')
+    job_description = _job_description_of(job_requirements)
 
     # Step 1: Get the initial AI score (using the simple evaluation chain)
     try:
         raw_score_str = evaluation_chain.invoke({
-            "resume": json.dumps(resume_json, indent=2),
-            "job_desc": job_description
+            "resume": resume_payload("evaluation", resume_json),
+            "job_desc": job_desc_payload("evaluation", job_description)
         })
         initial_score = parse_score(raw_score_str)
     except Exception as e:
@@ -1106,7 +1412,7 @@ def get_evaluation_with_reason(resume_json: dict, job_requirements: dict) -> dic
 
     return final_evaluation
 #######################################################
-exam_generation_prompt = ChatPromptTemplate.from_messages([
+exam_generation_prompt = LazyChatPrompt([
     ("system",
      """You are an AI assistant that generates technical exam questions. Your entire response MUST be a single, valid JSON object with no other text.
 
@@ -1155,14 +1461,15 @@ Now, process the request according to these unbreakable rules.
      ("human", "Job Description:\n{job_desc}\n\nGenerate the 3 exam questions in the specified JSON format.")
 ])
 
+exam_generation_chain = llm_gateway.chain("exam_generation", exam_generation_prompt, model="llama-3.3-70b-versatile", temperature=0.4)
+
 def generate_exam_llm(job_description: str) -> Optional[List[dict]]:
     """Generates exam questions using the LLM chain with improved JSON cleaning."""
-    exam_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.4)
-    exam_generation_chain = exam_generation_prompt | exam_llm | StrOutputParser()
+    # Rate limits are retried by the gateway; this loop only re-asks when the output is malformed.
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            raw_response = exam_generation_chain.invoke({"job_desc": job_description})
+            raw_response = exam_generation_chain.invoke({"job_desc": job_desc_payload("exam_generation", job_description)})
             
             # --- IMPROVED, MORE AGGRESSIVE JSON CLEANING ---
             # Find the JSON object within the raw string
@@ -1182,13 +1489,16 @@ def generate_exam_llm(job_description: str) -> Optional[List[dict]]:
 
             return parsed_dict.get("questions", [])
 
+        except groq.RateLimitError as e:
+            print(f"ERROR: Rate limit persisted during exam generation: {e}")
+            return None
         except Exception as e:
             print(f"ERROR on attempt {attempt + 1} during exam generation: {e}")
             if attempt == max_retries - 1:
                 return None # Return None after all retries fail
     return None
 
-answer_evaluation_prompt = ChatPromptTemplate.from_messages([
+answer_evaluation_prompt = LazyChatPrompt([
     ("system",
      """
 You are an AI Exam Proctor and elite Subject Matter Expert, grading candidate answers with precision equal to the top 1% of human graders.
@@ -1263,55 +1573,53 @@ Now analyse and grade accordingly.
 ])
 
 
-answer_evaluation_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
-answer_evaluation_chain = answer_evaluation_prompt | answer_evaluation_llm | parser
+def _parse_answer_evaluation(raw: str) -> dict:
+    """{score, feedback} from the grader's reply; raises ValueError if it is not a JSON object."""
+    # Remove any code fences just in case
+    cleaned_json_str = re.sub(r"^```(?:json)?\n", "", raw.strip())
+    cleaned_json_str = re.sub(r"\n```$", "", cleaned_json_str)
+
+    if not cleaned_json_str.startswith("{") or not cleaned_json_str.endswith("}"):
+        raise ValueError("LLM output not in valid JSON object format.")
+
+    parsed = json.loads(cleaned_json_str)
+    return {
+        "score": int(parsed.get("score", 0)),
+        "feedback": str(parsed.get("feedback", "No feedback provided."))
+    }
+
+
+answer_evaluation_chain = llm_gateway.chain("answer_evaluation", answer_evaluation_prompt, model="llama-3.3-70b-versatile", temperature=0,
+                                            validate=_parse_answer_evaluation)
 def evaluate_answer_llm(job_description: str, question: str, ideal_answer: str, answer: str) -> dict:
     """Evaluates a single answer using the LLM chain with strict JSON compliance and plagiarism detection."""
+    # Rate limits are retried by the gateway; this loop only re-asks when the output is malformed
+    # (malformed replies are never cached, so each retry reaches the model).
     max_retries = 3
-    retry_delay = 5
     raw_json_str = None  # Initialize to avoid UnboundLocalError
 
     for attempt in range(max_retries):
         try:
             raw_json_str = answer_evaluation_chain.invoke({
-                "job_desc": job_description,
+                "job_desc": job_desc_payload("answer_evaluation", job_description),
                 "question": question,
                 "ideal_answer": ideal_answer,
                 "answer": answer
             })
-
-            # Remove any code fences just in case
-            cleaned_json_str = re.sub(r"^```(?:json)?\n", "", raw_json_str.strip())
-            cleaned_json_str = re.sub(r"\n```$", "", cleaned_json_str)
-
-            if not cleaned_json_str.startswith("{") or not cleaned_json_str.endswith("}"):
-                raise ValueError("LLM output not in valid JSON object format.")
-
-            parsed = json.loads(cleaned_json_str)
-            return {
-                "score": int(parsed.get("score", 0)),
-                "feedback": str(parsed.get("feedback", "No feedback provided."))
-            }
+            return _parse_answer_evaluation(raw_json_str)
 
         except (json.JSONDecodeError, ValueError) as e:
             print(f"JSON parsing error on attempt {attempt + 1}: {e}")
-        except RateLimitError as e:
-            wait_time = retry_delay * (2 ** attempt)
-            match = re.search(r'Please try again in (\d+\.?\d*)s', str(e))
-            if match:
-                wait_time = max(wait_time, float(match.group(1)))
-            print(f"Rate limit hit, retrying in {wait_time}s...")
-            time.sleep(wait_time)
+        except groq.RateLimitError as e:
+            print(f"Rate limit persisted while evaluating answer: {e}")
+            break
         except Exception as e:
             print(f"Error evaluating answer: {e}, Raw: {raw_json_str}")
 
-        if attempt < max_retries - 1:
-            time.sleep(retry_delay * (2 ** attempt))
-
     return {"score": 0, "feedback": "Evaluation failed after multiple attempts due to output errors or rate limits."}
 
 # Project Insights Chain
-project_insights_prompt = ChatPromptTemplate.from_messages([
+project_insights_prompt = LazyChatPrompt([
     ("system",
      "You are a highly skilled technical project analyst. Carefully analyze the provided project README content and extract the following structured information into a valid JSON object:\n\n"
      "1. `purpose`: A concise summary of the main purpose or objective of the project (2-3 sentences).\n"
@@ -1327,15 +1635,16 @@ project_insights_prompt = ChatPromptTemplate.from_messages([
      "Return ONLY valid JSON enclosed within a markdown-style code block (```). No extra explanation."),
     ("human", "Project README Content:\n{readme_content}")
 ])
-project_insights_llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.3)
-project_insights_chain = project_insights_prompt | project_insights_llm | parser
+project_insights_chain = llm_gateway.chain("project_insights", project_insights_prompt, model="llama-3.1-8b-instant", temperature=0.3)
 
 def generate_project_insights(readme_content: str) -> Optional[dict]:
     """Generates structured insights from a project README using the LLM chain."""
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            raw_json_str = project_insights_chain.invoke({"readme_content": readme_content})
+            raw_json_str = project_insights_chain.invoke({
+                "readme_content": prompt_serializer.text("project_insights", readme_content, token_budget=README_TOKEN_BUDGET)
+            })
             
             # Find the JSON object within the raw string
             match = re.search(r'\{.*\}', raw_json_str, re.DOTALL)
@@ -1623,30 +1932,29 @@ def get_resume_score_with_breakdown(resume_json: dict, job_description: str) ->
         "role": "user",
         "content": f"""
 **Candidate Resume (structured JSON):**
-{json.dumps(resume_json, indent=2)}
+{resume_payload("resume_breakdown", resume_json)}
 
 **Job Description:**
-{job_description}
+{job_desc_payload("resume_breakdown", job_description)}
 
 📊 Score this candidate based on the rubric and return only the score breakdown as JSON.
 """
     })
 
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.call("resume_breakdown", lambda: llm_gateway.client.chat.completions.create(
             model="llama-3.3-70b-versatile", # This model is specified in the prompt template for detailed reasoning
             messages=evaluation_messages,
             temperature=0.1, # Low temperature for consistent, factual output
             max_tokens=1000, # Sufficient tokens for detailed reasoning
             response_format={"type": "json_object"} # Ensure JSON output for structured data
-        )
+        ), model="llama-3.3-70b-versatile", estimated_tokens=estimate_tokens(json.dumps(evaluation_messages)) + 1000,
+            usage=completion_usage)
         message_content = response.choices[0].message.content.strip()
         score_data = json.loads(message_content)
         return score_data
-    except RateLimitError as e:
-        # Implements exponential backoff with a maximum number of retries
-        # This part of the logic needs to be handled outside or within a retry decorator
-        # For simplicity, returning an error for now
+    except groq.RateLimitError as e:
+        # The gateway has already retried with backoff
         return {"error": "Rate limit exceeded. Please try again later.", "details": str(e)}
     except json.JSONDecodeError as e:
         # Log the raw response if JSON parsing fails to aid debugging
@@ -1657,6 +1965,41 @@ def get_resume_score_with_breakdown(resume_json: dict, job_description: str) ->
         return {"error": "An unexpected error occurred during evaluation.", "details": str(e)}
 
 temp_analysis_cache = {}
+
+
+def _templates_version() -> str:
+    folder = os.path.join(app.root_path, app.template_folder)
+    return str(max((entry.stat().st_mtime_ns for entry in os.scandir(folder) if entry.is_file()), default=0))
+
+
+TEMPLATES_VERSION = _templates_version()
+
+
+def conditional_page(etag_parts: tuple, last_modified: Optional[datetime], render: Callable[[], str]):
+    """
+    Serves a rendered page with ETag/Last-Modified validators, answering 304 without rendering when
+    the browser's copy is current. `etag_parts` must cover everything the page depends on (data
+    version, user); the response is private since pages differ per user. Pages that display or
+    set flashed messages are always rendered and never validated.
+    """
+    if session.get('_flashes'):
+        return render()
+    etag = hashlib.sha256("|".join(str(part) for part in (TEMPLATES_VERSION, *etag_parts)).encode('utf-8')).hexdigest()[:24]
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render())
+        if session.get('_flashes'):
+            return response
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
 # --- Flask Routes ---
 # --- Flask Routes (Corrected for DB usage and consistent authentication) ---
 @app.route('/')
@@ -1666,15 +2009,50 @@ def index():
     user_logged_in = user_info is not None
     is_hr = user_info.get('is_hr', False) if user_info else False
 
-    # 2. Fetch jobs from the Supabase 'jobs' table
+    # 2. Job listings are fetched page by page from /api/jobs as the visitor scrolls,
+    #    so this page does not grow with the catalog.
+    return conditional_page(
+        ('index', user_info.get('id') if user_info else None, is_hr), None,
+        lambda: render_template('index.html', user_logged_in=user_logged_in, is_hr=is_hr,
+                                jobs_page_size=JOBS_PAGE_SIZE)
+    )
+
+
+@app.route('/api/jobs')
+def api_jobs():
+    """
+    One page of the job board, newest first. Keyset pagination: pass the previous response's
+    `next_cursor` as ?cursor=. ?limit= sets the page size (default JOBS_PAGE_SIZE, at most
+    MAX_JOBS_PAGE_SIZE) and ?fields= a comma-separated subset of the listing columns
+    (id, job_title, company_name, date_posted, snippet).
+    """
+    limit = min(max(request.args.get('limit', JOBS_PAGE_SIZE, type=int), 1), MAX_JOBS_PAGE_SIZE)
+    fields = tuple(field.strip() for field in request.args.get('fields', '').split(',') if field.strip()) or LISTING_FIELDS
+    unknown = [field for field in fields if field not in LISTING_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}", "fields": list(LISTING_FIELDS)}), 400
+    cursor = request.args.get('cursor')
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+
     try:
-        response = supabase.table('jobs').select('*').order('date_posted', desc=True).execute()
-        all_jobs_from_db = response.data
+        catalog = job_catalog.snapshot()
     except Exception as e:
-        all_jobs_from_db = []
-        flash(f"Could not load jobs: {e}", "danger")
+        logging.error(f"Could not load jobs: {e}")
+        return jsonify({"error": "Could not load jobs."}), 503
 
-    return render_template('index.html', user_logged_in=user_logged_in, is_hr=is_hr, jobs_data=all_jobs_from_db)
+    jobs, next_key = catalog.page(after, limit)
+    response = jsonify({
+        "jobs": [catalog.listing(job, fields) for job in jobs],
+        "next_cursor": encode_cursor(next_key) if next_key else None,
+    })
+    # The same for every visitor; browsers revalidate against the catalog version.
+    response.set_etag(hashlib.sha256(f"{catalog.etag}|{request.query_string.decode()}".encode('utf-8')).hexdigest()[:24])
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 # @app.route('/login', methods=['GET', 'POST'])
 # def login():
@@ -1768,10 +2146,11 @@ def login():
     if form.validate_on_submit():
         try:
             # Authenticate with Supabase
-            res = supabase.auth.sign_in_with_password({
-                "email": form.email.data,
-                "password": form.password.data
-            })
+            with supabase_call('auth.sign_in'):
+                res = supabase.auth.sign_in_with_password({
+                    "email": form.email.data,
+                    "password": form.password.data
+                })
             
             # Store session info
             session['user_session'] = res.session.model_dump()
@@ -1799,24 +2178,26 @@ def signup():
     if form.validate_on_submit():
         try:
             # Use Supabase to create the user
-            res = supabase.auth.sign_up({
-                "email": form.email.data,
-                "password": form.password.data,
-                "options": {
-                    "data": {
-                        "is_hr": form.is_hr.data
+            with supabase_call('auth.sign_up'):
+                res = supabase.auth.sign_up({
+                    "email": form.email.data,
+                    "password": form.password.data,
+                    "options": {
+                        "data": {
+                            "is_hr": form.is_hr.data
+                        }
                     }
-                }
-            })
+                })
             
             # IMPORTANT: Supabase sign_up doesn't automatically log the user in
             # We need to manually sign them in after successful signup
             if hasattr(res, 'user') and res.user:
                 # Manually sign in the user after successful signup
-                login_res = supabase.auth.sign_in_with_password({
-                    "email": form.email.data,
-                    "password": form.password.data
-                })
+                with supabase_call('auth.sign_in'):
+                    login_res = supabase.auth.sign_in_with_password({
+                        "email": form.email.data,
+                        "password": form.password.data
+                    })
                 
                 # Store session info
                 session['user_session'] = login_res.session.model_dump()
@@ -1854,16 +2235,17 @@ def google_login():
             redirect_to = "https://www.jobstir.tech/auth/callback"
         
         # Generate the OAuth URL using Supabase
-        oauth_response = supabase.auth.sign_in_with_oauth({
-            "provider": "google",
-            "options": {
-                "redirect_to": redirect_to,
-                "query_params": {
-                    "access_type": "offline",
-                    "prompt": "consent"
+        with supabase_call('auth.sign_in_oauth'):
+            oauth_response = supabase.auth.sign_in_with_oauth({
+                "provider": "google",
+                "options": {
+                    "redirect_to": redirect_to,
+                    "query_params": {
+                        "access_type": "offline",
+                        "prompt": "consent"
+                    }
                 }
-            }
-        })
+            })
         
         return redirect(oauth_response.url)
         
@@ -1883,7 +2265,8 @@ def auth_callback():
             return redirect(url_for('login'))
 
         # Exchange the code for a session
-        session_response = supabase.auth.exchange_code_for_session({"auth_code": code})
+        with supabase_call('auth.exchange_code'):
+            session_response = supabase.auth.exchange_code_for_session({"auth_code": code})
         
         # Store session and user info
         session['user_session'] = session_response.session.model_dump()
@@ -1913,9 +2296,7 @@ def submit_contact():
         message = request.form.get("message")
 
         data = {"name": name, "email": email, "message": message}
-        response = supabase.table("contacts").insert(data).execute()
-
-        if response.data:
+        if repos.contacts.insert(data):
             flash("✅ Thank you! Your message has been submitted.", "success")
         else:
             flash("❌ Something went wrong. Please try again.", "error")
@@ -1976,7 +2357,10 @@ def magic_moment():
 @login_required # Use the new decorator
 def logout():
     # Invalidate the Supabase token
-    supabase.auth.sign_out()
+    token_verifier.forget((session.get('user_session') or {}).get('access_token') or '')
+    token_verifier.discard_renewal((session.get('user_session') or {}).get('refresh_token'))
+    with supabase_call('auth.sign_out'):
+        supabase.auth.sign_out()
     # Clear the entire session for a clean logout
     session.clear()
     flash('You have been logged out.', 'info')
@@ -2006,7 +2390,15 @@ def hr_job_upload():
             }
 
             # Insert the new job into the 'jobs' table
-            supabase.table('jobs').insert(job_data).execute()
+            repos.jobs.insert(job_data)
+            job_catalog.invalidate()
+            # Compile the knockout rules now so the first applicant doesn't pay for it.
+            knockout_rule_cache.put(job_data["id"], knockout_questions_json)
+            try:
+                index_job_embedding(job_data["id"], job_description)
+            except Exception as e:
+                # The job is posted either way; `flask sync-job-embeddings` picks up any we missed.
+                logging.error(f"Could not embed job {job_data['id']}: {e}")
 
             return jsonify({"status": "success", "message": "Job posted successfully!"}), 200
 
@@ -2171,7 +2563,7 @@ def send_application_status_email(
             recipients=[recipient_email],
             html=message_html
         )
-        mail.send(msg)
+        send_mail(msg, 'application_status')
         logging.info(f"Application status email sent to {recipient_email} (Score: {score})")
         return True
 
@@ -2179,6 +2571,239 @@ def send_application_status_email(
         logging.error(f"Failed to send status email to {recipient_email}: {e}", exc_info=True)
         return False
     
+# Start exam generation in parallel with the evaluation; the result is discarded for candidates who do not qualify.
+SPECULATIVE_EXAM_GENERATION = os.getenv('SPECULATIVE_EXAM_GENERATION', 'True').lower() == 'true'
+
+class ApplicationProcessingError(Exception):
+    """Raised when an application cannot be processed; carries the HTTP status to report."""
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+def process_application(
+    selected_job: dict,
+    candidate_user_id: str,
+    file_content: bytes,
+    filename: str,
+    content_type: str,
+    report_stage=None,
+    checkpoint: Optional[dict] = None,
+    save_checkpoint=None
+) -> dict:
+    """
+    Runs the full application pipeline: storage upload, resume parsing, knockout screening,
+    evaluation, exam generation, the database insert and the candidate email.
+
+    `report_stage(stage)` is called as each stage starts. `checkpoint` / `save_checkpoint(checkpoint)`
+    let a retried background task skip side effects (upload, insert, email) that already happened.
+    Returns the JSON payload for the candidate. Raises ApplicationProcessingError on user-facing failures.
+    """
+    checkpoint = checkpoint if checkpoint is not None else {}
+
+    def stage(name):
+        if report_stage:
+            report_stage(name)
+
+    def remember(key, value):
+        checkpoint[key] = value
+        if save_checkpoint:
+            save_checkpoint(checkpoint)
+
+    def upload_resume(_):
+        if checkpoint.get('resume_url'):
+            return checkpoint['resume_url']
+        path_in_bucket = f"{candidate_user_id}/{uuid.uuid4()}_{filename}"
+        with supabase_call('storage.upload'):
+            supabase.storage.from_('resumes').upload(
+                file=file_content,
+                path=path_in_bucket,
+                file_options={"content-type": content_type}
+            )
+        return supabase.storage.from_('resumes').get_public_url(path_in_bucket)
+
+    def parse_resume(_):
+        resume_text, extracted_info = parse_resume_pdf(file_content)
+        if not resume_text:
+            raise ApplicationProcessingError("Failed to extract text from resume.", 400)
+        return extracted_info
+
+    job_description = selected_job.get('job_description', '')
+
+    # Independent stages run concurrently: the storage upload does not block parsing, knockout
+    # screening runs alongside the evaluation, and the exam (which only needs the job description)
+    # is generated speculatively and thrown away if the candidate does not qualify.
+    graph = StageGraph('candidate_apply')
+    graph.add('upload', upload_resume)
+    graph.add('parse', parse_resume)
+    if SPECULATIVE_EXAM_GENERATION:
+        graph.add('exam', lambda _: generate_exam_llm(job_description), speculative=True)
+    graph.add('knockout', lambda r: check_knockout_criteria_python(r['parse'], selected_job), deps=('parse',))
+    graph.add('evaluation', lambda r: get_evaluation_with_reason(r['parse'], selected_job), deps=('parse',))
+    graph.add('profile_embedding', lambda r: embed_candidate_profile(r['parse']), deps=('parse',))
+
+    with graph:
+        # 1. Extract resume text and structured data
+        stage('parsing_resume')
+        extracted_info = graph.result('parse')
+
+        # 2. Run the main LLM processing pipeline
+        stage('evaluating')
+        eligibility_result = graph.result('evaluation')
+        stage('screening')
+        knockout_analysis_result = graph.result('knockout')
+
+        # Extract score for threshold check
+        candidate_score = eligibility_result.get("score", 0)
+        decision = eligibility_result.get("decision", "")
+
+        # 3. Generate exam questions ONLY if score meets threshold
+        exam_questions = None
+        should_send_exam_email = False
+
+        if candidate_score >= MATCH_THRESHOLD and "Recommended" in decision:
+            # Candidate qualifies for exam
+            stage('generating_exam')
+            if SPECULATIVE_EXAM_GENERATION:
+                exam_questions = graph.result('exam')
+            else:
+                exam_questions = generate_exam_llm(job_description)
+            should_send_exam_email = True
+
+            if exam_questions is None:
+                eligibility_result["reason"] += " (Note: Exam generation failed.)"
+                eligibility_result["decision"] = "Recommended (Exam Gen Failed)"
+                should_send_exam_email = False
+        else:
+            # Candidate doesn't meet threshold - no exam needed
+            logging.info(f"Candidate score ({candidate_score}) below threshold ({MATCH_THRESHOLD}). No exam generated.")
+            if SPECULATIVE_EXAM_GENERATION:
+                graph.discard('exam')
+
+        stage('uploading_resume')
+        resume_url = graph.result('upload')
+        if not checkpoint.get('resume_url'):
+            remember('resume_url', resume_url)
+        profile_vector = graph.result('profile_embedding')
+
+    # 4. Create and save the final application record
+    stage('saving')
+    new_application_id = checkpoint.get('application_id')
+    if not new_application_id:
+        application_data = {
+            "job_id": selected_job['id'],
+            "candidate_user_id": candidate_user_id,
+            "submission_date": datetime.now().isoformat(),
+            "resume_url": resume_url,
+            "eligibility_status": eligibility_result.get("decision"),
+            "match_score": eligibility_result.get("score", 0),
+            "eligibility_reason": eligibility_result.get("reason", "N/A"),
+            "extracted_info": extracted_info,
+            "exam_questions": exam_questions,
+            "knockout_analysis": knockout_analysis_result,
+            "exam_taken": False if exam_questions else None  # Set to None if no exam needed
+        }
+
+        # Insert application into database
+        inserted = repos.applications.insert(application_data)
+
+        # Verify insert success
+        if not inserted:
+            raise ApplicationProcessingError("Failed to save application", 500)
+
+        # Get the new application ID
+        new_application_id = inserted['id']
+        remember('application_id', new_application_id)
+        bump_job_stats(selected_job['id'], None, application_data)
+
+    # Add the applicant to the job's candidate index (HR's top-candidates ranking).
+    try:
+        store_applicant_embedding(selected_job['id'], new_application_id, extracted_info, profile_vector)
+    except Exception as e:
+        logging.error(f"Could not index application {new_application_id}: {e}")
+
+    # 5. Send email based on eligibility and score
+    stage('notifying')
+    candidate_email = extracted_info.get('email')
+    candidate_name = extracted_info.get('name', 'Candidate')
+
+    if checkpoint.get('notified'):
+        logging.info(f"Notification for application {new_application_id} already sent; skipping.")
+    elif candidate_email:
+        if should_send_exam_email:
+            # Send exam invitation email for high-scoring candidates
+            send_exam_invitation_email(
+                recipient_email=candidate_email,
+                candidate_name=candidate_name,
+                job_title=selected_job.get('job_title', 'the role'),
+                job_id=selected_job['id'],
+                application_id=new_application_id,
+                decision=eligibility_result.get("decision"),
+            )
+            logging.info(f"Exam invitation sent to {candidate_email} (Score: {candidate_score})")
+        else:
+            # Send rejection/feedback email for low-scoring candidates
+            send_application_status_email(
+                recipient_email=candidate_email,
+                candidate_name=candidate_name,
+                job_title=selected_job.get('job_title', 'the role'),
+                decision=eligibility_result.get("decision"),
+                feedback=eligibility_result.get("reason", ""),
+                score=candidate_score
+            )
+            logging.info(f"Status email sent to {candidate_email} (Score: {candidate_score})")
+        remember('notified', True)
+    else:
+        logging.warning(f"No email found for candidate in application {new_application_id}")
+
+    return {
+        "message": "Application submitted successfully!",
+        "score": candidate_score,
+        "exam_eligible": should_send_exam_email,
+        "application_id": new_application_id
+    }
+
+def run_queued_application(task: dict):
+    """Task handler used by worker.py for applications accepted with ASYNC_APPLICATIONS."""
+    task_id = task['id']
+    payload = task['payload']
+    upload_path = payload['upload_path']
+
+    with open(upload_path, 'rb') as f:
+        file_content = f.read()
+
+    trace = None
+    if slow_trace_log is not None:
+        trace, trace_token = start_trace('task:candidate_application')
+        trace.attributes['task_id'] = task_id
+    try:
+        # Email helpers call url_for(..., _external=True), which needs a request context.
+        with app.test_request_context(base_url=app.config['APP_BASE_URL']), llm_priority(Priority.BACKGROUND):
+            result = process_application(
+                payload['job'],
+                payload['candidate_user_id'],
+                file_content,
+                payload['filename'],
+                payload['content_type'],
+                report_stage=lambda stage: application_queue.set_stage(task_id, stage),
+                checkpoint=dict(task['checkpoint']),
+                save_checkpoint=lambda checkpoint: application_queue.save_checkpoint(task_id, checkpoint)
+            )
+        application_queue.complete(task_id, result)
+    except ApplicationProcessingError as e:
+        application_queue.fail(task_id, str(e))
+    finally:
+        if trace is not None:
+            slow_trace_log.finish(trace, trace_token)
+        # Once the task reaches a final state the stored upload is no longer needed.
+        # (If the worker crashes, this never runs and the retry still finds the file.)
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+
+# Task kinds understood by worker.py
+TASK_HANDLERS = {
+    'candidate_application': run_queued_application,
+}
+
 @app.route('/candidate_apply', methods=['GET', 'POST'])
 @login_required # Use your new Supabase-aware decorator
 def candidate_apply():
@@ -2189,27 +2814,31 @@ def candidate_apply():
         
         if selected_job_id:
             try:
-                response = supabase.table('jobs').select('*').eq('id', selected_job_id).single().execute()
-                selected_job_details = response.data
+                selected_job_details = job_catalog.get(selected_job_id)
             except Exception:
+                selected_job_details = None
+            if selected_job_details is None:
                 flash('The job you are looking for was not found.', 'warning')
 
-        jobs_response = supabase.table('jobs').select('id, job_title, company_name, job_description').order('date_posted', desc=True).execute()
-        available_jobs = jobs_response.data
-        
-        return render_template('candidate_apply.html', selected_job=selected_job_details, available_jobs=available_jobs)
+        # First page rendered here, the rest fetched from /api/jobs as the candidate scrolls.
+        catalog = job_catalog.snapshot()
+        jobs, next_key = catalog.page(None, JOBS_PAGE_SIZE)
+        available_jobs = [catalog.listing(job, ('id', 'job_title', 'company_name')) for job in jobs]
+
+        return conditional_page(
+            ('candidate_apply', catalog.etag, session['user_info'].get('id'), selected_job_id, selected_job_details is not None),
+            catalog.last_modified,
+            lambda: render_template('candidate_apply.html', selected_job=selected_job_details, available_jobs=available_jobs,
+                                    next_cursor=encode_cursor(next_key) if next_key else None, jobs_page_size=JOBS_PAGE_SIZE)
+        )
 
     # --- POST Request Logic ---
     if request.method == 'POST':
         try:
-            # Define the threshold constant
-            MATCH_THRESHOLD = 70
-            
             job_id_to_apply = request.form.get('job_id')
             candidate_user_id = session['user_info']['id']
             
-            job_response = supabase.table('jobs').select('*').eq('id', job_id_to_apply).single().execute()
-            selected_job = job_response.data
+            selected_job = job_catalog.get(job_id_to_apply)
             if not selected_job:
                 return jsonify({"error": "Invalid Job ID selected."}), 400
 
@@ -2217,116 +2846,62 @@ def candidate_apply():
             if not resume_file or resume_file.filename == "":
                 return jsonify({"error": "No resume file selected."}), 400
             
-            # 1. Upload resume and extract text
             file_content = resume_file.read()
-            path_in_bucket = f"{candidate_user_id}/{uuid.uuid4()}_{resume_file.filename}"
-            supabase.storage.from_('resumes').upload(
-                file=file_content,
-                path=path_in_bucket,
-                file_options={"content-type": resume_file.content_type}
-            )
-            resume_url = supabase.storage.from_('resumes').get_public_url(path_in_bucket)
-            resume_text = extract_text_from_pdf(file_content)
-            if not resume_text:
-                return jsonify({"error": "Failed to extract text from resume."}), 400
-            
-            # 2. Run the main LLM processing pipeline
-            extracted_info = extract_resume_info_llm(resume_text)
-            knockout_analysis_result = check_knockout_criteria_python(extracted_info, selected_job)
-            
-            # Get evaluation with score and decision
-            eligibility_result = get_evaluation_with_reason(extracted_info, selected_job)
-            
-            # Extract score for threshold check
-            candidate_score = eligibility_result.get("score", 0)
-            decision = eligibility_result.get("decision", "")
-            
-            # 3. Generate exam questions ONLY if score meets threshold
-            exam_questions = None
-            should_send_exam_email = False
-            
-            if candidate_score >= MATCH_THRESHOLD and "Recommended" in decision:
-                # Candidate qualifies for exam
-                job_description = selected_job.get('job_description', '')
-                exam_questions = generate_exam_llm(job_description)
-                should_send_exam_email = True
-                
-                if exam_questions is None:
-                    eligibility_result["reason"] += " (Note: Exam generation failed.)"
-                    eligibility_result["decision"] = "Recommended (Exam Gen Failed)"
-                    should_send_exam_email = False
-            else:
-                # Candidate doesn't meet threshold - no exam needed
-                logging.info(f"Candidate score ({candidate_score}) below threshold ({MATCH_THRESHOLD}). No exam generated.")
-        
-            # 4. Create and save the final application record
-            application_data = {
-                "job_id": selected_job['id'],
-                "candidate_user_id": candidate_user_id,
-                "submission_date": datetime.now().isoformat(),
-                "resume_url": resume_url,
-                "eligibility_status": eligibility_result.get("decision"),
-                "match_score": eligibility_result.get("score", 0),
-                "eligibility_reason": eligibility_result.get("reason", "N/A"),
-                "extracted_info": extracted_info,
-                "exam_questions": exam_questions,
-                "knockout_analysis": knockout_analysis_result,
-                "exam_taken": False if exam_questions else None  # Set to None if no exam needed
-            }
-            
-            # Insert application into database
-            insert_response = supabase.table('candidate_applications').insert(application_data).execute()
-
-            # Verify insert success
-            if not insert_response.data:
-                return jsonify({"error": "Failed to save application"}), 500
-
-            # Get the new application ID
-            new_application_id = insert_response.data[0]['id']
-
-            # 5. Send email based on eligibility and score
-            candidate_email = extracted_info.get('email')
-            candidate_name = extracted_info.get('name', 'Candidate')
-            
-            if candidate_email:
-                if should_send_exam_email:
-                    # Send exam invitation email for high-scoring candidates
-                    send_exam_invitation_email(
-                        recipient_email=candidate_email,
-                        candidate_name=candidate_name,
-                        job_title=selected_job.get('job_title', 'the role'),
-                        job_id=selected_job['id'],
-                        application_id=new_application_id,
-                        decision=eligibility_result.get("decision"),
-                        
-                    )
-                    logging.info(f"Exam invitation sent to {candidate_email} (Score: {candidate_score})")
-                else:
-                    # Send rejection/feedback email for low-scoring candidates
-                    send_application_status_email(
-                        recipient_email=candidate_email,
-                        candidate_name=candidate_name,
-                        job_title=selected_job.get('job_title', 'the role'),
-                        decision=eligibility_result.get("decision"),
-                        feedback=eligibility_result.get("reason", ""),
-                        score=candidate_score
-                    )
-                    logging.info(f"Status email sent to {candidate_email} (Score: {candidate_score})")
-            else:
-                logging.warning(f"No email found for candidate in application {new_application_id}")
 
-            return jsonify({
-                "message": "Application submitted successfully!",
-                "score": candidate_score,
-                "exam_eligible": should_send_exam_email
-            }), 200
+            if app.config['ASYNC_APPLICATIONS']:
+                # Persist the upload and hand the slow stages to the background workers.
+                task_id = str(uuid.uuid4())
+                upload_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{task_id}.pdf")
+                with open(upload_path, 'wb') as f:
+                    f.write(file_content)
+
+                application_queue.enqueue('candidate_application', {
+                    "job": selected_job,
+                    "candidate_user_id": candidate_user_id,
+                    "upload_path": upload_path,
+                    "filename": resume_file.filename,
+                    "content_type": resume_file.content_type
+                }, task_id=task_id)
+
+                return jsonify({
+                    "message": "Application received! We are processing it now.",
+                    "application_id": task_id,
+                    "status_url": url_for('application_status', application_id=task_id)
+                }), 202
+
+            result = process_application(
+                selected_job,
+                candidate_user_id,
+                file_content,
+                resume_file.filename,
+                resume_file.content_type
+            )
+            return jsonify(result), 200
 
+        except ApplicationProcessingError as e:
+            return jsonify({"error": str(e)}), e.status_code
         except Exception as e:
             logging.error(f"Error during application process: {e}", exc_info=True)
             return jsonify({"error": f"Failed to process application: {e}"}), 500
             
     return render_template('candidate_apply.html', available_jobs=available_jobs, selected_job=selected_job_details)
 
+@app.route('/applications/<application_id>/status', methods=['GET'])
+@login_required
+def application_status(application_id):
+    """Reports the processing stage of an application accepted in the background."""
+    task = application_queue.get(application_id)
+    if not task or task['payload'].get('candidate_user_id') != session['user_info']['id']:
+        return jsonify({"error": "Application not found."}), 404
+
+    return jsonify({
+        "application_id": application_id,
+        "status": task['status'],
+        "stage": task['stage'],
+        "result": task['result'],
+        "error": task['error']
+    }), 200
+
 
 
 # # --- Helper Function for Sending Candidate Approval Email ---
@@ -2419,7 +2994,7 @@ def send_candidate_approval_email(recipient_email: str, candidate_name: str, job
             </div>
             """
         )
-        mail.send(msg)
+        send_mail(msg, 'candidate_approval')
         logging.info(f"Approval email sent to {recipient_email} for job {job_title}.")
         return True
     except Exception as e:
@@ -2481,7 +3056,7 @@ def send_exam_invitation_email(
             recipients=[recipient_email],
             html=message_html
         )
-        mail.send(msg)
+        send_mail(msg, 'exam_invitation')
         logging.info(f"Exam invitation email sent to {recipient_email} for application {application_id}")
         return True
 
@@ -2492,13 +3067,199 @@ def send_exam_invitation_email(
 
 
 # --- Approve Candidate Route ---
+@app.route('/hr/jobs/<job_id>/rescreen', methods=['POST'])
+@login_required
+@hr_required
+def rescreen_job(job_id):
+    """Re-screens every existing application after HR changes a job's knockout criteria."""
+    try:
+        job = repos.jobs.get(job_id, ('id', 'hr_user_id', 'knockout_questions_json'))
+    except Exception as e:
+        logging.error(f"Error loading job {job_id} for re-screening: {e}")
+        return jsonify({"error": "Job not found."}), 404
+    if not job or job.get('hr_user_id') != session['user_info']['id']:
+        return jsonify({"error": "Job not found."}), 404
+
+    try:
+        return jsonify(rescreen_job_applications(job)), 200
+    except Exception as e:
+        logging.error(f"Error re-screening applications for job {job_id}: {e}")
+        return jsonify({"error": "Failed to re-screen applications."}), 500
+
+
+# Sort keys accepted by the applicant table, mapped to the repository's (see
+# APPLICANT_SUMMARY_SORTS); ties break on id.
+APPLICANT_SORTS = {
+    'match_score': 'match_score',
+    'exam_score': 'exam_score',
+    'submitted': 'submission_date',
+    'status': 'eligibility_status',
+    'name': 'name',
+}
+APPLICANTS_PAGE_SIZE = 25
+MAX_APPLICANTS_PAGE_SIZE = 100
+
+
+def _owned_job(job_id) -> Optional[dict]:
+    """The job if it belongs to the logged-in HR user, else None."""
+    try:
+        job = job_catalog.get(job_id)
+    except Exception as e:
+        logging.error(f"Error loading job {job_id}: {e}")
+        return None
+    if not job or job.get('hr_user_id') != session['user_info']['id']:
+        return None
+    return job
+
+
+@app.route('/hr/jobs/<job_id>/applicants')
+@login_required
+@hr_required
+def job_applicants(job_id):
+    """
+    One page of a job's applicants for the dashboard table: name, scores and status only.
+    ?sort= one of APPLICANT_SORTS (default match_score), ?order=asc|desc (default desc),
+    ?page= (1-based) and ?limit= (default APPLICANTS_PAGE_SIZE, at most MAX_APPLICANTS_PAGE_SIZE).
+    """
+    if _owned_job(job_id) is None:
+        return jsonify({"error": "Job not found."}), 404
+    sort = request.args.get('sort', 'match_score')
+    if sort not in APPLICANT_SORTS:
+        return jsonify({"error": f"sort must be one of {', '.join(APPLICANT_SORTS)}."}), 400
+    descending = request.args.get('order', 'desc') != 'asc'
+    limit = min(max(request.args.get('limit', APPLICANTS_PAGE_SIZE, type=int), 1), MAX_APPLICANTS_PAGE_SIZE)
+    page = max(request.args.get('page', 1, type=int), 1)
+    offset = (page - 1) * limit
+
+    try:
+        # One extra row tells whether another page exists without a count query.
+        rows = repos.applications.summaries_for_job(job_id, APPLICANT_SORTS[sort], descending, offset, limit + 1)
+        total = load_job_stats([job_id]).get(str(job_id), {}).get('applications')
+    except Exception as e:
+        logging.error(f"Error loading applicants for job {job_id}: {e}", exc_info=True)
+        return jsonify({"error": "Could not load applicants."}), 500
+
+    return jsonify({
+        "applicants": [{
+            "id": row['id'],
+            "name": row.get('name') or 'N/A',
+            "match_score": row.get('match_score'),
+            "status": row.get('eligibility_status') or 'Pending',
+            "exam_taken": bool(row.get('exam_taken')),
+            "exam_score": row.get('exam_score'),
+            "submitted": row.get('submission_date'),
+        } for row in rows[:limit]],
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "has_more": len(rows) > limit,
+    })
+
+
+@app.route('/hr/applications/<application_id>')
+@login_required
+@hr_required
+def application_details(application_id):
+    """The full analysis of one application, fetched when HR expands its row on the dashboard."""
+    try:
+        application = repos.applications.get(application_id, (
+            'id', 'job_id', 'extracted_info', 'knockout_analysis', 'eligibility_reason', 'match_score',
+            'eligibility_status', 'exam_taken', 'exam_score'
+        ))
+    except Exception as e:
+        logging.error(f"Error loading application {application_id}: {e}", exc_info=True)
+        return jsonify({"error": "Could not load the application."}), 500
+    if not application or _owned_job(application['job_id']) is None:
+        return jsonify({"error": "Application not found."}), 404
+
+    info = application.get('extracted_info') or {}
+    projects = [
+        {**project, 'insights_url': url_for('project_insights', job_id=application['job_id'],
+                                             application_id=application['id'], project_index=index)}
+        for index, project in enumerate(info.get('projects') or []) if isinstance(project, dict)
+    ]
+    return jsonify({**application, 'extracted_info': {**info, 'projects': projects}})
+
+
+@app.route('/hr/jobs/<job_id>/top_candidates')
+@login_required
+@hr_required
+def top_candidates(job_id):
+    """
+    The applicants most similar to the job description, or with ?like=<application_id> to that
+    applicant. ?k= sets how many (default 10, at most 100).
+    """
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
+    like = request.args.get('like')
+    try:
+        job = repos.jobs.get(job_id, ('id', 'hr_user_id', 'job_description'))
+    except Exception as e:
+        logging.error(f"Error loading job {job_id} for candidate ranking: {e}")
+        return jsonify({"error": "Job not found."}), 404
+    if not job or job.get('hr_user_id') != session['user_info']['id']:
+        return jsonify({"error": "Job not found."}), 404
+
+    try:
+        matrix = applicant_embeddings.get(applicant_namespace(job_id))
+        if not len(matrix) and str(job_id) not in _applicant_embeddings_synced:
+            # Applications from before profiles were embedded: index them once.
+            logging.info(f"Indexing existing applicants for job {job_id}: {sync_applicant_embeddings(job_id)}")
+            matrix = applicant_embeddings.get(applicant_namespace(job_id), force_refresh=True)
+
+        if like:
+            query = matrix.vector(str(like))
+            if query is None:
+                return jsonify({"error": "That applicant is not in this job's candidate index."}), 404
+        else:
+            query = embedding_store.get(JOB_EMBEDDING_NAMESPACE, str(job_id), embedding_model_key())
+            if query is None:
+                index_job_embedding(str(job_id), job.get('job_description'))
+                query = embedding_store.get(JOB_EMBEDDING_NAMESPACE, str(job_id), embedding_model_key())
+            if query is None:
+                return jsonify({"error": "This job has no description to match against."}), 400
+
+        matches = [(application_id, score) for application_id, score in matrix.top_k(query, k + 1 if like else k)
+                   if application_id != str(like)][:k]
+        applications = {}
+        if matches:
+            applications = {str(application['id']): application for application in repos.applications.by_ids(
+                [application_id for application_id, _ in matches],
+                ('id', 'candidate_user_id', 'eligibility_status', 'match_score', 'exam_taken', 'extracted_info')
+            )}
+
+        candidates = []
+        for application_id, score in matches:
+            application = applications.get(application_id)
+            if application is None:
+                continue
+            info = application.get('extracted_info') or {}
+            candidates.append({
+                "application_id": application['id'],
+                "candidate_user_id": application.get('candidate_user_id'),
+                "name": info.get('name'),
+                "email": info.get('email'),
+                "similarity": round(score, 4),
+                "eligibility_status": application.get('eligibility_status'),
+                "match_score": application.get('match_score'),
+                "exam_taken": application.get('exam_taken'),
+            })
+        return jsonify({
+            "job_id": job_id,
+            "query": {"application_id": like} if like else "job_description",
+            "indexed_applicants": len(matrix),
+            "candidates": candidates
+        }), 200
+    except Exception as e:
+        logging.error(f"Error ranking candidates for job {job_id}: {e}")
+        return jsonify({"error": "Failed to rank candidates."}), 500
+
+
 @app.route('/approve_candidate/<application_id>', methods=['POST'])
 @hr_required
 def approve_candidate(application_id):
     try:
         # 1. Fetch application
-        app_response = supabase.table('candidate_applications').select('*').eq('id', application_id).single().execute()
-        application = app_response.data
+        application = repos.applications.get(application_id)
         
         if not application:
             flash('Candidate application not found.', 'error')
@@ -2513,10 +3274,9 @@ def approve_candidate(application_id):
             flash('Candidate already approved.', 'info')
             return redirect(url_for('hr_dashboard'))
 
-        # 3. Update status in Supabase
-        supabase.table('candidate_applications').update({
-            'eligibility_status': 'Approved'
-        }).eq('id', application_id).execute()
+        # 3. Update status in Supabase (only if still unapproved, so a double click counts once)
+        if repos.applications.approve(application_id):
+            bump_job_stats(application['job_id'], application, {**application, 'eligibility_status': 'Approved'})
 
         flash(f'Candidate {application["extracted_info"].get("name", "N/A")} approved!', 'success')
 
@@ -2524,8 +3284,8 @@ def approve_candidate(application_id):
         candidate_email = application["extracted_info"].get('email')
         candidate_name = application["extracted_info"].get('name', 'Candidate')
         
-        job_response = supabase.table('jobs').select('job_title').eq('id', application['job_id']).single().execute()
-        job_title = job_response.data.get('job_title', 'your applied position')
+        job = repos.jobs.get(application['job_id'], ('job_title',)) or {}
+        job_title = job.get('job_title', 'your applied position')
 
         if candidate_email:
             send_candidate_approval_email(candidate_email, candidate_name, job_title)
@@ -2581,7 +3341,7 @@ def send_exam_invitation_email(
             recipients=[recipient_email],
             html=message_html
         )
-        mail.send(msg)
+        send_mail(msg, 'application_result')
         logging.info(f"Email sent to {recipient_email} for application {application_id} with status '{decision}'.")
         return True
 
@@ -2601,33 +3361,20 @@ def hr_dashboard():
         hr_user_id = session['user_info']['id']
 
         # 1. Fetch all jobs for the current HR user
-        jobs_response = supabase.table('jobs').select('*').eq('hr_user_id', hr_user_id).order('date_posted', desc=True).execute()
-        hr_jobs = jobs_response.data
+        hr_jobs = repos.jobs.for_hr(hr_user_id)
         
         if not hr_jobs:
             # If there are no jobs, render the page with empty data
-            return render_template('hr_dashboard.html', jobs=[], summary={}, apps_by_job={})
+            return render_template('hr_dashboard.html', jobs=[], summary={})
 
         job_ids = [job['id'] for job in hr_jobs]
 
-        # 2. Fetch all applications related to those jobs in a single query
-        apps_response = supabase.table('candidate_applications').select('*').in_('job_id', job_ids).execute()
-        all_applications = apps_response.data
-
-        # 3. Group applications by their job_id for easy lookup
-        apps_by_job = {}
-        for app in all_applications:
-            job_id = app.get('job_id')
-            if job_id not in apps_by_job:
-                apps_by_job[job_id] = []
-            apps_by_job[job_id].append(app)
-
-        # 4. Process the data in Python for summary stats
-        total_candidates = len(all_applications)
-        pending_reviews = 0
-        
+        # 2. Summary stats come from the per-job counters (see job_stats.py). Applicants are not
+        #    loaded here: each job's table fetches pages from job_applicants when it is opened.
+        stats_by_job = load_job_stats(job_ids)
+
         for job in hr_jobs:
-            job_applications = apps_by_job.get(job['id'], [])
+            stats = stats_by_job.get(str(job['id'])) or empty_stats(job['id'])
 
             # --- FIX STARTS HERE: Parse the knockout questions JSON ---
             knockout_json_string = job.get('knockout_questions_json')
@@ -2644,33 +3391,31 @@ def hr_dashboard():
             # --- END OF FIX ---
             
             # Add new attributes directly to the job dictionary for the template
-            job['total_applications'] = len(job_applications)
-            job['recommended_candidates'] = sum(1 for app in job_applications if "Recommended" in app.get('eligibility_status', ''))
-            job['completed_exams'] = sum(1 for app in job_applications if app.get('exam_taken'))
+            job['total_applications'] = stats['applications']
+            job['recommended_candidates'] = stats['recommended']
+            job['completed_exams'] = stats['exams_completed']
+            job['pending_reviews'] = stats['pending_review']
+            job['approved_candidates'] = stats['approved']
             job['sharable_link'] = url_for('candidate_apply', job_id=job['id'], _external=True)
 
-            for app in job_applications:
-                if app.get('exam_taken') and app.get('eligibility_status') != 'Approved':
-                    pending_reviews += 1
-        
         dashboard_summary = {
             'total_jobs': len(hr_jobs),
-            'total_candidates': total_candidates,
-            'pending_reviews': pending_reviews
+            'total_candidates': sum(job['total_applications'] for job in hr_jobs),
+            'pending_reviews': sum(job['pending_reviews'] for job in hr_jobs)
         }
 
-        # 5. Render the template with all the necessary data
+        # 3. Render the template with all the necessary data
         return render_template(
-            'hr_dashboard.html', 
-            jobs=hr_jobs, 
+            'hr_dashboard.html',
+            jobs=hr_jobs,
             summary=dashboard_summary,
-            apps_by_job=apps_by_job
+            applicants_page_size=APPLICANTS_PAGE_SIZE
         )
 
     except Exception as e:
         logging.error(f"Error in hr_dashboard: {e}", exc_info=True)
         flash('An error occurred while loading the dashboard.', 'error')
-        return render_template('hr_dashboard.html', jobs=[], summary={}, apps_by_job={})
+        return render_template('hr_dashboard.html', jobs=[], summary={})
 
 @app.route('/client_portal')
 @login_required # Use the new Supabase-aware decorator
@@ -2679,8 +3424,7 @@ def client_portal():
         candidate_user_id = session['user_info']['id']
 
         # 1. Fetch all applications for the current user
-        apps_response = supabase.table('candidate_applications').select('*').eq('candidate_user_id', candidate_user_id).execute()
-        user_applications = apps_response.data
+        user_applications = repos.applications.for_candidate(candidate_user_id)
 
         if not user_applications:
             # If the user has no applications, render the page with an empty list
@@ -2704,10 +3448,10 @@ def client_portal():
         # --- END OF FIX ---
 
         # 3. Fetch all related jobs in a single, efficient query
-        jobs_response = supabase.table('jobs').select('id, job_title, company_name').in_('id', job_ids).execute()
+        jobs = repos.jobs.by_ids(job_ids, ('id', 'job_title', 'company_name'))
         
         # 4. Create a dictionary for quick job lookups
-        jobs_by_id = {job['id']: job for job in jobs_response.data}
+        jobs_by_id = {job['id']: job for job in jobs}
 
         # 5. Combine the application and job data in Python
         for app_data in user_applications:
@@ -2737,15 +3481,13 @@ def get_exam():
         candidate_user_id = session['user_info']['id']
         
         # 1. Fetch the job from Supabase
-        job_response = supabase.table('jobs').select('job_title, job_description').eq('id', job_id).single().execute()
-        job_obj = job_response.data
+        job_obj = repos.jobs.get(job_id, ('job_title', 'job_description'))
         if not job_obj:
             flash('Job not found for this exam.', 'error')
             return redirect(url_for('client_portal'))
         
         # 2. Fetch the candidate's application from Supabase
-        app_response = supabase.table('candidate_applications').select('*').eq('id', application_id).single().execute()
-        candidate_app_obj = app_response.data
+        candidate_app_obj = repos.applications.get(application_id)
 
         # 3. Perform authorization and business logic checks
         if not candidate_app_obj or str(candidate_app_obj.get('candidate_user_id')) != candidate_user_id:
@@ -2768,9 +3510,7 @@ def get_exam():
             
             if exam_questions:
                 # 5. Update the application record with the new questions
-                supabase.table('candidate_applications').update({
-                    'exam_questions': exam_questions
-                }).eq('id', application_id).execute()
+                repos.applications.update(application_id, {'exam_questions': exam_questions})
                 logging.info(f"Generated and saved {len(exam_questions)} exam questions for {application_id}.")
             else:
                 logging.error(f"Failed to generate exam questions for {application_id}.")
@@ -2799,13 +3539,11 @@ def submit_exam(job_id, application_id):
         candidate_user_id = session['user_info']['id']
         
         # 1. Fetch the job and application data from Supabase
-        job_response = supabase.table('jobs').select('job_description').eq('id', job_id).single().execute()
-        job_obj = job_response.data
+        job_obj = repos.jobs.get(job_id, ('job_description',))
         if not job_obj:
             return jsonify({"error": "Job not found."}), 404
 
-        app_response = supabase.table('candidate_applications').select('*').eq('id', application_id).single().execute()
-        candidate_app_obj = app_response.data
+        candidate_app_obj = repos.applications.get(application_id)
         if not candidate_app_obj or str(candidate_app_obj.get('candidate_user_id')) != candidate_user_id:
             return jsonify({"error": "Application not found or unauthorized."}), 404
 
@@ -2855,8 +3593,11 @@ def submit_exam(job_id, application_id):
             "exam_feedback": detailed_feedback,
             "submitted_answers": submitted_answers
         }
-        supabase.table('candidate_applications').update(update_data).eq('id', application_id).execute()
-        
+        # Only the first submission is recorded (and counted); a concurrent duplicate finds exam_taken set.
+        if not repos.applications.record_exam(application_id, update_data):
+            return jsonify({"error": "Exam already taken."}), 400
+        bump_job_stats(candidate_app_obj['job_id'], candidate_app_obj, {**candidate_app_obj, **update_data})
+
         return jsonify({"message": "Exam submitted and graded successfully!", "score": total_score, "feedback": detailed_feedback}), 200
 
     except Exception as e:
@@ -2869,14 +3610,12 @@ def submit_exam(job_id, application_id):
 def project_insights(job_id, application_id, project_index):
     try:
         # 1. Fetch the job and application data in parallel (or sequentially)
-        job_response = supabase.table('jobs').select('job_title').eq('id', job_id).single().execute()
-        job_obj = job_response.data
+        job_obj = repos.jobs.get(job_id, ('job_title',))
         if not job_obj:
             flash('Job not found.', 'error')
             return redirect(url_for('hr_dashboard'))
 
-        app_response = supabase.table('candidate_applications').select('extracted_info').eq('id', application_id).single().execute()
-        candidate_app_obj = app_response.data
+        candidate_app_obj = repos.applications.get(application_id, ('extracted_info',))
         if not candidate_app_obj:
             flash('Candidate application not found.', 'error')
             return redirect(url_for('hr_dashboard'))
@@ -2902,9 +3641,7 @@ def project_insights(job_id, application_id, project_index):
                     current_extracted_info['projects'][project_index]['insights'] = generated_insights
                     
                     # 4. Save the entire updated 'extracted_info' object back to Supabase
-                    supabase.table('candidate_applications').update({
-                        'extracted_info': current_extracted_info
-                    }).eq('id', application_id).execute()
+                    repos.applications.update(application_id, {'extracted_info': current_extracted_info})
                     
                     # Also update the local 'project' variable to pass to the template
                     project['insights'] = generated_insights
@@ -2976,12 +3713,11 @@ def evaluate_resume():
 
             # --- 2. Extract resume text ---
             resume_content = resume_file.read()
-            resume_text = extract_text_from_pdf(resume_content)
+            # --- 3. Parse resume JSON (served from the resume cache for repeat uploads) ---
+            resume_text, extracted_resume_json = parse_resume_pdf(resume_content)
             if not resume_text:
                 raise ValueError("Could not extract text from the resume PDF.")
 
-            # --- 3. Parse resume JSON ---
-            extracted_resume_json = extract_resume_info_llm(resume_text)
             if "error" in extracted_resume_json:
                 raise RuntimeError(f"Error parsing resume: {extracted_resume_json['error']}")
 
@@ -3011,40 +3747,14 @@ def evaluate_resume():
 
                 # Execute the insert query to your 'evaluations' table
   # Execute the insert query
-                    supabase.table('evaluations').insert(data_to_insert).execute()
+                    repos.evaluations.insert(data_to_insert)
                     
                 except Exception as db_error:
                     # Log the database error but don't block the user from seeing results
                     logging.error(f"Could not save evaluation to Supabase: {db_error}")
 
             # --- 5. Get job recommendations ---
-            jobs_response = supabase.table('jobs').select(
-                'id, job_title, company_name, job_description'
-            ).execute()
-            all_jobs_in_db = jobs_response.data or []
-            model = get_embedding_model()
-            resume_embedding = model.encode(resume_text, convert_to_tensor=True)
-            job_recommendations_raw = []
-
-            for job in all_jobs_in_db:
-                description = job.get('job_description')
-                if not description:
-                    continue
-                job_embedding = model.encode(description, convert_to_tensor=True)
-                similarity_score = util.pytorch_cos_sim(resume_embedding, job_embedding).item()
-
-                job_recommendations_raw.append({
-                    'job_id': job['id'],
-                    'job_title': job['job_title'],
-                    'company_name': job['company_name'],
-                    'score': similarity_score
-                })
-
-            recommended_jobs = sorted(
-                job_recommendations_raw,
-                key=lambda x: x['score'],
-                reverse=True
-            )[:5]
+            recommended_jobs = recommend_jobs(resume_text)
 
             # --- 6. Render results ---
             flash('Resume analyzed successfully!', 'success')
@@ -3105,6 +3815,112 @@ def privacy_policy():
 def terms_of_service():
     return render_template('terms_of_service.html')
 
+@app.cli.command('rescreen-knockout')
+@click.argument('job_ids', nargs=-1)
+@click.option('--all-jobs', is_flag=True, help='Re-screen the applications of every job.')
+def rescreen_knockout_command(job_ids, all_jobs):
+    """Re-runs knockout screening for existing applications: flask rescreen-knockout JOB_ID..."""
+    columns = ('id', 'knockout_questions_json')
+    if all_jobs:
+        jobs = repos.jobs.all(columns)
+    elif job_ids:
+        jobs = repos.jobs.by_ids(job_ids, columns)
+    else:
+        raise click.UsageError("Pass one or more job ids, or --all-jobs.")
+    for job in jobs:
+        click.echo(json.dumps(rescreen_job_applications(job)))
+
+@app.cli.command('sync-candidate-embeddings')
+@click.argument('job_ids', nargs=-1)
+@click.option('--all-jobs', is_flag=True, help="Index the applicants of every job.")
+def sync_candidate_embeddings_command(job_ids, all_jobs):
+    """Embeds applicant profiles missing from the per-job candidate index: flask sync-candidate-embeddings JOB_ID..."""
+    if all_jobs:
+        job_ids = [job['id'] for job in repos.jobs.all(('id',))]
+    elif not job_ids:
+        raise click.UsageError("Pass one or more job ids, or --all-jobs.")
+    for job_id in job_ids:
+        click.echo(json.dumps({'job_id': job_id, **sync_applicant_embeddings(job_id)}))
+
+@app.cli.command('build-job-index')
+def build_job_index_command():
+    """Rebuilds the approximate job index now instead of waiting for the automatic rebuild."""
+    click.echo(json.dumps(job_index.rebuild() or {'built': False, 'reason': 'another build is running'}))
+
+@app.cli.command('reconcile-job-stats')
+@click.argument('job_ids', nargs=-1)
+@click.option('--all-jobs', is_flag=True, help="Recount the dashboard counters of every job.")
+def reconcile_job_stats_command(job_ids, all_jobs):
+    """Recomputes HR dashboard counters from the applications: flask reconcile-job-stats JOB_ID..."""
+    if all_jobs:
+        job_ids = [job['id'] for job in repos.jobs.all(('id',))]
+    elif not job_ids:
+        raise click.UsageError("Pass one or more job ids, or --all-jobs.")
+    for job_id in job_ids:
+        click.echo(json.dumps(reconcile_job_stats(job_id)))
+
+@app.cli.command('sync-job-embeddings')
+def sync_job_embeddings_command():
+    """Embeds new or edited jobs and drops deleted ones from the recommendation matrix."""
+    click.echo(json.dumps(sync_job_embeddings()))
+
+def warm_up():
+    """
+    Pays the deferred import and connection costs before the first request: the Supabase client,
+    PyMuPDF, the LLM SDKs and chains, the embedding model (unless a sidecar serves embeddings) and
+    the job index. Each step is independent; a failure is logged and left to the first request.
+    """
+    steps = [
+        ('supabase', lambda: supabase.table),
+        ('pymupdf', lambda: fitz.open),
+        ('llm', llm_gateway.warm_up),
+        ('embedding_model', lambda: sidecar_available() or get_embedding_model()),
+        ('job_index', job_index.refresh),
+    ]
+    started = time.perf_counter()
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logging.warning(f"Warm-up step {name} failed: {e}")
+            continue
+        logging.info(f"Warm-up step {name} took {time.perf_counter() - step_started:.2f}s")
+    logging.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+_warm_up_threads = {}
+_warm_up_lock = threading.Lock()
+
+
+def start_warm_up() -> threading.Thread:
+    """
+    Runs warm_up() in a daemon thread so the worker accepts requests meanwhile. At most once per
+    process: threads do not survive fork, so a forked worker starts its own.
+    """
+    with _warm_up_lock:
+        thread = _warm_up_threads.get(os.getpid())
+        if thread is None:
+            thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+            thread.start()
+            _warm_up_threads[os.getpid()] = thread
+        return thread
+
+
+def create_app(warm: Optional[bool] = None):
+    """
+    Entry point for servers (wsgi.py). Routes are registered on the module-level `app` at import,
+    which stays cheap; with `warm` (default: WARM_UP env var) the heavy imports and clients are
+    loaded in the background. gunicorn.conf.py also starts it from post_worker_init, which covers
+    preload_app, where this runs in the master before workers fork.
+    """
+    if warm is None:
+        warm = os.getenv('WARM_UP', 'false').lower() == 'true'
+    if warm:
+        start_warm_up()
+    return app
+
+
 PORT = int(os.environ.get("PORT", 8080))
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=PORT)
@@ -0,0 +1,395 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from lazy import LazyModule
+
+jwt = LazyModule('jwt')
+httpx = LazyModule('httpx')
+
+# Supabase issues user access tokens for this audience.
+SUPABASE_AUDIENCE = 'authenticated'
+
+
+class TokenError(Exception):
+    """The session's access token is invalid, could not be verified, or could not be refreshed."""
+
+
+class TokenExpired(TokenError):
+    """The access token's `exp` has passed; the refresh token may still renew the session."""
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class VerifiedTokenCache:
+    """
+    Claims of recently verified access tokens, keyed by a hash of the token. An entry lives for
+    `ttl` seconds or until the token expires, whichever comes first, so a sign-out elsewhere is
+    noticed within `ttl` even though verification itself is local.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = _digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, valid_until = entry
+            if time.time() >= valid_until:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token: str, claims: dict):
+        valid_until = min(time.time() + self.ttl, float(claims.get('exp', 0)))
+        with self._lock:
+            self._entries[_digest(token)] = (claims, valid_until)
+            self._entries.move_to_end(_digest(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str):
+        with self._lock:
+            self._entries.pop(_digest(token), None)
+
+
+class RefreshLedger:
+    """
+    Records refresh-token rotations in a SQLite file shared by every worker on the host.
+
+    Supabase refresh tokens are single use: spending one twice (two workers refreshing the same
+    browser session) can revoke the whole session. A worker claims a refresh token before spending
+    it; the resulting session is stored under the old token's hash, so whichever worker sees the
+    browser's next request swaps it into the cookie.
+
+    A stored session is a live credential, so it is only kept until that cookie has been written
+    (`discard`) and never served after `retention` seconds: an old cookie cannot follow the
+    rotation chain later on.
+    """
+
+    def __init__(self, db_path: str, claim_timeout: float = 30.0, retention: float = 600.0):
+        self.db_path = db_path
+        self.claim_timeout = claim_timeout
+        self.retention = retention
+        self._db_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        if not self._db_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_refreshes ("
+                "refresh_hash TEXT PRIMARY KEY, session TEXT, claimed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_token_refreshes_claimed_at ON token_refreshes(claimed_at)")
+            # The renewed sessions are credentials.
+            os.chmod(self.db_path, 0o600)
+            self._db_ready = True
+        return conn
+
+    def claim(self, refresh_token: str) -> bool:
+        """True if this caller should spend the refresh token: nobody has, or a claim went stale."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT session, claimed_at FROM token_refreshes WHERE refresh_hash = ?", (_digest(refresh_token),)
+            ).fetchone()
+            if row is not None and (row[0] is not None or now - row[1] < self.claim_timeout):
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO token_refreshes (refresh_hash, session, claimed_at) VALUES (?, NULL, ?)",
+                (_digest(refresh_token), now)
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, refresh_token: str, session: dict):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE token_refreshes SET session = ?, claimed_at = ? WHERE refresh_hash = ?",
+                (json.dumps(session), now, _digest(refresh_token))
+            )
+            conn.execute("DELETE FROM token_refreshes WHERE claimed_at < ?", (now - self.retention,))
+        finally:
+            conn.close()
+
+    def discard(self, refresh_token: str):
+        """Drops the session that replaced `refresh_token`'s, once the browser's cookie holds it."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM token_refreshes WHERE refresh_hash = ?", (_digest(refresh_token),))
+        finally:
+            conn.close()
+
+    def release(self, refresh_token: str):
+        """Drops a claim whose refresh failed, so the next request may try again."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "DELETE FROM token_refreshes WHERE refresh_hash = ? AND session IS NULL", (_digest(refresh_token),)
+            )
+        finally:
+            conn.close()
+
+    def lookup(self, refresh_token: str) -> Optional[dict]:
+        """The session that replaced `refresh_token`'s, once its refresh has completed."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT session FROM token_refreshes WHERE refresh_hash = ? AND claimed_at >= ?",
+                (_digest(refresh_token), time.time() - self.retention)
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def wait(self, refresh_token: str, timeout: float) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            session = self.lookup(refresh_token)
+            if session is not None or time.monotonic() >= deadline:
+                return session
+            time.sleep(0.1)
+
+
+class TokenVerifier:
+    """
+    Checks the Supabase access token kept in the Flask session without a network round trip.
+
+    Tokens signed with the project's JWT secret (HS256) are checked against SUPABASE_JWT_SECRET;
+    asymmetrically signed tokens against the project's JWKS, fetched once and cached. Either way
+    the audience and the issuer (the project's auth URL) must match. Verified
+    claims are cached for a short TTL. `get_user(access_token)` (Supabase's auth.get_user) is only
+    called on a cache miss that cannot be verified locally: no secret configured and no JWKS key.
+
+    When a token is within `refresh_margin` seconds of expiry it is renewed in the background with
+    the session's refresh token; an already expired one is renewed before the request proceeds.
+    """
+
+    def __init__(self, supabase_url: str, api_key: str, get_user: Callable[[str], Optional[str]],
+                 ledger: RefreshLedger, jwt_secret: Optional[str] = None, jwks_url: Optional[str] = None,
+                 jwks_ttl: float = 600.0, cache: Optional[VerifiedTokenCache] = None, refresh_margin: float = 300.0,
+                 refresh_wait: float = 10.0, issuer: Optional[str] = None):
+        self.supabase_url = (supabase_url or '').rstrip('/')
+        self.api_key = api_key
+        self.get_user = get_user
+        self.ledger = ledger
+        self.jwt_secret = jwt_secret
+        self.jwks_url = jwks_url or f"{self.supabase_url}/auth/v1/.well-known/jwks.json"
+        self.jwks_ttl = jwks_ttl
+        self.issuer = issuer or f"{self.supabase_url}/auth/v1"
+        self.cache = cache or VerifiedTokenCache()
+        self.refresh_margin = refresh_margin
+        self.refresh_wait = refresh_wait
+        self._jwks_client = None
+        self._jwks_down_until = 0.0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _jwks(self):
+        with self._lock:
+            if self._jwks_client is None:
+                self._jwks_client = jwt.PyJWKClient(
+                    self.jwks_url, cache_keys=True, lifespan=self.jwks_ttl, headers={'apikey': self.api_key}, timeout=5
+                )
+            return self._jwks_client
+
+    def _signing_key(self, token: str) -> tuple:
+        """(key, algorithm) to check `token` with, or (None, None) if there is nothing to check it against."""
+        algorithm = jwt.get_unverified_header(token).get('alg')
+        if algorithm == 'HS256':
+            return (self.jwt_secret, algorithm) if self.jwt_secret else (None, None)
+        if time.monotonic() < self._jwks_down_until:
+            return None, None
+        try:
+            key = self._jwks().get_signing_key_from_jwt(token)
+        except jwt.PyJWKClientConnectionError as e:
+            logging.warning(f"Could not fetch the auth JWKS, verifying tokens remotely for a while: {e}")
+            self._jwks_down_until = time.monotonic() + 60
+            return None, None
+        except jwt.PyJWKClientError:
+            # No key for this token's kid even after a refetch (e.g. a legacy HS256 project).
+            return None, None
+        return key.key, key.algorithm_name
+
+    def _verify_locally(self, token: str) -> Optional[dict]:
+        key, algorithm = self._signing_key(token)
+        if key is None:
+            return None
+        return jwt.decode(token, key, algorithms=[algorithm], audience=SUPABASE_AUDIENCE, issuer=self.issuer,
+                          options={'require': ['exp', 'sub']})
+
+    def _verify_remotely(self, token: str) -> dict:
+        claims = jwt.decode(token, options={'verify_signature': False})
+        if float(claims.get('exp', 0)) <= time.time():
+            raise TokenExpired("access token expired")
+        try:
+            user_id = self.get_user(token)
+        except Exception as e:
+            raise TokenError(f"auth.get_user failed: {e}") from e
+        if not user_id:
+            raise TokenError("auth.get_user returned no user")
+        return {**claims, 'sub': user_id}
+
+    def verify(self, token: str) -> dict:
+        """Claims of a valid access token; raises TokenExpired or TokenError otherwise."""
+        claims = self.cache.get(token)
+        if claims is not None:
+            return claims
+        try:
+            claims = self._verify_locally(token)
+            if claims is None:
+                claims = self._verify_remotely(token)
+        except jwt.ExpiredSignatureError as e:
+            raise TokenExpired("access token expired") from e
+        except jwt.PyJWTError as e:
+            raise TokenError(f"invalid access token: {e}") from e
+        self.cache.put(token, claims)
+        return claims
+
+    def forget(self, token: str):
+        """Stops trusting a token this worker has cached, e.g. on logout."""
+        self.cache.discard(token)
+
+    def discard_renewal(self, refresh_token: Optional[str]):
+        """
+        Deletes the ledger's copy of the session that replaced `refresh_token`'s. Call it once the
+        renewed session is in the cookie, and on logout. Best effort: the row expires anyway.
+        """
+        if not refresh_token:
+            return
+        try:
+            self.ledger.discard(refresh_token)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not drop a renewed session from the refresh ledger: {e}")
+
+    def _refresh_remote(self, refresh_token: str) -> dict:
+        response = httpx.post(
+            f"{self.supabase_url}/auth/v1/token", params={'grant_type': 'refresh_token'},
+            json={'refresh_token': refresh_token}, headers={'apikey': self.api_key}, timeout=10
+        )
+        if response.status_code != 200:
+            raise TokenError(f"token refresh failed with HTTP {response.status_code}")
+        session = response.json()
+        if not session.get('access_token') or not session.get('refresh_token'):
+            raise TokenError("token refresh returned no session")
+        return session
+
+    def refresh(self, refresh_token: str) -> dict:
+        """The renewed session for `refresh_token`, spending it here unless another worker already is."""
+        if not self.ledger.claim(refresh_token):
+            session = self.ledger.wait(refresh_token, self.refresh_wait)
+            if session is None:
+                raise TokenError("session refresh by another worker did not complete")
+            return session
+        try:
+            session = self._refresh_remote(refresh_token)
+        except Exception as e:
+            self.ledger.release(refresh_token)
+            raise e if isinstance(e, TokenError) else TokenError(f"token refresh failed: {e}")
+        self.ledger.complete(refresh_token, session)
+        return session
+
+    def refresh_in_background(self, refresh_token: str):
+        with self._lock:
+            if refresh_token in self._refreshing:
+                return
+            self._refreshing.add(refresh_token)
+
+        def run():
+            try:
+                if self.ledger.claim(refresh_token):
+                    try:
+                        session = self._refresh_remote(refresh_token)
+                    except Exception:
+                        self.ledger.release(refresh_token)
+                        raise
+                    self.ledger.complete(refresh_token, session)
+            except Exception as e:
+                logging.warning(f"Background session refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(refresh_token)
+
+        threading.Thread(target=run, name='token-refresh', daemon=True).start()
+
+    def authenticate(self, user_session: dict) -> tuple:
+        """
+        Verifies a stored Supabase session. Returns (claims, session): `session` is `user_session`
+        itself, or the renewed session that should replace it in the cookie (then call
+        `discard_renewal` with the old refresh token). Refresh ledger failures raise TokenError.
+        """
+        try:
+            return self._authenticate(user_session)
+        except sqlite3.Error as e:
+            raise TokenError(f"refresh ledger unavailable: {e}") from e
+
+    def _authenticate(self, user_session: dict) -> tuple:
+        refresh_token = user_session.get('refresh_token')
+        # Pick up renewals finished since this cookie was written (possibly by another worker).
+        for _ in range(3):
+            renewed = self.ledger.lookup(refresh_token) if refresh_token else None
+            if renewed is None:
+                break
+            user_session, refresh_token = renewed, renewed.get('refresh_token')
+
+        access_token = user_session.get('access_token')
+        if not access_token:
+            raise TokenError("no access token in session")
+        try:
+            claims = self.verify(access_token)
+        except TokenExpired:
+            if not refresh_token:
+                raise
+            user_session = self.refresh(refresh_token)
+            return self.verify(user_session['access_token']), user_session
+
+        if refresh_token and float(claims.get('exp', 0)) - time.time() < self.refresh_margin:
+            self.refresh_in_background(refresh_token)
+        return claims, user_session
+
+
+def create_token_verifier(supabase_url: str, api_key: str, get_user: Callable[[str], Optional[str]]) -> TokenVerifier:
+    """Builds the verifier from environment settings."""
+    db_path = os.getenv('AUTH_REFRESH_DB', os.path.join('cache', 'auth_refresh.sqlite3'))
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return TokenVerifier(
+        supabase_url, api_key, get_user,
+        ledger=RefreshLedger(db_path, retention=float(os.getenv('AUTH_REFRESH_RETENTION_SECONDS', 600))),
+        jwt_secret=os.getenv('SUPABASE_JWT_SECRET') or None,
+        jwks_url=os.getenv('SUPABASE_JWKS_URL') or None,
+        issuer=os.getenv('SUPABASE_JWT_ISSUER') or None,
+        jwks_ttl=float(os.getenv('AUTH_JWKS_TTL', 600)),
+        cache=VerifiedTokenCache(
+            ttl=float(os.getenv('AUTH_TOKEN_CACHE_TTL', 60)),
+            max_entries=int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 4096))
+        ),
+        refresh_margin=float(os.getenv('AUTH_REFRESH_MARGIN', 300)),
+    )
@@ -0,0 +1,88 @@
+"""
+Benchmark: IVF-flat job index vs exact search, recall@k and latency per query.
+
+    python benchmarks/bench_ann.py [--jobs 100000] [--dim 384] [--queries 200] [--nprobe 4 8 16 32]
+
+Job vectors are synthetic but clustered (job descriptions bunch by role and industry, which is
+what IVF relies on). Exact search is the EmbeddingMatrix used below ANN_MIN_ITEMS. After the
+build the benchmark also inserts, edits and deletes jobs through the store and checks the index
+reflects them without a rebuild.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_index import EmbeddingMatrix, EmbeddingStore  # noqa: E402
+from ivf_index import VectorIndex  # noqa: E402
+
+TOP_K = 5
+MODEL = 'bench'
+
+
+def clustered(rng, n: int, dim: int, clusters: int, spread: float = 0.6) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + spread * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def timed_queries(search, queries) -> tuple:
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append([item_id for item_id, _ in search(query, TOP_K)])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    vectors = clustered(rng, args.jobs + args.queries, args.dim, clusters=max(8, args.jobs // 500))
+    job_vectors, queries = vectors[:args.jobs], vectors[args.jobs:]
+    job_ids = [f"job-{i}" for i in range(args.jobs)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = EmbeddingStore(os.path.join(directory, 'embeddings.sqlite3'))
+        store.upsert_many('jobs', ((job_id, vector, '') for job_id, vector in zip(job_ids, job_vectors)), MODEL)
+
+        exact = EmbeddingMatrix(store, 'jobs', MODEL)
+        exact.refresh(force=True)
+        truth, exact_p50, exact_p99 = timed_queries(exact.top_k, queries)
+
+        index = VectorIndex(store, 'jobs', MODEL, os.path.join(directory, 'index'), min_items=1, auto_rebuild=False)
+        build = index.rebuild()
+        print(f"{args.jobs} jobs x {args.dim} dims, {args.queries} queries, top-{TOP_K}")
+        print(f"  build: {build['seconds']:.2f} s, nlist={build['nlist']}")
+        print(f"  exact:          p50 {exact_p50:7.3f} ms  p99 {exact_p99:7.3f} ms  recall 1.000")
+        for nprobe in args.nprobe:
+            index.nprobe = nprobe
+            found, p50, p99 = timed_queries(index.top_k, queries)
+            recall = np.mean([len(set(a) & set(b)) / TOP_K for a, b in zip(found, truth)])
+            print(f"  ivf nprobe={nprobe:<3d} p50 {p50:7.3f} ms  p99 {p99:7.3f} ms  recall {recall:.3f}")
+
+        # Incremental updates: a new job equal to a query must be found first, edits and deletes must stick.
+        query = queries[0]
+        store.upsert('jobs', 'job-new', query, MODEL, '')
+        store.upsert('jobs', truth[0][0], -query, MODEL, '')
+        store.delete('jobs', [truth[0][1]])
+        index.refresh(force=True)
+        hits = [item_id for item_id, _ in index.top_k(query, TOP_K)]
+        assert hits[0] == 'job-new', hits
+        assert truth[0][0] not in hits and truth[0][1] not in hits, hits
+        print("  incremental insert/edit/delete: ok")
+
+
+if __name__ == '__main__':
+    main()
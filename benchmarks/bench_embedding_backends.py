@@ -0,0 +1,104 @@
+"""
+Benchmark: embedding backends (torch fp32, int8 dynamic quantization, ONNX), ranking agreement
+and throughput.
+
+    python benchmarks/bench_embedding_backends.py [--backends torch int8 onnx] [--seconds 5]
+
+Accuracy: jobs_data.json only holds two postings, so the catalog is every posting plus its
+paragraphs and longer lines, and the queries are every stored candidate resume plus
+extracted_resume.json. For each backend the top-5 catalog entries per query must come back in
+the same order as with torch; the smallest cosine between a backend's vector and torch's is
+reported too. Exits with status 1 if any ranking differs.
+
+Throughput: sentences/sec encoding the catalog repeatedly, in batches of 32 and one at a time
+(the evaluate_resume case). Needs the embedding model to be downloadable or cached.
+"""
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from embeddings import load_embedding_model  # noqa: E402
+
+TOP_K = 5
+
+
+def fixtures() -> tuple:
+    with open(os.path.join(ROOT, 'jobs_data.json')) as f:
+        jobs = json.load(f)
+    catalog, queries = [], []
+    for job in jobs.values():
+        description = job['job_description']
+        text = description.replace('\r', '')
+        catalog.append(description)
+        catalog.extend(p.strip() for p in text.split('\n\n') if len(p.strip()) > 40)
+        catalog.extend(line.strip() for line in text.split('\n') if len(line.strip()) > 40)
+        candidates = job.get('candidates') or {}
+        if isinstance(candidates, str):
+            candidates = ast.literal_eval(candidates)
+        queries.extend(json.dumps(c['extracted_info']) for c in candidates.values() if c.get('extracted_info'))
+    with open(os.path.join(ROOT, 'extracted_resume.json')) as f:
+        queries.append(json.dumps(json.load(f)))
+    return list(dict.fromkeys(catalog)), queries
+
+
+def encode(model, texts, batch_size: int = 32) -> np.ndarray:
+    return np.asarray(model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True),
+                      dtype=np.float32)
+
+
+def rankings(model, catalog, queries) -> tuple:
+    catalog_vectors = encode(model, catalog)
+    query_vectors = encode(model, queries)
+    return np.argsort(-(query_vectors @ catalog_vectors.T), axis=1)[:, :TOP_K], catalog_vectors
+
+
+def throughput(model, texts, batch_size: int, seconds: float) -> float:
+    encoded, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        if batch_size == 1:
+            for text in texts:
+                encode(model, [text], batch_size=1)
+        else:
+            encode(model, texts, batch_size=batch_size)
+        encoded += len(texts)
+    return encoded / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backends', nargs='+', default=['torch', 'int8', 'onnx'])
+    parser.add_argument('--seconds', type=float, default=5.0, help="Time spent per throughput measurement.")
+    args = parser.parse_args()
+
+    catalog, queries = fixtures()
+    print(f"catalog {len(catalog)} texts, {len(queries)} resume queries, top-{TOP_K}")
+    reference, reference_vectors = rankings(load_embedding_model('torch'), catalog, queries)
+
+    agreed = True
+    for backend in args.backends:
+        try:
+            model = load_embedding_model(backend)
+        except Exception as e:
+            print(f"  {backend:<6} unavailable: {e}")
+            continue
+        ranked, vectors = rankings(model, catalog, queries)
+        same = bool((ranked == reference).all())
+        agreed &= same
+        min_cosine = float((vectors * reference_vectors).sum(axis=1).min())
+        batched = throughput(model, catalog, 32, args.seconds)
+        single = throughput(model, catalog, 1, args.seconds)
+        print(f"  {backend:<6} top-{TOP_K} {'same' if same else 'DIFFERENT'}  min cosine vs torch {min_cosine:.4f}  "
+              f"{batched:7.1f} sentences/s batched  {single:7.1f} sentences/s one at a time")
+    sys.exit(0 if agreed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark: embedding in every worker vs the shared sidecar, memory and request latency.
+
+    python benchmarks/bench_embedding_service.py [--workers 4] [--threads 4] [--requests 50]
+
+Simulates gunicorn: `--workers` processes with `--threads` threads each encode a resume-sized
+text per request (the evaluate_resume recommendation step). Each mode runs in fresh processes;
+memory is the resident set of every process involved, read from /proc (Linux only). Needs the
+embedding model to be downloadable or cached.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rss_mb(pid) -> float:
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def sample_texts() -> list:
+    with open(os.path.join(ROOT, 'jobs_data.json')) as f:
+        texts = [job['job_description'] for job in json.load(f).values()]
+    with open(os.path.join(ROOT, 'extracted_resume.json')) as f:
+        texts.append(json.dumps(json.load(f)))
+    return texts
+
+
+def _worker(threads: int, requests: int, results, ready, go):
+    from embeddings import encode_normalized
+
+    texts = sample_texts()
+    first_started = time.perf_counter()
+    encode_normalized(texts[:1])  # the first request a worker serves
+    first_ms = (time.perf_counter() - first_started) * 1000
+    ready.set()
+    go.wait()
+
+    latencies = []
+
+    def run(offset):
+        for i in range(requests):
+            started = time.perf_counter()
+            encode_normalized([texts[(offset + i) % len(texts)]])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((os.getpid(), first_ms, latencies, rss_mb(os.getpid())))
+
+
+def run_mode(name: str, args, sidecar_pid=None) -> None:
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    go = context.Event()
+    readies = [context.Event() for _ in range(args.workers)]
+    processes = [
+        context.Process(target=_worker, args=(args.threads, args.requests, results, ready, go))
+        for ready in readies
+    ]
+    for process in processes:
+        process.start()
+    for process, ready in zip(processes, readies):
+        while not ready.wait(0.5):
+            if not process.is_alive():  # e.g. the model could not be loaded
+                raise SystemExit(f"{name} worker exited before its first request finished")
+    started = time.perf_counter()
+    go.set()
+    collected = [results.get() for _ in processes]
+    wall = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    latencies = np.array([ms for _, _, worker_latencies, _ in collected for ms in worker_latencies])
+    worker_rss = sum(rss for _, _, _, rss in collected)
+    sidecar_rss = rss_mb(sidecar_pid) if sidecar_pid else 0.0
+    first_ms = max(first for _, first, _, _ in collected)
+    print(f"  {name:<11} p50 {np.percentile(latencies, 50):7.1f} ms  p99 {np.percentile(latencies, 99):7.1f} ms  "
+          f"{len(latencies) / wall:6.1f} req/s  first request {first_ms:7.0f} ms  "
+          f"RSS workers {worker_rss:6.0f} MB + sidecar {sidecar_rss:5.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=50, help="Requests per thread.")
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.threads} threads x {args.requests} requests")
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, 'embedding.sock')
+        os.environ['EMBEDDING_SOCKET'] = socket_path  # nothing listens yet: in-process mode
+        run_mode('in-process', args)
+
+        sidecar = subprocess.Popen([sys.executable, os.path.join(ROOT, 'embedding_service.py'), '--socket', socket_path],
+                                   cwd=ROOT)
+        try:
+            while not os.path.exists(socket_path):
+                if sidecar.poll() is not None:
+                    raise SystemExit("embedding sidecar exited during startup")
+                time.sleep(0.1)
+            run_mode('sidecar', args, sidecar.pid)
+        finally:
+            sidecar.terminate()
+            sidecar.wait()
+
+
+if __name__ == '__main__':
+    main()
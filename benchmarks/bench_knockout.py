@@ -0,0 +1,168 @@
+"""
+Micro-benchmark: per-application cost of knockout screening, legacy vs precompiled rules.
+
+    python benchmarks/bench_knockout.py [--iterations 20000]
+
+The legacy implementation is copied here verbatim (minus logging) so the comparison keeps
+working after app.py moved on. Both paths are also checked to return identical results.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knockout_rules import KnockoutRuleCache, ResumeFeatures  # noqa: E402
+
+
+# --- Legacy implementation (app.py before precompiled rules) ---
+def _parse_duration_to_years(duration_str: str) -> float:
+    if not duration_str:
+        return 0.0
+    duration_str = duration_str.strip()
+    total_years = 0.0
+    years_match = re.search(r'(\d+)\s*year', duration_str, re.IGNORECASE)
+    months_match = re.search(r'(\d+)\s*month', duration_str, re.IGNORECASE)
+    if years_match or months_match:
+        if years_match:
+            total_years += float(years_match.group(1))
+        if months_match:
+            total_years += float(months_match.group(1)) / 12.0
+        return round(total_years, 2)
+    range_match = re.findall(r'\b(\d{4})\b', duration_str)
+    if len(range_match) >= 1:
+        start_year = int(range_match[0])
+        end_year = 0
+        if 'present' in duration_str.lower() or 'current' in duration_str.lower():
+            end_year = datetime.now().year
+        elif len(range_match) == 2:
+            end_year = int(range_match[1])
+        if end_year > 0:
+            year_diff = end_year - start_year
+            if year_diff == 0:
+                return 0.5
+            return float(year_diff)
+    return 0.0
+
+
+def legacy_experience_years(resume_json):
+    return sum(_parse_duration_to_years(exp.get('duration', '')) for exp in resume_json.get('experience', []))
+
+
+def stored_experience_years(resume_json):
+    return resume_json['total_experience_years']
+
+
+def _check_experience(criterion, total_years):
+    try: return total_years >= float(criterion.get('value', 999))
+    except (ValueError, TypeError): return False
+
+
+def _check_education(criterion, education_entries):
+    DEGREE_ALIASES = {"bachelor": ["b.sc", "b.s.", "b.a.", "bachelor"], "master": ["m.sc", "m.s.", "master"], "phd": ["ph.d.", "phd", "doctorate"]}
+    required_keywords = [k.lower() for k in criterion.get('keywords', [])]
+    if not required_keywords: return False
+    education_text = ' '.join(f"{edu.get('degree', '')}" for edu in education_entries).lower()
+    for keyword in required_keywords:
+        aliases = DEGREE_ALIASES.get(keyword, [keyword])
+        if any(alias in education_text for alias in aliases):
+            return True
+    return False
+
+
+def _check_location(criterion, resume_json):
+    try:
+        required_location = str(criterion.get('value', 'a_very_unlikely_string')).lower()
+        searchable_text = json.dumps(resume_json.get('experience', []) + resume_json.get('education', [])).lower()
+        if required_location in searchable_text: return True
+        return required_location in f"{resume_json.get('name', '')} {resume_json.get('phone', '')}".lower()
+    except Exception: return False
+
+
+def legacy_check(resume_json, job_obj):
+    knockout_data = job_obj.get("knockout_questions_json", {})
+    if isinstance(knockout_data, str):
+        try:
+            knockout_data = json.loads(knockout_data)
+        except json.JSONDecodeError:
+            knockout_data = {}
+    all_criteria = knockout_data.get("criteria", [])
+    if not all_criteria:
+        return {"passed": True, "score": 100, "met_criteria": [], "missed_criteria": [], "reason": "No knockout criteria defined."}
+    met_criteria, missed_criteria = [], []
+    total_candidate_years = sum(_parse_duration_to_years(exp.get('duration', '')) for exp in resume_json.get('experience', []))
+    for criterion in all_criteria:
+        ctype = criterion.get("type", "").lower()
+        if ctype == "experience_years":
+            (met_criteria if _check_experience(criterion, total_candidate_years) else missed_criteria).append(criterion)
+        elif ctype == "education":
+            (met_criteria if _check_education(criterion, resume_json.get("education", [])) else missed_criteria).append(criterion)
+        elif ctype == "location":
+            (met_criteria if _check_location(criterion, resume_json) else missed_criteria).append(criterion)
+    total_criteria_count = len(all_criteria)
+    met_count = len(met_criteria)
+    score = (met_count / total_criteria_count) * 100 if total_criteria_count > 0 else 100
+    return {
+        "passed": score >= 50, "score": int(score), "met_criteria": met_criteria, "missed_criteria": missed_criteria,
+        "reason": f"Candidate met {met_count} of {total_criteria_count} mandatory criteria ({int(score)}%)."
+    }
+
+
+# --- Fixtures ---
+JOB = {
+    "id": "bench-job",
+    "knockout_questions_json": json.dumps({"criteria": [
+        {"type": "experience_years", "value": 3, "unit": "years", "reason_if_failed": "Needs 3+ years."},
+        {"type": "education", "keywords": ["Bachelor", "Master"], "reason_if_failed": "Needs a degree."},
+        {"type": "location", "value": "Bengaluru", "reason_if_failed": "Must be based in Bengaluru."},
+        {"type": "certification", "value": "AWS", "reason_if_failed": "Needs AWS certification."},
+    ]}),
+}
+
+RESUME = {
+    "name": "Sample Candidate",
+    "phone": "+91 90000 00000",
+    "skills": ["python", "django", "postgresql", "docker"],
+    "experience": [
+        {"title": "Backend Engineer", "company": "Acme, Bengaluru", "duration": "Jan 2021 - Present", "description": "APIs."},
+        {"title": "Intern", "company": "Widgets Ltd", "duration": "6 months", "description": "Testing."},
+        {"title": "Developer", "company": "Foo Corp", "duration": "2018 - 2020", "description": "Web apps."},
+    ],
+    "education": [{"degree": "B.Sc Computer Science", "institution": "State University", "year": "2018"}],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    cache = KnockoutRuleCache()
+    cache.put(JOB["id"], JOB["knockout_questions_json"])
+
+    def compiled_check(resume_json, job_obj):
+        return cache.get(job_obj).evaluate(ResumeFeatures(resume_json, legacy_experience_years))
+
+    # Experience years stored with the resume at extraction time (see experience_timeline.py).
+    def compiled_stored_check(resume_json, job_obj):
+        return cache.get(job_obj).evaluate(ResumeFeatures(resume_json, stored_experience_years))
+
+    assert legacy_check(RESUME, JOB) == compiled_check(RESUME, JOB), "Compiled rules disagree with the legacy implementation"
+    resume_with_years = dict(RESUME, total_experience_years=legacy_experience_years(RESUME))
+
+    cases = (
+        ("legacy", legacy_check, RESUME),
+        ("precompiled", compiled_check, RESUME),
+        ("+ stored years", compiled_stored_check, resume_with_years),
+    )
+    for label, fn, resume in cases:
+        best = min(timeit.repeat(lambda: fn(resume, JOB), number=args.iterations, repeat=5))
+        print(f"{label:>15}: {best / args.iterations * 1e6:8.2f} us/application")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: latency and database queries per request of the read-heavy routes, served offline
+from the SQLite data backend (DATA_BACKEND=sqlite, see repositories.py).
+
+    python benchmarks/bench_routes.py [--jobs 200] [--applicants 300] [--requests 200] [--db PATH]
+
+The database is seeded with synthetic jobs and applications (a temporary file unless --db is
+given); routes are called through Flask's test client with signed-in HR and candidate sessions.
+No route here calls an LLM, so nothing leaves the machine.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PLACEHOLDER_ENV = {
+    'SUPABASE_URL': 'https://placeholder.supabase.co',
+    'SUPABASE_SERVICE_KEY': 'placeholder',
+    'SUPABASE_JWT_SECRET': 'placeholder-jwt-secret-for-offline-benchmarks',
+    'GROQ_API_KEY': 'placeholder',
+    'FLASK_SECRET_KEY': 'placeholder',
+    'HF_HUB_OFFLINE': '1',
+}
+STATUSES = ['Recommended', 'Not Recommended', 'Recommended (Exam Gen Failed)', 'Approved']
+
+
+def seed(repos, jobs: int, applicants: int, rng: random.Random) -> tuple:
+    """Inserts the jobs (all posted by 'hr-bench') and their applications; returns (job ids, application ids)."""
+    job_ids, application_ids = [], []
+    for j in range(jobs):
+        job_id = str(uuid.uuid4())
+        repos.jobs.insert({
+            'id': job_id, 'hr_user_id': 'hr-bench', 'company_name': f"Company {j}", 'job_title': f"Engineer {j}",
+            'job_description': "Build and operate data pipelines in Python. " * 20,
+            'date_posted': f"2026-{1 + j % 12:02d}-{1 + j % 28:02d} {j % 24:02d}:00:00",
+            'knockout_questions_json': '{"criteria": []}',
+        })
+        job_ids.append(job_id)
+        for a in range(applicants):
+            exam_taken = rng.random() < 0.5
+            row = repos.applications.insert({
+                'job_id': job_id, 'candidate_user_id': 'candidate-bench' if a == 0 else str(uuid.uuid4()),
+                'submission_date': f"2026-02-{1 + a % 28:02d}T10:00:00", 'eligibility_status': rng.choice(STATUSES),
+                'match_score': rng.randint(20, 99), 'eligibility_reason': "Synthetic applicant.",
+                'extracted_info': {'name': f"Candidate {a}", 'email': f"c{a}@example.com",
+                                   'skills': ['python', 'sql'], 'projects': [{'title': 'Pipeline', 'link': None}]},
+                'knockout_analysis': {'passed': True, 'score': 100, 'reason': 'ok'},
+                'exam_taken': exam_taken, 'exam_score': rng.randint(0, 30) if exam_taken else None,
+            })
+            application_ids.append(row['id'])
+    return job_ids, application_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--applicants', type=int, default=300, help="applications per job")
+    parser.add_argument('--requests', type=int, default=200, help="requests per route")
+    parser.add_argument('--db', help="SQLite file to seed (default: a temporary one)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_routes_')
+    os.environ.update({'DATA_BACKEND': 'sqlite', 'DATA_SQLITE_DB': args.db or os.path.join(workdir, 'data.sqlite3'),
+                       'JOB_CATALOG_STAMP': os.path.join(workdir, 'job_catalog.stamp')})
+    for key, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(key, value)
+
+    import jwt
+    import app as web
+
+    rng = random.Random(7)
+    started = time.perf_counter()
+    job_ids, application_ids = seed(web.repos, args.jobs, args.applicants, rng)
+    for job_id in job_ids:
+        web.reconcile_job_stats(job_id)
+    print(f"Seeded {len(job_ids)} jobs and {len(application_ids)} applications in {time.perf_counter() - started:.1f}s")
+
+    # Count the queries each request makes through the repositories' call hook.
+    queries = []
+    db = web.repos.jobs.repository.db
+    tracked = db.call
+
+    @contextmanager
+    def counting(name):
+        queries.append(name)
+        with tracked(name):
+            yield
+    db.call = counting
+
+    client = web.app.test_client()
+
+    def sign_in(user_id, is_hr):
+        token = jwt.encode({'sub': user_id, 'aud': 'authenticated', 'exp': int(time.time()) + 3600,
+                            'iss': f"{os.environ['SUPABASE_URL'].rstrip('/')}/auth/v1"},
+                           os.environ['SUPABASE_JWT_SECRET'], algorithm='HS256')
+        with client.session_transaction() as session:
+            session['user_info'] = {'id': user_id, 'email': f"{user_id}@example.com", 'is_hr': is_hr}
+            session['user_session'] = {'access_token': token}
+
+    routes = [
+        ('candidate', 'job board page', lambda: '/api/jobs?limit=12'),
+        ('candidate', 'client_portal', lambda: '/client_portal'),
+        ('hr', 'hr_dashboard', lambda: '/hr_dashboard'),
+        ('hr', 'applicants page', lambda: f"/hr/jobs/{rng.choice(job_ids)}/applicants?sort={rng.choice(['match_score', 'name', 'submitted'])}"),
+        ('hr', 'application details', lambda: f"/hr/applications/{rng.choice(application_ids)}"),
+    ]
+    print(f"{'route':<22}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}")
+    for role, label, path in routes:
+        sign_in('hr-bench' if role == 'hr' else 'candidate-bench', role == 'hr')
+        timings, counts = [], []
+        for _ in range(args.requests):
+            url = path()
+            del queries[:]
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            counts.append(len(queries))
+            if response.status_code != 200:
+                raise SystemExit(f"{url} returned {response.status_code}")
+        timings.sort()
+        print(f"{label:<22}{statistics.median(timings):>9.2f}{timings[int(len(timings) * 0.95) - 1]:>9.2f}"
+              f"{statistics.mean(counts):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: cold import time of the web app, from `python -X importtime`, tracked over time.
+
+    python benchmarks/bench_startup.py [--module wsgi] [--runs 5] [--top 15] [--record]
+
+Each run imports the module in a fresh interpreter with placeholder credentials (nothing
+connects at import). The median run's breakdown of what app.py imports is printed. With
+--record a summary line is appended to cache/startup_history.jsonl (local to the machine, not
+tracked), so regressions show up against earlier runs there.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY = os.path.join(ROOT, 'cache', 'startup_history.jsonl')
+
+PLACEHOLDER_ENV = {
+    'SUPABASE_URL': 'https://placeholder.supabase.co',
+    'SUPABASE_SERVICE_KEY': 'placeholder',
+    'GROQ_API_KEY': 'placeholder',
+    'FLASK_SECRET_KEY': 'placeholder',
+}
+
+
+def parse_importtime(stderr: str) -> list:
+    """(depth, cumulative_us, module) per line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((depth, int(cumulative), name.strip()))
+    return rows
+
+
+def direct_imports(rows: list, parent: str) -> dict:
+    """Cumulative ms of each module imported directly by `parent` (children precede their parent)."""
+    children, pending = {}, {}
+    for depth, cumulative, name in rows:
+        if name == parent:
+            children = pending.get(depth + 1, {})
+            break
+        pending.setdefault(depth, {})[name] = pending.get(depth, {}).get(name, 0) + cumulative / 1000
+        for deeper in [d for d in pending if d > depth]:
+            del pending[deeper]
+    return children
+
+
+def run_once(module: str) -> tuple:
+    env = dict(os.environ)
+    for key, value in PLACEHOLDER_ENV.items():
+        env.setdefault(key, value)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    target = next(cumulative for depth, cumulative, name in rows if depth == 0 and name == module)
+    return target / 1000, wall_ms, rows
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--module', default='wsgi', help="Module to import (wsgi, or app before the factory existed).")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="How many of app's heaviest direct imports to list.")
+    parser.add_argument('--record', action='store_true', help="Append the result to cache/startup_history.jsonl.")
+    args = parser.parse_args()
+
+    runs = sorted((run_once(args.module) for _ in range(args.runs)), key=lambda run: run[0])
+    import_ms, wall_ms, rows = runs[len(runs) // 2]
+    direct = direct_imports(rows, 'app') or direct_imports(rows, args.module)
+
+    print(f"import {args.module}: median {import_ms:.0f} ms "
+          f"(min {runs[0][0]:.0f}, max {runs[-1][0]:.0f}), interpreter wall {wall_ms:.0f} ms, {len(rows)} modules")
+    for name, ms in sorted(direct.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if os.path.exists(HISTORY):
+        with open(HISTORY) as f:
+            previous = [json.loads(line) for line in f if line.strip()]
+        if previous:
+            print("history (most recent last):")
+            for entry in previous[-5:]:
+                print(f"  {entry['date']}  {entry['revision'] or '-':>8}  {entry['module']:<5} {entry['import_ms']:7.0f} ms")
+
+    if args.record:
+        entry = {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'module': args.module,
+            'import_ms': round(import_ms, 1),
+            'modules': len(rows),
+            'python': platform.python_version(),
+            'top': {name: round(ms, 1) for name, ms in sorted(direct.items(), key=lambda item: -item[1])[:5]},
+        }
+        os.makedirs(os.path.dirname(HISTORY), exist_ok=True)
+        with open(HISTORY, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: duration-string parsing throughput, legacy _parse_duration_to_years vs experience_timeline.
+
+    python benchmarks/bench_timeline.py [--strings 200000] [--unique 20000]
+
+The corpus mixes the formats seen in extracted resumes ("Jan 2021 - Present", "03/2019 - 05/2021",
+"2 years 3 months", "2018 - 2020", ...). Real traffic repeats the same strings a lot, so the corpus
+is drawn from a smaller pool of unique strings; the cold run clears the memo first.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_knockout import _parse_duration_to_years as legacy_duration_years  # noqa: E402
+from experience_timeline import _parse, duration_years  # noqa: E402
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec",
+               "January", "March", "September", "Sept."]
+
+
+def make_duration(rng: random.Random) -> str:
+    start = rng.randint(2005, 2025)
+    end = min(start + rng.randint(0, 6), 2026)
+    month_a, month_b = rng.randint(1, 12), rng.randint(1, 12)
+    return rng.choice([
+        lambda: f"{rng.choice(MONTH_NAMES)} {start} - {rng.choice(MONTH_NAMES)} {end}",
+        lambda: f"{rng.choice(MONTH_NAMES)} {start} – Present",
+        lambda: f"{month_a:02d}/{start} - {month_b:02d}/{end}",
+        lambda: f"{start}-{month_a:02d} to {end}-{month_b:02d}",
+        lambda: f"{start} - {end}",
+        lambda: f"{rng.randint(1, 12)} years {rng.randint(1, 11)} months",
+        lambda: f"{rng.randint(1, 11)} months",
+        lambda: f"{rng.choice(MONTH_NAMES)} '{start % 100:02d} - Current",
+    ])()
+
+
+def throughput(fn, corpus) -> float:
+    started = time.perf_counter()
+    for duration in corpus:
+        fn(duration)
+    return len(corpus) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--strings', type=int, default=200000)
+    parser.add_argument('--unique', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    pool = [make_duration(rng) for _ in range(args.unique)]
+    corpus = [rng.choice(pool) for _ in range(args.strings)]
+
+    legacy = throughput(legacy_duration_years, corpus)
+    _parse.cache_clear()
+    cold = throughput(duration_years, pool)
+    _parse.cache_clear()
+    warm = throughput(duration_years, corpus)
+
+    print(f"{args.strings} strings ({len(set(corpus))} unique)")
+    print(f"  legacy:                 {legacy:12,.0f} strings/s")
+    print(f"  timeline, all unique:   {cold:12,.0f} strings/s")
+    print(f"  timeline, memoized:     {warm:12,.0f} strings/s  (memo hits {_parse.cache_info().hits:,})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Persistent store of normalized float32 embeddings, grouped by namespace (e.g. 'jobs').
+
+    Every write takes the next value of a store-wide sequence number, and removals are kept as
+    tombstones (a NULL vector), so a reader that remembers the highest sequence it has seen can
+    fetch only what changed since. The SQLite file is shared by every worker on the host.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._db_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._db_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "namespace TEXT NOT NULL, item_id TEXT NOT NULL, seq INTEGER NOT NULL, model TEXT, "
+                "text_hash TEXT, vector BLOB, updated_at REAL NOT NULL, PRIMARY KEY (namespace, item_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_seq ON embeddings(namespace, seq)")
+            conn.commit()
+            self._db_ready = True
+        return conn
+
+    def _write(self, namespace: str, rows: Iterable[Tuple[str, Optional[str], Optional[str], Optional[bytes]]]) -> int:
+        """Writes (item_id, model, text_hash, vector bytes or None) rows; returns the last sequence used."""
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE serializes writers across processes, so sequence numbers never collide.
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM embeddings").fetchone()[0]
+            now = time.time()
+            for item_id, model, digest, vector in rows:
+                seq += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (namespace, item_id, seq, model, text_hash, vector, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (namespace, item_id, seq, model, digest, vector, now)
+                )
+            conn.commit()
+            return seq
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def upsert(self, namespace: str, item_id: str, vector: np.ndarray, model: str, digest: str) -> int:
+        return self.upsert_many(namespace, [(item_id, vector, digest)], model)
+
+    def upsert_many(self, namespace: str, items: Iterable[Tuple[str, np.ndarray, str]], model: str) -> int:
+        """Stores (item_id, vector, text_hash) triples in one transaction."""
+        return self._write(namespace, (
+            (str(item_id), model, digest, np.asarray(vector, dtype=np.float32).tobytes())
+            for item_id, vector, digest in items
+        ))
+
+    def delete(self, namespace: str, item_ids: Iterable[str]) -> int:
+        return self._write(namespace, ((str(item_id), None, None, None) for item_id in item_ids))
+
+    def changes_since(self, namespace: str, seq: int) -> List[tuple]:
+        """(item_id, seq, model, vector bytes or None) for every write after `seq`, oldest first."""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT item_id, seq, model, vector FROM embeddings WHERE namespace = ? AND seq > ? ORDER BY seq",
+                (namespace, seq)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def snapshot(self, namespace: str, model: str) -> Tuple[List[str], Optional[np.ndarray], int]:
+        """(item_ids, (n, dim) vectors, seq) of every live item embedded with `model`, as of `seq`."""
+        conn = self._connect()
+        try:
+            # A single SELECT reads one consistent WAL snapshot, so `seq` matches the rows returned.
+            rows = conn.execute(
+                "SELECT item_id, seq, model, vector FROM embeddings WHERE namespace = ?", (namespace,)
+            ).fetchall()
+        finally:
+            conn.close()
+        seq = max((row[1] for row in rows), default=0)
+        live = [(item_id, vector) for item_id, _, row_model, vector in rows if vector is not None and row_model == model]
+        if not live:
+            return [], None, seq
+        vectors = np.frombuffer(b''.join(vector for _, vector in live), dtype=np.float32).reshape(len(live), -1)
+        return [item_id for item_id, _ in live], vectors, seq
+
+    def get(self, namespace: str, item_id: str, model: str) -> Optional[np.ndarray]:
+        """The stored vector for one item, or None if it is missing or was embedded with another model."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT vector FROM embeddings WHERE namespace = ? AND item_id = ? AND model = ? AND vector IS NOT NULL",
+                (namespace, str(item_id), model)
+            ).fetchone()
+        finally:
+            conn.close()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def fingerprints(self, namespace: str) -> Dict[str, Tuple[str, str]]:
+        """item_id -> (model, text_hash) for every live item in the namespace."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT item_id, model, text_hash FROM embeddings WHERE namespace = ? AND vector IS NOT NULL",
+                (namespace,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return {item_id: (model, digest) for item_id, model, digest in rows}
+
+
+class EmbeddingMatrix:
+    """
+    One namespace of an EmbeddingStore held as a single contiguous (n, dim) float32 matrix.
+
+    `refresh()` applies only the writes made since the last refresh: new items are appended,
+    edited items are overwritten in place and removed items are swapped with the last row, so
+    the live rows always stay packed at the top of the buffer. Refreshes are throttled to one
+    store query per `refresh_interval` seconds unless forced. Rows written with a different
+    embedding model than `model_name` are ignored.
+    """
+
+    def __init__(self, store: EmbeddingStore, namespace: str, model_name: str, refresh_interval: float = 5.0,
+                 start_seq: int = 0):
+        self.store = store
+        self.namespace = namespace
+        self.model_name = model_name
+        self.refresh_interval = refresh_interval
+        self._ids = []
+        self._rows = {}  # item_id -> row index
+        self._vectors = None
+        self._seq = start_seq
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _ensure_capacity(self, dim: int):
+        if self._vectors is None:
+            self._vectors = np.empty((64, dim), dtype=np.float32)
+        elif len(self._ids) == len(self._vectors):
+            grown = np.empty((len(self._vectors) * 2, dim), dtype=np.float32)
+            grown[:len(self._ids)] = self._vectors[:len(self._ids)]
+            self._vectors = grown
+
+    def _put(self, item_id: str, vector: np.ndarray):
+        if self._vectors is not None and vector.shape[0] != self._vectors.shape[1]:
+            logging.warning(f"Skipping '{self.namespace}' embedding {item_id}: dimension {vector.shape[0]} "
+                            f"does not match {self._vectors.shape[1]}.")
+            return
+        row = self._rows.get(item_id)
+        if row is None:
+            self._ensure_capacity(vector.shape[0])
+            row = len(self._ids)
+            self._ids.append(item_id)
+            self._rows[item_id] = row
+        self._vectors[row] = vector
+
+    def _remove(self, item_id: str):
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            moved_id = self._ids[last]
+            self._vectors[row] = self._vectors[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._ids.pop()
+
+    def refresh(self, force: bool = False) -> List[str]:
+        """Applies pending store writes; returns the ids of the items they touched."""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return []
+        try:
+            changes = self.store.changes_since(self.namespace, self._seq)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not refresh '{self.namespace}' embeddings, serving the loaded ones: {e}")
+            return []
+        touched = []
+        with self._lock:
+            self._checked_at = now
+            for item_id, seq, model, vector in changes:
+                if seq <= self._seq:
+                    continue  # another thread applied it first
+                if vector is None or model != self.model_name:
+                    self._remove(item_id)
+                else:
+                    self._put(item_id, np.frombuffer(vector, dtype=np.float32))
+                self._seq = seq
+                touched.append(item_id)
+        return touched
+
+    def vector(self, item_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(item_id)
+            return None if row is None else self._vectors[row].copy()
+
+    def top_k(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """The k items most similar to a normalized query vector, best first, as (item_id, cosine)."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or k <= 0:
+                return []
+            scores = self._vectors[:n] @ query
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top]
+
+
+class NamespaceMatrices:
+    """
+    EmbeddingMatrix per namespace, for many small namespaces such as one per job. The most
+    recently used `max_namespaces` stay loaded; each refreshes incrementally on access.
+    """
+
+    def __init__(self, store: EmbeddingStore, model_name: str, max_namespaces: int = 256, refresh_interval: float = 5.0):
+        self.store = store
+        self.model_name = model_name
+        self.max_namespaces = max_namespaces
+        self.refresh_interval = refresh_interval
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, force_refresh: bool = False) -> EmbeddingMatrix:
+        with self._lock:
+            matrix = self._matrices.get(namespace)
+            if matrix is None:
+                matrix = EmbeddingMatrix(self.store, namespace, self.model_name, self.refresh_interval)
+                self._matrices[namespace] = matrix
+                force_refresh = True
+            self._matrices.move_to_end(namespace)
+            while len(self._matrices) > self.max_namespaces:
+                self._matrices.popitem(last=False)
+        matrix.refresh(force=force_refresh)
+        return matrix
+
+
+def sync_namespace(store: EmbeddingStore, namespace: str, texts: Dict[str, str],
+                   encode: Callable[[List[str]], np.ndarray], model_name: str,
+                   text_hash: Callable[[str], str], batch_size: int = 64) -> dict:
+    """
+    Makes a namespace match `texts` (item_id -> source text): encodes items that are new, edited
+    or embedded with another model, and removes items that are gone or have no text.
+    """
+    stored = store.fingerprints(namespace)
+    wanted = {item_id: text for item_id, text in texts.items() if text}
+    stale = [
+        (item_id, text, text_hash(text)) for item_id, text in wanted.items()
+        if stored.get(item_id) != (model_name, text_hash(text))
+    ]
+    for offset in range(0, len(stale), batch_size):
+        batch = stale[offset:offset + batch_size]
+        vectors = encode([text for _, text, _ in batch])
+        store.upsert_many(namespace, ((item_id, vector, digest) for (item_id, _, digest), vector in zip(batch, vectors)), model_name)
+    removed = [item_id for item_id in stored if item_id not in wanted]
+    if removed:
+        store.delete(namespace, removed)
+    return {'namespace': namespace, 'items': len(wanted), 'encoded': len(stale), 'removed': len(removed)}
+
+
+def create_embedding_store() -> EmbeddingStore:
+    """Builds the store from environment settings."""
+    db_path = os.getenv('EMBEDDING_STORE_DB', os.path.join('cache', 'embeddings.sqlite3'))
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return EmbeddingStore(db_path)
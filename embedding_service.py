@@ -0,0 +1,260 @@
+"""
+Local embedding sidecar: loads the SentenceTransformer once and serves every worker on the host
+over a Unix socket, batching concurrent requests into a single `encode` call.
+
+Usage:
+    python embedding_service.py [--socket cache/embedding.sock] [--max-batch 64] [--max-wait-ms 5]
+
+Workers find the socket through EMBEDDING_SOCKET (same default); if nothing is listening they
+encode in-process as before (see embeddings.encode_normalized).
+
+Wire format, both directions length-prefixed so one connection carries many requests:
+    request:  !I length, then JSON {"texts": [...]}
+    response: !iiH rows, dim, model name length, then the UTF-8 model name and rows * dim
+              float32 values; rows == -1 means an error and is followed by !I length and a
+              UTF-8 message.
+
+The model name (embeddings.embedding_model_key) lets a worker refuse vectors from a sidecar
+started with a different EMBEDDING_MODEL or EMBEDDING_BACKEND, which it would otherwise store
+under its own key.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+_REQUEST_HEADER = struct.Struct('!I')
+_RESPONSE_HEADER = struct.Struct('!iiH')
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+class EmbeddingServiceError(Exception):
+    """The sidecar could not be reached or failed to encode; callers fall back to in-process."""
+
+
+def default_socket_path() -> str:
+    return os.getenv('EMBEDDING_SOCKET', os.path.join('cache', 'embedding.sock'))
+
+
+def _read_exactly(stream, size: int) -> bytes:
+    data = stream.read(size) if hasattr(stream, 'read') else None
+    if data is None:
+        chunks, remaining = [], size
+        while remaining:
+            chunk = stream.recv(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        data = b''.join(chunks)
+    if len(data) != size:
+        raise EOFError("connection closed mid-message")
+    return data
+
+
+class _Pending:
+    __slots__ = ('texts', 'done', 'result', 'error')
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Collects encode requests from many connections and runs them as one batch: the first request
+    waits at most `max_wait` seconds for company, and a batch never exceeds `max_batch` texts
+    (a single larger request still runs on its own).
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int = 64, max_wait: float = 0.005):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._carry = None
+        threading.Thread(target=self._run, name='embedding-batcher', daemon=True).start()
+
+    def submit(self, texts: List[str]) -> np.ndarray:
+        pending = _Pending(texts)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _next_batch(self) -> List[_Pending]:
+        batch = [self._carry or self._queue.get()]
+        self._carry = None
+        count = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if count + len(pending.texts) > self.max_batch:
+                self._carry = pending  # starts the next batch
+                break
+            batch.append(pending)
+            count += len(pending.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                vectors = self.encode([text for pending in batch for text in pending.texts])
+                offset = 0
+                for pending in batch:
+                    pending.result = vectors[offset:offset + len(pending.texts)]
+                    offset += len(pending.texts)
+            except Exception as e:
+                logging.error(f"Embedding batch of {len(batch)} requests failed: {e}")
+                for pending in batch:
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                (length,) = _REQUEST_HEADER.unpack(_read_exactly(self.rfile, _REQUEST_HEADER.size))
+            except EOFError:
+                return
+            if length > MAX_REQUEST_BYTES:
+                self._send_error(f"request of {length} bytes exceeds {MAX_REQUEST_BYTES}")
+                return  # the body was not read, so the stream cannot be resynchronized
+            try:
+                texts = json.loads(_read_exactly(self.rfile, length))['texts']
+                vectors = np.ascontiguousarray(self.server.batcher.submit([str(text) for text in texts]), dtype=np.float32)
+                rows, dim = vectors.shape if len(vectors) else (0, 0)
+                model = self.server.model.encode('utf-8')
+                self.wfile.write(_RESPONSE_HEADER.pack(rows, dim, len(model)) + model + vectors.tobytes())
+            except EOFError:
+                return
+            except Exception as e:
+                self._send_error(str(e))
+            self.wfile.flush()
+
+    def _send_error(self, message: str):
+        message = message.encode('utf-8')
+        self.wfile.write(_RESPONSE_HEADER.pack(-1, 0, 0) + _REQUEST_HEADER.pack(len(message)) + message)
+        self.wfile.flush()
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # every worker thread connects at once after a deploy
+
+    def __init__(self, socket_path: str, batcher: MicroBatcher, model: str):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # left over from a previous run
+        directory = os.path.dirname(socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.batcher = batcher
+        self.model = model
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+
+class EmbeddingClient:
+    """
+    Worker-side connection to the sidecar. Each thread keeps its own connection. After a failure
+    the sidecar is not tried again for `retry_after` seconds so requests do not pay for repeated
+    connection attempts while it is down. With `model` set, vectors from a sidecar serving any
+    other model are rejected the same way.
+    """
+
+    def __init__(self, socket_path: str, model: Optional[str] = None, timeout: float = 10.0,
+                 retry_after: float = 30.0):
+        self.socket_path = socket_path
+        self.model = model
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until and os.path.exists(self.socket_path)
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        payload = json.dumps({'texts': list(texts)}).encode('utf-8')
+        try:
+            conn = self._connection()
+            conn.sendall(_REQUEST_HEADER.pack(len(payload)) + payload)
+            rows, dim, model_length = _RESPONSE_HEADER.unpack(_read_exactly(conn, _RESPONSE_HEADER.size))
+            if rows < 0:
+                (length,) = _REQUEST_HEADER.unpack(_read_exactly(conn, _REQUEST_HEADER.size))
+                raise EmbeddingServiceError(_read_exactly(conn, length).decode('utf-8', 'replace'))
+            model = _read_exactly(conn, model_length).decode('utf-8', 'replace')
+            body = _read_exactly(conn, rows * dim * 4)
+        except (OSError, EOFError) as e:
+            self._drop_connection()
+            self._down_until = time.monotonic() + self.retry_after
+            raise EmbeddingServiceError(f"embedding sidecar unavailable: {e}") from e
+        if self.model is not None and model != self.model:
+            self._down_until = time.monotonic() + self.retry_after
+            raise EmbeddingServiceError(f"embedding sidecar serves model '{model}', expected '{self.model}'")
+        return np.frombuffer(body, dtype=np.float32).reshape(rows, dim)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the shared JobStir embedding sidecar.")
+    parser.add_argument('--socket', default=None, help="Unix socket path (default: EMBEDDING_SOCKET or cache/embedding.sock).")
+    parser.add_argument('--max-batch', type=int, default=64, help="Most texts encoded in one batch.")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="How long a request waits for others to batch with.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from dotenv import load_dotenv
+    load_dotenv()
+    from embeddings import embedding_model_key, encode_local
+
+    socket_path = args.socket or default_socket_path()
+    encode_local(["warm up"])  # load the model before accepting connections
+    server = EmbeddingServer(socket_path, MicroBatcher(encode_local, args.max_batch, args.max_wait_ms / 1000),
+                             embedding_model_key())
+    logging.info(f"Embedding sidecar for {server.model} listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import threading
+
+import numpy as np
+
+from embedding_service import EmbeddingClient, EmbeddingServiceError, default_socket_path
+
+DEFAULT_EMBEDDING_MODEL = 'paraphrase-MiniLM-L3-v2'
+
+embedding_model = None
+_model_lock = threading.Lock()
+
+
+# torch: the fp32 model as before. int8: the same model with its Linear layers dynamically
+# quantized to int8. onnx: the model exported to ONNX and run by onnxruntime (needs
+# `optimum[onnxruntime]`). Their vectors are close but not guaranteed to rank identically
+# (benchmarks/bench_embedding_backends.py checks), so each backend stores its vectors under its
+# own key (embedding_model_key) and switching backends re-embeds stored items.
+EMBEDDING_BACKENDS = ('torch', 'int8', 'onnx')
+
+
+def embedding_model_name() -> str:
+    # Read lazily so a value from .env (loaded after imports) is honoured.
+    return os.getenv('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL)
+
+
+def embedding_backend() -> str:
+    backend = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
+    if backend not in EMBEDDING_BACKENDS:
+        logging.warning(f"Unknown EMBEDDING_BACKEND '{backend}', using torch.")
+        return 'torch'
+    if backend == 'onnx' and not (importlib.util.find_spec('optimum') and importlib.util.find_spec('onnxruntime')):
+        logging.warning("EMBEDDING_BACKEND=onnx needs `optimum[onnxruntime]`, using torch.")
+        return 'torch'
+    return backend
+
+
+def embedding_model_key() -> str:
+    """The model name vectors are stored under: the model, plus the backend unless it is torch."""
+    backend = embedding_backend()
+    return embedding_model_name() if backend == 'torch' else f"{embedding_model_name()}+{backend}"
+
+
+def load_embedding_model(backend: str):
+    # Imported here: workers served by the embedding sidecar never load torch.
+    from sentence_transformers import SentenceTransformer
+
+    if backend == 'onnx':
+        try:
+            return SentenceTransformer(embedding_model_name(), backend='onnx')
+        except ImportError as e:
+            logging.warning(f"ONNX embedding backend unavailable ({e}); using torch instead.")
+            backend = 'torch'
+
+    model = SentenceTransformer(embedding_model_name())
+    if backend == 'int8':
+        import torch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def get_embedding_model():
+    global embedding_model
+    if embedding_model is None:
+        with _model_lock:
+            if embedding_model is None:
+                try:
+                    backend = embedding_backend()
+                    embedding_model = load_embedding_model(backend)
+                    logging.info(f"Embedding model {embedding_model_name()} ({backend}) loaded.")
+                except Exception as e:
+                    logging.error(f"Failed to load embedding model: {e}")
+                    raise
+    return embedding_model
+
+
+def encode_local(texts, batch_size: int = 32) -> np.ndarray:
+    """Encodes with the model loaded in this process."""
+    vectors = get_embedding_model().encode(
+        list(texts), batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+    )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+_sidecar = None
+
+
+def _sidecar_client() -> EmbeddingClient:
+    global _sidecar
+    if _sidecar is None:
+        _sidecar = EmbeddingClient(
+            default_socket_path(),
+            model=embedding_model_key(),
+            timeout=float(os.getenv('EMBEDDING_SOCKET_TIMEOUT', 10)),
+            retry_after=float(os.getenv('EMBEDDING_SOCKET_RETRY_SECONDS', 30)),
+        )
+    return _sidecar
+
+
+def sidecar_available() -> bool:
+    """True when an embedding sidecar is listening, so this process never needs the model."""
+    return _sidecar_client().available()
+
+
+def encode_normalized(texts, batch_size: int = 32) -> np.ndarray:
+    """
+    Encodes texts as unit-length float32 rows, so cosine similarity is a plain dot product.
+    Uses the embedding sidecar when one is listening (embedding_service.py), otherwise the
+    in-process model.
+    """
+    texts = list(texts)
+    client = _sidecar_client()
+    if client.available():
+        try:
+            return client.encode(texts)
+        except EmbeddingServiceError as e:
+            logging.warning(f"{e}; encoding in-process.")
+    return encode_local(texts, batch_size)
+
+
+def text_hash(text: str) -> str:
+    """Fingerprint of the text an embedding was computed from, used to spot edited items."""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,152 @@
+import re
+import time
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+# One date inside a duration string: "Jan 2021", "January, 2021", "Sept '19", "03/2021", "2021-03" or "2021".
+_DATE_PATTERN = re.compile(
+    r"""
+    \b(?P<month_name>jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?
+        |sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?,?\s*['’]?(?P<name_year>\d{4}|\d{2}\b)
+    | \b(?P<month_first>0?[1-9]|1[0-2])[/\-.](?P<month_first_year>\d{4})\b
+    | \b(?P<year_first>\d{4})[/\-.](?P<year_first_month>0?[1-9]|1[0-2])\b
+    | \b(?P<year>\d{4})\b
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+_ONGOING_PATTERN = re.compile(r'\b(?:present|current|now|ongoing|today|till date|to date)\b', re.IGNORECASE)
+_YEARS_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*\+?\s*(?:years?|yrs?)\b', re.IGNORECASE)
+_MONTHS_PATTERN = re.compile(r'(\d+)\s*(?:months?|mos?)\b', re.IGNORECASE)
+
+MIN_YEAR = 1950
+
+
+class Span(NamedTuple):
+    """
+    Parsed duration. Date ranges are half-open month intervals [start, end) counted in months since
+    year 0; durations written out as text ("2 years 3 months") only carry `years` and cannot be
+    placed on the timeline.
+    """
+    start: Optional[int] = None
+    end: Optional[int] = None
+    years: float = 0.0
+
+    @property
+    def total_years(self) -> float:
+        if self.start is not None:
+            return (self.end - self.start) / 12.0
+        return self.years
+
+
+@lru_cache(maxsize=1)
+def _month_index_for_hour(hour: int) -> int:
+    today = date.today()
+    return today.year * 12 + today.month - 1
+
+
+def current_month_index(today: Optional[date] = None) -> int:
+    if today is not None:
+        return today.year * 12 + today.month - 1
+    # date.today() dominates a memoized lookup, so it is re-read at most once an hour.
+    return _month_index_for_hour(int(time.time() // 3600))
+
+
+def _date_tokens(duration_str: str, current_year: int):
+    """Yields (year, month or None) for each plausible date in the string, in order."""
+    for match in _DATE_PATTERN.finditer(duration_str):
+        if match.group('month_name'):
+            year = int(match.group('name_year'))
+            if year < 100:
+                year += 2000 if year <= current_year % 100 + 1 else 1900
+            month = MONTHS[match.group('month_name').lower()[:3]]
+        elif match.group('month_first'):
+            year, month = int(match.group('month_first_year')), int(match.group('month_first'))
+        elif match.group('year_first'):
+            year, month = int(match.group('year_first')), int(match.group('year_first_month'))
+        else:
+            year, month = int(match.group('year')), None
+        if MIN_YEAR <= year <= current_year + 1:
+            yield year, month
+
+
+@lru_cache(maxsize=8192)
+def _parse(duration_str: str, current_month: int) -> Optional[Span]:
+    duration_str = duration_str.strip()
+    current_year = current_month // 12
+    tokens = list(_date_tokens(duration_str, current_year))
+
+    if tokens:
+        start_year, start_month = tokens[0]
+        start = start_year * 12 + (start_month or 1) - 1
+        end = None
+        if len(tokens) >= 2:
+            end_year, end_month = tokens[1]
+            # A named end month counts in full ("Jan - Apr" is four months); a bare end year is
+            # treated as its start, so "2021 - 2023" stays two years.
+            end = end_year * 12 + end_month if end_month else end_year * 12
+            if start_month is None and end_month is None and end_year == start_year:
+                end = start + 6  # "2022 - 2022": a partial year
+        elif _ONGOING_PATTERN.search(duration_str):
+            end = current_month + 1
+        if end is not None and end > start:
+            return Span(start, min(end, current_month + 1))
+
+    years_match = _YEARS_PATTERN.search(duration_str)
+    months_match = _MONTHS_PATTERN.search(duration_str)
+    if years_match or months_match:
+        years = float(years_match.group(1)) if years_match else 0.0
+        if months_match:
+            years += float(months_match.group(1)) / 12.0
+        return Span(years=years)
+    return None
+
+
+def parse_duration(duration_str: str, today: Optional[date] = None) -> Optional[Span]:
+    """Parses one experience duration string; returns None if it holds no usable duration."""
+    if not duration_str:
+        return None
+    return _parse(duration_str, current_month_index(today))
+
+
+def duration_years(duration_str: str, today: Optional[date] = None) -> float:
+    """Years covered by a single duration string, month-precise."""
+    span = parse_duration(duration_str, today)
+    return round(span.total_years, 2) if span else 0.0
+
+
+def total_experience_years(experience_entries: Iterable[dict], today: Optional[date] = None) -> float:
+    """
+    Distinct years of experience across all roles. Overlapping date ranges are merged so
+    concurrent jobs are not double-counted; durations given only as text are added on top.
+    """
+    current_month = current_month_index(today)
+    intervals = []
+    loose_years = 0.0
+    for entry in experience_entries or []:
+        if not isinstance(entry, dict):
+            continue
+        duration = entry.get('duration')
+        span = _parse(str(duration), current_month) if duration else None
+        if span is None:
+            continue
+        if span.start is not None:
+            intervals.append((span.start, span.end))
+        else:
+            loose_years += span.years
+
+    months = 0
+    merged_end = None
+    for start, end in sorted(intervals):
+        if merged_end is None or start > merged_end:
+            months += end - start
+            merged_end = end
+        elif end > merged_end:
+            months += end - merged_end
+            merged_end = end
+    return round(months / 12.0 + loose_years, 2)
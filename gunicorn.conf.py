@@ -0,0 +1,36 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py
+
+Prometheus metrics run in multiprocess mode so /metrics aggregates every worker. The directory must
+be set before any worker imports prometheus_client, which is why it is configured here.
+"""
+import os
+import shutil
+
+wsgi_app = 'wsgi:app'
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 180))
+
+prometheus_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(os.getcwd(), 'cache', 'prometheus'))
+
+
+def on_starting(server):
+    # Samples left by a previous run would be summed into the new one; start from an empty directory.
+    # worker.py processes share this directory, so restart them together with the web server.
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # Importing the app is cheap (heavy SDKs load lazily); with WARM_UP each worker loads them in a
+    # background thread after it forks, instead of on its first requests.
+    if os.getenv('WARM_UP', 'false').lower() == 'true':
+        from app import start_warm_up
+        start_warm_up()
@@ -0,0 +1,301 @@
+"""
+IVF-flat approximate nearest-neighbour search over an EmbeddingStore namespace.
+
+A build clusters every live vector with spherical k-means and writes the vectors grouped by
+cluster to .npy files that workers open with mmap, so all gunicorn workers share the same page
+cache instead of each holding a copy. A query scores the centroids, then scans only the
+`nprobe` closest clusters.
+
+Writes made after a build (new, edited or deleted items) are not folded into the files; each
+worker keeps them in a small exact EmbeddingMatrix and masks the stale base rows, and a rebuild
+is triggered once that delta grows past a fraction of the base. Catalogs smaller than
+`min_items` never get a base at all and are searched exactly.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from embedding_index import EmbeddingMatrix, EmbeddingStore
+
+_CURRENT = 'CURRENT'
+_KMEANS_ITERATIONS = 10
+_TRAINING_POINTS_PER_LIST = 40
+_REBUILD_RETRY_SECONDS = 60
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for offset in range(0, len(vectors), chunk):
+        assignments[offset:offset + chunk] = np.argmax(vectors[offset:offset + chunk] @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine) on a sample of the vectors; returns (nlist, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * _TRAINING_POINTS_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(_KMEANS_ITERATIONS):
+        assignments = _assign(sample, centroids)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = ~filled
+        # Re-seed empty clusters with random points so every list stays useful.
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums).astype(np.float32)
+    return centroids
+
+
+class IVFSnapshot:
+    """One built index, opened read-only with its arrays memory-mapped."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.seq = self.meta['seq']
+        self.centroids = np.load(os.path.join(path, 'centroids.npy'))
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+        self.sorted_ids = np.load(os.path.join(path, 'sorted_ids.npy'), mmap_mode='r')
+        self.id_order = np.load(os.path.join(path, 'id_order.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, item_id: str) -> Optional[int]:
+        position = int(np.searchsorted(self.sorted_ids, item_id))
+        if position < len(self.sorted_ids) and self.sorted_ids[position] == item_id:
+            return int(self.id_order[position])
+        return None
+
+    def search(self, query: np.ndarray, k: int, nprobe: int, masked: np.ndarray) -> List[Tuple[str, float]]:
+        lists = _top_k(self.centroids @ query, nprobe)
+        rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+        if not len(rows):
+            return []
+        scores = np.concatenate([self.vectors[self.offsets[l]:self.offsets[l + 1]] @ query for l in lists])
+        scores[masked[rows]] = -np.inf
+        top = _top_k(scores, k)
+        return [(str(self.ids[rows[i]]), float(scores[i])) for i in top if scores[i] != -np.inf]
+
+    @staticmethod
+    def write(path: str, item_ids: List[str], vectors: np.ndarray, seq: int, model: str, nlist: int) -> 'IVFSnapshot':
+        centroids = train_centroids(vectors, nlist)
+        assignments = _assign(vectors, centroids)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=nlist), out=offsets[1:])
+        ids = np.array(item_ids)[order]
+
+        os.makedirs(path)
+        np.save(os.path.join(path, 'centroids.npy'), centroids)
+        np.save(os.path.join(path, 'offsets.npy'), offsets)
+        np.save(os.path.join(path, 'vectors.npy'), np.ascontiguousarray(vectors[order], dtype=np.float32))
+        np.save(os.path.join(path, 'ids.npy'), ids)
+        id_order = np.argsort(ids, kind='stable')
+        np.save(os.path.join(path, 'sorted_ids.npy'), ids[id_order])
+        np.save(os.path.join(path, 'id_order.npy'), id_order)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'seq': seq, 'model': model, 'items': len(ids), 'nlist': nlist, 'built_at': time.time()}, f)
+        return IVFSnapshot(path)
+
+
+class VectorIndex:
+    """
+    Top-k search over one EmbeddingStore namespace: an mmapped IVF base plus an exact delta.
+
+    `refresh()` picks up a newer base written by any process (via the CURRENT pointer file) and
+    applies store writes made since the base was built. `top_k()` merges the base's approximate
+    hits with the delta's exact ones.
+    """
+
+    def __init__(self, store: EmbeddingStore, namespace: str, model_name: str, index_dir: str,
+                 min_items: int = 20000, nprobe: int = 8, rebuild_fraction: float = 0.1,
+                 refresh_interval: float = 5.0, auto_rebuild: bool = True):
+        self.store = store
+        self.namespace = namespace
+        self.model_name = model_name
+        self.index_dir = os.path.join(index_dir, namespace)
+        self.min_items = min_items
+        self.nprobe = nprobe
+        self.rebuild_fraction = rebuild_fraction
+        self.refresh_interval = refresh_interval
+        self.auto_rebuild = auto_rebuild
+        self._base = None
+        self._base_name = None
+        self._masked = None
+        self._delta = EmbeddingMatrix(store, namespace, model_name, refresh_interval)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._checked_at = None
+        self._building = False
+        self._build_attempted_at = None
+
+    def __len__(self):
+        return len(self._delta) + (len(self._base) - int(self._masked.sum()) if self._base is not None else 0)
+
+    def _current_name(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.index_dir, _CURRENT)) as f:
+                return f.read().strip() or None  # empty: the catalog shrank below min_items
+        except FileNotFoundError:
+            return None
+
+    def _drop_base(self):
+        delta = EmbeddingMatrix(self.store, self.namespace, self.model_name, self.refresh_interval)
+        with self._lock:
+            self._base, self._base_name, self._masked, self._delta = None, None, None, delta
+
+    def _open_base(self, name: str):
+        try:
+            base = IVFSnapshot(os.path.join(self.index_dir, name))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not open vector index {name}, keeping the current one: {e}")
+            return
+        if base.meta.get('model') != self.model_name:
+            logging.warning(f"Vector index {name} was built with another embedding model; ignoring it.")
+            return
+        delta = EmbeddingMatrix(self.store, self.namespace, self.model_name, self.refresh_interval, start_seq=base.seq)
+        with self._lock:
+            self._base, self._base_name, self._delta = base, name, delta
+            self._masked = np.zeros(len(base), dtype=bool)
+        logging.info(f"Opened '{self.namespace}' vector index {name} ({len(base)} items).")
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return
+        # Serialized so a base swap can never interleave with masking rows for the old delta.
+        with self._refresh_lock:
+            self._checked_at = now
+            name = self._current_name()
+            if name != self._base_name:
+                if name is None:
+                    self._drop_base()
+                else:
+                    self._open_base(name)
+            touched = self._delta.refresh(force=True)
+            if touched and self._base is not None:
+                with self._lock:
+                    for item_id in touched:
+                        row = self._base.row_of(item_id)
+                        if row is not None:
+                            self._masked[row] = True  # superseded by the delta (edited) or gone (deleted)
+        if self.auto_rebuild and self._needs_rebuild():
+            self.rebuild_in_background()
+
+    def _needs_rebuild(self) -> bool:
+        if self._building:
+            return False
+        if self._build_attempted_at is not None and time.monotonic() - self._build_attempted_at < _REBUILD_RETRY_SECONDS:
+            return False
+        if self._base is None:
+            return len(self._delta) >= self.min_items
+        return len(self._delta) + int(self._masked.sum()) > self.rebuild_fraction * len(self._base)
+
+    def top_k(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """The k items most similar to a normalized query vector, best first, as (item_id, cosine)."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            base, masked, delta = self._base, self._masked, self._delta
+        hits = delta.top_k(query, k)
+        if base is not None:
+            hits.extend(base.search(query, k, self.nprobe, masked))
+            hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
+
+    def rebuild(self) -> Optional[dict]:
+        """
+        Builds a new base from the store and points CURRENT at it. Only one process builds at a
+        time (others return None); the previous build is kept so workers still mapping it are safe.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, 'build.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            started = time.perf_counter()
+            item_ids, vectors, seq = self.store.snapshot(self.namespace, self.model_name)
+            if len(item_ids) < self.min_items:
+                # Small catalog: exact search over the delta is both faster and exact.
+                self._point_current('')
+                return {'namespace': self.namespace, 'items': len(item_ids), 'built': False}
+
+            nlist = max(1, int(4 * np.sqrt(len(item_ids))))
+            name = f"v{seq}-{int(time.time())}"
+            IVFSnapshot.write(os.path.join(self.index_dir, name), item_ids, vectors, seq, self.model_name, nlist)
+            previous = self._current_name()
+            self._point_current(name)
+            for entry in os.listdir(self.index_dir):
+                if entry.startswith('v') and entry not in (name, previous):
+                    shutil.rmtree(os.path.join(self.index_dir, entry), ignore_errors=True)
+        self.refresh(force=True)
+        return {'namespace': self.namespace, 'items': len(item_ids), 'built': True, 'nlist': nlist,
+                'seconds': round(time.perf_counter() - started, 2)}
+
+    def _point_current(self, name: str):
+        pointer = os.path.join(self.index_dir, _CURRENT)
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(name)
+        os.replace(pointer + '.tmp', pointer)
+
+    def rebuild_in_background(self):
+        if self._building:
+            return
+        self._building = True
+        self._build_attempted_at = time.monotonic()
+
+        def run():
+            try:
+                result = self.rebuild()
+                if result:
+                    logging.info(f"Rebuilt vector index: {result}")
+            except Exception as e:
+                logging.error(f"Vector index rebuild failed: {e}")
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, name=f"vector-index-{self.namespace}", daemon=True).start()
+
+
+def create_vector_index(store: EmbeddingStore, namespace: str, model_name: str) -> VectorIndex:
+    """Builds a namespace's index from environment settings."""
+    return VectorIndex(
+        store, namespace, model_name,
+        index_dir=os.getenv('VECTOR_INDEX_DIR', os.path.join('cache', 'vector_index')),
+        min_items=int(os.getenv('ANN_MIN_ITEMS', 20000)),
+        nprobe=int(os.getenv('ANN_NPROBE', 8)),
+        rebuild_fraction=float(os.getenv('ANN_REBUILD_FRACTION', 0.1)),
+        refresh_interval=float(os.getenv('JOB_EMBEDDINGS_REFRESH_SECONDS', 5)),
+        auto_rebuild=os.getenv('ANN_AUTO_REBUILD', 'True').lower() == 'true',
+    )
@@ -0,0 +1,178 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+
+def _posted_at(job: dict) -> Optional[datetime]:
+    value = job.get('date_posted')
+    if not value:
+        return None
+    try:
+        posted = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return posted if posted.tzinfo else posted.replace(tzinfo=timezone.utc)
+
+
+def _sort_key(job: dict) -> tuple:
+    """(date_posted, id) as comparable values; the listing is ordered by it, newest first."""
+    posted = _posted_at(job)
+    return (posted.timestamp() if posted else float('-inf'), str(job['id']))
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce."""
+    try:
+        posted, job_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from e
+    if not isinstance(posted, (int, float)) or not isinstance(job_id, str):
+        raise ValueError("invalid cursor")
+    return float(posted), job_id
+
+
+# Columns the public listing may return; `snippet` is a shortened job_description.
+LISTING_FIELDS = ('id', 'job_title', 'company_name', 'date_posted', 'snippet')
+SNIPPET_LENGTH = 240
+
+
+def snippet(text, length: int = SNIPPET_LENGTH) -> str:
+    """Whitespace-collapsed text, cut at a word boundary to at most `length` characters plus an ellipsis."""
+    text = " ".join(str(text or '').split())
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(' ', 1)[0] or text[:length]
+    return cut.rstrip(',.;:') + '\u2026'
+
+
+class CatalogSnapshot:
+    """One load of the jobs table: rows newest first, a by-id view, and validators for HTTP caching."""
+
+    def __init__(self, jobs: list):
+        self.jobs = sorted(jobs, key=_sort_key, reverse=True)
+        self.by_id = {str(job['id']): job for job in self.jobs}
+        self._ascending_keys = [_sort_key(job) for job in reversed(self.jobs)]
+        self._snippets = {}
+        payload = json.dumps(self.jobs, sort_keys=True, default=str).encode('utf-8')
+        self.etag = hashlib.sha256(payload).hexdigest()[:20]
+        posted = [p for p in (_posted_at(job) for job in self.jobs) if p is not None]
+        self.last_modified = max(posted) if posted else None
+
+    def page(self, after: Optional[tuple], limit: int) -> tuple:
+        """
+        Keyset pagination on (date_posted, id): up to `limit` jobs older than the `after` key
+        (from the start when None), and the key to pass as `after` for the next page (None at the
+        end). A binary search, so deep pages cost the same as the first.
+        """
+        total = len(self._ascending_keys)
+        end = bisect_left(self._ascending_keys, after) if after is not None else total
+        start = max(0, end - limit)
+        jobs = self.jobs[total - end:total - start]
+        return jobs, (self._ascending_keys[start] if start > 0 else None)
+
+    def listing(self, job: dict, fields: tuple = LISTING_FIELDS) -> dict:
+        """The public projection of a job row; snippets are computed once per snapshot."""
+        row = {}
+        for field in fields:
+            if field == 'snippet':
+                job_id = str(job['id'])
+                if job_id not in self._snippets:
+                    self._snippets[job_id] = snippet(job.get('job_description'))
+                row['snippet'] = self._snippets[job_id]
+            else:
+                row[field] = job.get(field)
+        return row
+
+
+class JobCatalog:
+    """
+    In-process cache of the job board, so /api/jobs and candidate_apply stop querying Supabase per view.
+
+    A snapshot is reused for `ttl` seconds. `invalidate()` (called after a job is posted) drops it
+    here and touches `stamp_path`, a file every worker on the host checks with one stat() per read,
+    so other workers reload on their next request instead of waiting out the TTL. Jobs are rows
+    from `load_all()` and must be treated as read-only; they are shared between requests.
+    """
+
+    def __init__(self, load_all: Callable[[], list], load_one: Callable[[str], Optional[dict]],
+                 stamp_path: str, ttl: float = 60.0, retry_after: float = 5.0):
+        self.load_all = load_all
+        self.load_one = load_one
+        self.stamp_path = stamp_path
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._snapshot = None
+        self._expires_at = 0.0
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _current_stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def snapshot(self) -> CatalogSnapshot:
+        stamp = self._current_stamp()
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._expires_at and stamp == self._stamp:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() < self._expires_at and stamp == self._stamp:
+                return self._snapshot
+            try:
+                self._snapshot = CatalogSnapshot(self.load_all())
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                # Keep serving the last good board; try the database again shortly.
+                logging.warning(f"Job catalog reload failed, serving the cached jobs: {e}")
+                self._expires_at = time.monotonic() + self.retry_after
+                return self._snapshot
+            self._expires_at = time.monotonic() + self.ttl
+            self._stamp = stamp
+            return self._snapshot
+
+    def jobs(self) -> list:
+        """Every job, newest first."""
+        return self.snapshot().jobs
+
+    def get(self, job_id) -> Optional[dict]:
+        """One job by id. Ids missing from the snapshot are looked up directly (not cached)."""
+        if not job_id:
+            return None
+        job = self.snapshot().by_id.get(str(job_id))
+        if job is None:
+            job = self.load_one(str(job_id))
+        return job
+
+    def invalidate(self):
+        """Forces every worker to reload on its next read."""
+        with self._lock:
+            self._snapshot = None
+        directory = os.path.dirname(self.stamp_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.stamp_path, 'a'):
+            pass
+        os.utime(self.stamp_path, ns=(time.time_ns(), time.time_ns()))
+
+
+def create_job_catalog(load_all: Callable[[], list], load_one: Callable[[str], Optional[dict]]) -> JobCatalog:
+    """Builds the catalog from environment settings."""
+    return JobCatalog(
+        load_all, load_one,
+        stamp_path=os.getenv('JOB_CATALOG_STAMP', os.path.join('cache', 'job_catalog.stamp')),
+        ttl=float(os.getenv('JOB_CATALOG_TTL', 60)),
+    )
@@ -0,0 +1,50 @@
+"""
+Per-job application counters for the HR dashboard, kept in the `job_application_stats` table
+(migrations/001_job_application_stats.sql) instead of being recounted from every application on
+each page load.
+
+Writers describe an application before and after their change; the difference of the two
+`application_flags()` is applied atomically by the `bump_job_application_stats` RPC.
+Reconciliation recounts a job's applications in the database with `STAT_AGGREGATES`, in the same
+statement (or under the row lock) that writes the counters, so a concurrent bump is never lost.
+"""
+from typing import Optional
+
+STAT_COLUMNS = ('applications', 'recommended', 'exams_completed', 'pending_review', 'approved')
+
+
+def application_flags(application: Optional[dict]) -> dict:
+    """How one application contributes to each counter; all zeros for None (not yet inserted)."""
+    if not application:
+        return dict.fromkeys(STAT_COLUMNS, 0)
+    status = application.get('eligibility_status') or ''
+    exam_taken = bool(application.get('exam_taken'))
+    return {
+        'applications': 1,
+        # "Recommended" and "Recommended (Exam Gen Failed)", but not "Not Recommended".
+        'recommended': int(status.startswith('Recommended')),
+        'exams_completed': int(exam_taken),
+        'pending_review': int(exam_taken and status != 'Approved'),
+        'approved': int(status == 'Approved'),
+    }
+
+
+def stat_delta(before: Optional[dict], after: Optional[dict]) -> dict:
+    """Counter changes for an application going from `before` to `after` (either may be None)."""
+    old, new = application_flags(before), application_flags(after)
+    return {column: new[column] - old[column] for column in STAT_COLUMNS}
+
+
+# application_flags() as aggregates over candidate_applications, valid in both SQLite and
+# Postgres. migrations/001_job_application_stats.sql repeats them; keep the two in step.
+STAT_AGGREGATES = {
+    'applications': "count(*)",
+    'recommended': "count(*) filter (where substr(eligibility_status, 1, 11) = 'Recommended')",
+    'exams_completed': "count(*) filter (where exam_taken)",
+    'pending_review': "count(*) filter (where exam_taken and coalesce(eligibility_status, '') <> 'Approved')",
+    'approved': "count(*) filter (where eligibility_status = 'Approved')",
+}
+
+
+def empty_stats(job_id) -> dict:
+    return {'job_id': job_id, **dict.fromkeys(STAT_COLUMNS, 0)}
@@ -0,0 +1,189 @@
+import json
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from typing import Callable, NamedTuple, Optional
+
+DEGREE_ALIASES = {
+    "bachelor": ("b.sc", "b.s.", "b.a.", "bachelor"),
+    "master": ("m.sc", "m.s.", "master"),
+    "phd": ("ph.d.", "phd", "doctorate"),
+}
+
+KNOCKOUT_PASS_THRESHOLD = 50
+
+
+class ResumeFeatures:
+    """
+    The parts of a parsed resume that knockout rules look at, computed at most once per application.
+    Each feature is built on first access, so a job without location rules never serializes the resume.
+    """
+
+    def __init__(self, resume_json: dict, experience_years: Callable[[dict], float]):
+        self.resume_json = resume_json
+        self._experience_years = experience_years
+
+    @cached_property
+    def total_years(self) -> float:
+        return self._experience_years(self.resume_json)
+
+    @cached_property
+    def education_text(self) -> str:
+        return ' '.join(f"{edu.get('degree', '')}" for edu in self.resume_json.get('education', [])).lower()
+
+    @cached_property
+    def location_text(self) -> Optional[str]:
+        try:
+            return json.dumps(self.resume_json.get('experience', []) + self.resume_json.get('education', [])).lower()
+        except Exception:
+            return None
+
+    @cached_property
+    def contact_text(self) -> str:
+        return f"{self.resume_json.get('name', '')} {self.resume_json.get('phone', '')}".lower()
+
+
+class KnockoutRule(NamedTuple):
+    kind: Optional[str]          # 'experience_years', 'education', 'location', or None for types we don't check
+    criterion: dict
+    min_years: Optional[float] = None
+    degree_aliases: tuple = ()
+    location: Optional[str] = None
+
+    def matches(self, features: ResumeFeatures) -> bool:
+        if self.kind == 'experience_years':
+            return self.min_years is not None and features.total_years >= self.min_years
+        if self.kind == 'education':
+            if not self.degree_aliases:
+                return False
+            education_text = features.education_text
+            return any(alias in education_text for alias in self.degree_aliases)
+        if self.kind == 'location':
+            location_text = features.location_text
+            if location_text is None:
+                return False
+            return self.location in location_text or self.location in features.contact_text
+        return False
+
+
+def _compile_rule(criterion: dict) -> KnockoutRule:
+    ctype = criterion.get("type", "").lower()
+
+    if ctype == "experience_years":
+        try:
+            min_years = float(criterion.get('value', 999))
+        except (ValueError, TypeError):
+            min_years = None
+        return KnockoutRule(ctype, criterion, min_years=min_years)
+
+    if ctype == "education":
+        aliases = []
+        for keyword in criterion.get('keywords') or []:
+            keyword = keyword.lower()
+            aliases.extend(DEGREE_ALIASES.get(keyword, (keyword,)))
+        return KnockoutRule(ctype, criterion, degree_aliases=tuple(aliases))
+
+    if ctype == "location":
+        return KnockoutRule(ctype, criterion, location=str(criterion.get('value', 'a_very_unlikely_string')).lower())
+
+    # Unknown criterion types still count towards the total, but are neither met nor missed.
+    return KnockoutRule(None, criterion)
+
+
+class KnockoutRules:
+    """Immutable, precompiled knockout criteria for one job."""
+
+    __slots__ = ('rules',)
+
+    def __init__(self, rules: tuple):
+        object.__setattr__(self, 'rules', rules)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("KnockoutRules is immutable")
+
+    def evaluate(self, features: ResumeFeatures) -> dict:
+        if not self.rules:
+            return {
+                "passed": True,
+                "score": 100,
+                "met_criteria": [],
+                "missed_criteria": [],
+                "reason": "No knockout criteria defined."
+            }
+
+        met_criteria = []
+        missed_criteria = []
+        for rule in self.rules:
+            if rule.kind is None:
+                continue
+            # Hand out copies so results stored with one application never alias the cached rules.
+            if rule.matches(features):
+                met_criteria.append(dict(rule.criterion))
+            else:
+                missed_criteria.append(dict(rule.criterion))
+
+        total_criteria_count = len(self.rules)
+        met_count = len(met_criteria)
+        score = (met_count / total_criteria_count) * 100
+        return {
+            "passed": score >= KNOCKOUT_PASS_THRESHOLD,
+            "score": int(score),
+            "met_criteria": met_criteria,
+            "missed_criteria": missed_criteria,
+            "reason": f"Candidate met {met_count} of {total_criteria_count} mandatory criteria ({int(score)}%)."
+        }
+
+
+def compile_knockout_rules(knockout_data) -> KnockoutRules:
+    """Compiles a job's `knockout_questions_json` (a JSON string or an already-decoded dict)."""
+    if isinstance(knockout_data, str):
+        try:
+            knockout_data = json.loads(knockout_data)
+        except json.JSONDecodeError:
+            knockout_data = {}
+    criteria = (knockout_data or {}).get("criteria", [])
+    return KnockoutRules(tuple(_compile_rule(criterion) for criterion in criteria))
+
+
+class KnockoutRuleCache:
+    """
+    Job-id keyed cache of compiled knockout rules.
+
+    Each entry remembers the `knockout_questions_json` it was compiled from; if the job row we are
+    handed carries different criteria (the job was edited, possibly by another worker), the entry
+    is recompiled. `invalidate()` drops an entry explicitly.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # job_id -> (source, KnockoutRules)
+        self._lock = threading.Lock()
+
+    def put(self, job_id: str, knockout_data) -> KnockoutRules:
+        rules = compile_knockout_rules(knockout_data)
+        with self._lock:
+            self._entries[job_id] = (knockout_data, rules)
+            self._entries.move_to_end(job_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rules
+
+    def get(self, job_obj: dict) -> KnockoutRules:
+        job_id = job_obj.get("id")
+        knockout_data = job_obj.get("knockout_questions_json", {})
+        if job_id is None:
+            return compile_knockout_rules(knockout_data)
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is not None and entry[0] == knockout_data:
+                self._entries.move_to_end(job_id)
+                return entry[1]
+        return self.put(job_id, knockout_data)
+
+    def invalidate(self, job_id: str):
+        with self._lock:
+            self._entries.pop(job_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,70 @@
+"""
+Deferred imports and clients, so importing the app does not pay for subsystems a process may
+never use (langchain, groq, PyMuPDF, the Supabase client, ...).
+"""
+import importlib
+import threading
+from typing import Callable
+
+
+class LazyModule:
+    """Imports the named module on first attribute access: `fitz = LazyModule('fitz')`."""
+
+    def __init__(self, name: str):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    object.__setattr__(self, '_module', module)
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+class LazyObject:
+    """
+    Stands in for an object built by `factory()` on first attribute access, e.g. an API client
+    whose construction imports a heavy SDK. The factory runs at most once.
+    """
+
+    def __init__(self, factory: Callable[[], object], name: str = 'object'):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_target', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    @property
+    def loaded(self) -> bool:
+        return self._target is not None
+
+    def _load(self):
+        target = self._target
+        if target is None:
+            with self._lock:
+                target = self._target
+                if target is None:
+                    target = self._factory()
+                    object.__setattr__(self, '_target', target)
+        return target
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __repr__(self):
+        state = 'loaded' if self._target is not None else 'not loaded'
+        return f"<LazyObject {self._name} ({state})>"
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    In-process cache of deterministic (temperature 0) LLM completions.
+
+    Keys combine the prompt template fingerprint, model, temperature and a hash of the rendered
+    inputs, so editing a prompt's text automatically stops old completions from being served.
+    Entries expire after `ttl` seconds and the least recently used entries are evicted beyond
+    `max_entries`. Hit/miss counters are kept per chain.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (chain_name, fingerprint, expires_at, value)
+        self._fingerprints = {}        # chain_name -> current fingerprint
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(fingerprint: str, model: str, temperature: float, inputs: dict) -> str:
+        rendered = json.dumps(inputs, sort_keys=True, default=str)
+        inputs_hash = hashlib.sha256(rendered.encode('utf-8')).hexdigest()
+        return f"{fingerprint}:{model}:{temperature}:{inputs_hash}"
+
+    def _count(self, chain_name: str, outcome: str):
+        counters = self._stats.setdefault(chain_name, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+    def register(self, chain_name: str, fingerprint: str):
+        """Records a chain's current prompt fingerprint, dropping entries made with an older prompt."""
+        with self._lock:
+            previous = self._fingerprints.get(chain_name)
+            self._fingerprints[chain_name] = fingerprint
+            if previous is None or previous == fingerprint:
+                return
+            stale = [key for key, entry in self._entries.items() if entry[0] == chain_name and entry[1] != fingerprint]
+            for key in stale:
+                del self._entries[key]
+        logging.info(f"Prompt for '{chain_name}' changed; invalidated {len(stale)} cached responses.")
+
+    def get(self, chain_name: str, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._count(chain_name, 'misses')
+                return None
+            self._entries.move_to_end(key)
+            self._count(chain_name, 'hits')
+            return entry[3]
+
+    def set(self, chain_name: str, key: str, value: str):
+        with self._lock:
+            fingerprint = self._fingerprints.get(chain_name)
+            self._entries[key] = (chain_name, fingerprint, time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Per-chain hit/miss counters plus the current entry count."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'chains': {name: dict(counters) for name, counters in self._stats.items()},
+            }
@@ -0,0 +1,395 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+from lazy import LazyModule, LazyObject
+from llm_cache import ResponseCache
+from rate_limiter import RateLimitScheduler, estimate_tokens
+
+# The SDKs are imported on the first LLM call, not when the app is imported.
+groq = LazyModule('groq')
+httpx = LazyModule('httpx')
+
+
+def _make_output_parser():
+    from langchain_core.output_parsers import StrOutputParser
+    return StrOutputParser()
+
+
+_output_parser = LazyObject(_make_output_parser, 'StrOutputParser')
+
+
+def retryable_errors() -> tuple:
+    """Errors worth retrying: quota exhaustion and transient network/server failures."""
+    return (groq.RateLimitError, groq.APIConnectionError, groq.APITimeoutError, groq.InternalServerError)
+
+# Completion budget assumed for admission control when a chain sets no max_tokens.
+DEFAULT_COMPLETION_TOKENS = 600
+
+# Groq phrases its hint as "Please try again in 7.66s", "in 1m2.5s" or "in 350ms".
+_RETRY_HINT_PATTERN = re.compile(r'Please try again in (?:(\d+)h)?(?:(\d+)m(?!s))?(?:(\d+(?:\.\d+)?)(ms|s))?', re.IGNORECASE)
+
+
+def parse_retry_after(message: str) -> Optional[float]:
+    """Extracts the server's suggested wait (in seconds) from a rate-limit error message."""
+    match = _RETRY_HINT_PATTERN.search(message or '')
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, amount, unit = match.groups()
+    seconds = int(hours or 0) * 3600 + int(minutes or 0) * 60
+    if amount:
+        seconds += float(amount) / 1000.0 if unit.lower() == 'ms' else float(amount)
+    return seconds
+
+
+class RetryPolicy:
+    """Exponential backoff that never waits less than the server asked for."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 5.0, multiplier: float = 2.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls) -> 'RetryPolicy':
+        return cls(
+            max_attempts=int(os.getenv('LLM_MAX_ATTEMPTS', 3)),
+            base_delay=float(os.getenv('LLM_RETRY_BASE_DELAY', 5)),
+            multiplier=float(os.getenv('LLM_RETRY_MULTIPLIER', 2)),
+            max_delay=float(os.getenv('LLM_RETRY_MAX_DELAY', 60)),
+        )
+
+    def delay_for(self, attempt: int, error: Exception) -> float:
+        """Seconds to wait after the given (zero-based) failed attempt."""
+        delay = min(self.base_delay * (self.multiplier ** attempt), self.max_delay)
+        hint = parse_retry_after(str(error))
+        if hint is not None:
+            delay = max(delay, hint)
+        return delay
+
+
+class LazyChatPrompt:
+    """
+    `ChatPromptTemplate.from_messages(messages)`, built on first use. Prompts are module-level
+    constants in app.py; building them eagerly would import langchain along with the app.
+    """
+
+    def __init__(self, messages: list):
+        self.message_specs = list(messages)
+        self._template = None
+
+    @property
+    def template(self):
+        if self._template is None:
+            from langchain_core.prompts import ChatPromptTemplate
+            self._template = ChatPromptTemplate.from_messages(self.message_specs)
+        return self._template
+
+    def __or__(self, other):
+        return self.template | other
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+
+def prompt_text(prompt) -> str:
+    """Concatenated template text of a ChatPromptTemplate's messages."""
+    if isinstance(prompt, LazyChatPrompt) and all(isinstance(spec, tuple) for spec in prompt.message_specs):
+        # (role, template) pairs carry the same text the built template would, without building it.
+        return "\n".join(template for _, template in prompt.message_specs)
+    parts = []
+    for message in prompt.messages:
+        inner = getattr(message, 'prompt', None)
+        parts.append(getattr(inner, 'template', None) or str(message))
+    return "\n".join(parts)
+
+
+def prompt_fingerprint(prompt, *extra: str) -> str:
+    """Returns a short, stable hash of a prompt's message templates (plus any extra parts such as the model name)."""
+    text = "\x1f".join([prompt_text(prompt), *extra])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class CallRecord:
+    """Outcome of one gateway call (or response-cache hit), passed to listeners."""
+
+    __slots__ = ('name', 'model', 'latency', 'attempts', 'retry_wait', 'queue_wait', 'error',
+                 'prompt_tokens', 'completion_tokens', 'cached')
+
+    def __init__(self, name, model, latency, attempts, retry_wait, queue_wait=0.0, error=None,
+                 prompt_tokens=None, completion_tokens=None, cached=False):
+        self.name = name
+        self.model = model
+        self.latency = latency
+        self.attempts = attempts
+        self.retry_wait = retry_wait
+        self.queue_wait = queue_wait
+        self.error = error
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cached = cached
+
+
+def message_usage(message) -> tuple:
+    """(prompt_tokens, completion_tokens) reported for a LangChain chat message, or (None, None)."""
+    usage = getattr(message, 'usage_metadata', None)
+    if usage:
+        return usage.get('input_tokens'), usage.get('output_tokens')
+    token_usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+    return token_usage.get('prompt_tokens'), token_usage.get('completion_tokens')
+
+
+def completion_usage(response) -> tuple:
+    """(prompt_tokens, completion_tokens) for a raw Groq chat completion."""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return None, None
+    return usage.prompt_tokens, usage.completion_tokens
+
+
+
+class GatewayChain:
+    """
+    A `prompt | model` chain whose invocations go through the gateway and return the reply text.
+    The underlying runnable is built on first use.
+
+    Temperature-0 chains are served from the gateway's response cache unless created with cache=False.
+    Only replies that pass `validate(reply)` (when given; it raises on malformed output) and are not
+    empty are cached, so a caller that re-asks after a parse failure reaches the model again.
+    """
+
+    def __init__(self, gateway: 'LLMGateway', name: str, prompt, model: str, temperature: float = 0,
+                 max_tokens: Optional[int] = None, cache: bool = True,
+                 validate: Optional[Callable[[str], object]] = None):
+        self.gateway = gateway
+        self.name = name
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.validate = validate
+        self.prompt = prompt
+
+    @property
+    def prompt(self):
+        return self._prompt
+
+    @prompt.setter
+    def prompt(self, prompt):
+        # Replacing the prompt rebuilds the runnable and gives the chain a new cache fingerprint.
+        self._prompt = prompt
+        self._runnable = None
+        self._prompt_tokens = None
+        self._fingerprint = None
+
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = prompt_fingerprint(self.prompt, self.model, str(self.max_tokens))
+            if self.gateway.response_cache is not None:
+                self.gateway.response_cache.register(self.name, self._fingerprint)
+        return self._fingerprint
+
+    @property
+    def cacheable(self) -> bool:
+        return (
+            self.cache
+            and self.temperature == 0
+            and self.gateway.response_cache is not None
+            and self.name not in self.gateway.cache_disabled_chains
+        )
+
+    @property
+    def runnable(self):
+        if self._runnable is None:
+            llm = self.gateway.chat_model(self.model, self.temperature, self.max_tokens)
+            # The output parser runs after the call so the reply's token usage can be reported.
+            self._runnable = self.prompt | llm
+        return self._runnable
+
+    def estimate_tokens(self, inputs: dict) -> int:
+        """Prompt plus completion budget, used for rate-limit admission."""
+        if self._prompt_tokens is None:
+            self._prompt_tokens = estimate_tokens(prompt_text(self.prompt))
+        input_tokens = sum(estimate_tokens(str(value)) for value in inputs.values())
+        return self._prompt_tokens + input_tokens + (self.max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+    def _call(self, inputs: dict) -> str:
+        message = self.gateway.call(
+            self.name, lambda: self.runnable.invoke(inputs),
+            model=self.model, estimated_tokens=self.estimate_tokens(inputs), usage=message_usage
+        )
+        return _output_parser.invoke(message)
+
+    def _should_cache(self, reply: str) -> bool:
+        if not reply or not reply.strip():
+            return False
+        if self.validate is None:
+            return True
+        try:
+            self.validate(reply)
+        except Exception as e:
+            logging.warning(f"[{self.name}] Not caching a reply that failed validation: {e}")
+            return False
+        return True
+
+    def invoke(self, inputs: dict) -> str:
+        if not self.cacheable:
+            return self._call(inputs)
+
+        cache = self.gateway.response_cache
+        key = cache.make_key(self.fingerprint, self.model, self.temperature, inputs)
+        cached = cache.get(self.name, key)
+        if cached is not None:
+            logging.info(f"[{self.name}] Served from LLM response cache.")
+            self.gateway._notify(CallRecord(self.name, self.model, 0.0, 0, 0.0, cached=True))
+            return cached
+
+        result = self._call(inputs)
+        if self._should_cache(result):
+            cache.set(self.name, key, result)
+        return result
+
+
+class LLMGateway:
+    """
+    Single entry point for every Groq call made by the app.
+
+    * One ChatGroq instance per (model, temperature, max_tokens), all sharing one keep-alive
+      HTTP connection pool, plus one raw Groq client on the same pool.
+    * One retry/backoff policy for every call (client-side retries are disabled so they don't stack).
+    * Per-call latency, attempts and backoff time, reported to registered listeners.
+    * Optional proactive admission through a shared RateLimitScheduler before every attempt.
+    * Optional ResponseCache for deterministic chains (`cache_disabled_chains` opts chains out by name).
+    """
+
+    def __init__(self, api_key: Optional[str] = None, retry_policy: Optional[RetryPolicy] = None, max_connections: int = 20,
+                 scheduler: Optional[RateLimitScheduler] = None, response_cache: Optional[ResponseCache] = None,
+                 cache_disabled_chains=()):
+        self.api_key = api_key or os.getenv('GROQ_API_KEY')
+        self.retry_policy = retry_policy or RetryPolicy.from_env()
+        self.scheduler = scheduler
+        self.response_cache = response_cache
+        self.cache_disabled_chains = set(cache_disabled_chains)
+        self._max_connections = max_connections
+        self._http_client = None
+        self._raw_client = None
+        self._models = {}
+        self._chains = []
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    @property
+    def http_client(self) -> 'httpx.Client':
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self._max_connections,
+                        max_keepalive_connections=self._max_connections,
+                        keepalive_expiry=60,
+                    ),
+                    timeout=httpx.Timeout(120.0, connect=10.0),
+                )
+            return self._http_client
+
+    @property
+    def client(self) -> 'groq.Groq':
+        """Raw Groq client for calls that don't go through LangChain."""
+        http_client = self.http_client
+        with self._lock:
+            if self._raw_client is None:
+                self._raw_client = groq.Groq(api_key=self.api_key, http_client=http_client, max_retries=0)
+            return self._raw_client
+
+    def chat_model(self, model: str, temperature: float = 0, max_tokens: Optional[int] = None) -> 'ChatGroq':
+        from langchain_groq import ChatGroq
+
+        key = (model, temperature, max_tokens)
+        http_client = self.http_client
+        with self._lock:
+            if key not in self._models:
+                kwargs = {"model": model, "temperature": temperature, "http_client": http_client, "max_retries": 0}
+                if max_tokens is not None:
+                    kwargs["max_tokens"] = max_tokens
+                self._models[key] = ChatGroq(**kwargs)
+            return self._models[key]
+
+    def chain(self, name: str, prompt, model: str = "llama-3.3-70b-versatile", temperature: float = 0,
+              max_tokens: Optional[int] = None, cache: bool = True,
+              validate: Optional[Callable[[str], object]] = None) -> GatewayChain:
+        chain = GatewayChain(self, name, prompt, model, temperature, max_tokens, cache, validate)
+        self._chains.append(chain)
+        return chain
+
+    def warm_up(self):
+        """Imports the SDKs and builds every chain's model client and runnable ahead of the first call."""
+        for chain in list(self._chains):
+            chain.runnable
+            chain.fingerprint
+        self.client
+
+    def add_listener(self, listener: Callable[[CallRecord], None]):
+        """Registers a callback that receives a CallRecord after every call."""
+        self._listeners.append(listener)
+
+    def _notify(self, record: CallRecord):
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                logging.warning(f"LLM gateway listener failed: {e}")
+
+    def call(self, name: str, fn: Callable[[], object], model: Optional[str] = None, estimated_tokens: Optional[int] = None,
+             usage: Optional[Callable[[object], tuple]] = None):
+        """
+        Runs `fn` under the retry policy. Retryable errors are retried with backoff;
+        the last error is re-raised once attempts are exhausted. Other errors are raised immediately.
+        When a scheduler is configured, every attempt first waits for admission.
+        `usage` maps the result to (prompt_tokens, completion_tokens) for listeners.
+        """
+        policy = self.retry_policy
+        started = time.perf_counter()
+        retry_wait = 0.0
+        queue_wait = 0.0
+        attempt = 0
+        while True:
+            if self.scheduler is not None and model:
+                queue_wait += self.scheduler.acquire(model, estimated_tokens or DEFAULT_COMPLETION_TOKENS)
+            try:
+                result = fn()
+            except retryable_errors() as e:
+                delay = policy.delay_for(attempt, e)
+                if isinstance(e, groq.RateLimitError) and self.scheduler is not None and model:
+                    # Tell every other worker to hold off as well.
+                    self.scheduler.penalize(model, parse_retry_after(str(e)) or delay)
+                if attempt >= policy.max_attempts - 1:
+                    self._notify(CallRecord(name, model, time.perf_counter() - started, attempt + 1, retry_wait, queue_wait, e))
+                    raise
+                logging.warning(f"[{name}] {type(e).__name__} (attempt {attempt + 1}/{policy.max_attempts}); retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                retry_wait += delay
+                attempt += 1
+            except Exception as e:
+                self._notify(CallRecord(name, model, time.perf_counter() - started, attempt + 1, retry_wait, queue_wait, e))
+                raise
+            else:
+                latency = time.perf_counter() - started
+                logging.info(
+                    f"[{name}] LLM call finished in {latency:.2f}s ({attempt + 1} attempt(s), "
+                    f"{retry_wait:.1f}s backoff, {queue_wait:.1f}s queued)."
+                )
+                prompt_tokens, completion_tokens = None, None
+                if usage is not None:
+                    try:
+                        prompt_tokens, completion_tokens = usage(result)
+                    except Exception as e:
+                        logging.debug(f"[{name}] Could not read token usage: {e}")
+                self._notify(CallRecord(name, model, latency, attempt + 1, retry_wait, queue_wait,
+                                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+                return result
@@ -0,0 +1,113 @@
+"""
+Prometheus instrumentation for the web app and background workers.
+
+Set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does this) so every gunicorn worker and worker.py
+process writes its samples to a shared directory; `/metrics` then aggregates all of them.
+Without it, each process only reports its own samples.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+)
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+QUEUE_BUCKETS = (0, 0.05, 0.25, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LLM_LATENCY = Histogram('jobstir_llm_call_seconds', 'LLM call latency including retries and backoff.',
+                        ['chain', 'model', 'route'], buckets=LATENCY_BUCKETS)
+LLM_CALLS = Counter('jobstir_llm_calls_total', 'LLM calls by outcome (ok, cached or the error class).',
+                    ['chain', 'model', 'route', 'outcome'])
+LLM_TOKENS = Counter('jobstir_llm_tokens_total', 'Tokens reported by the API.', ['chain', 'model', 'kind'])
+LLM_RETRIES = Counter('jobstir_llm_retries_total', 'Retried LLM attempts.', ['chain', 'model'])
+LLM_BACKOFF = Counter('jobstir_llm_backoff_seconds_total', 'Seconds slept between LLM retries.', ['chain', 'model'])
+LLM_QUEUE_WAIT = Histogram('jobstir_llm_queue_wait_seconds', 'Seconds waiting for rate-limit admission.',
+                           ['chain', 'model'], buckets=QUEUE_BUCKETS)
+PROMPT_TOKENS_SAVED = Counter('jobstir_prompt_tokens_saved_total', 'Estimated input tokens saved by compact serialization.',
+                              ['chain'])
+
+DB_LATENCY = Histogram('jobstir_supabase_seconds', 'Supabase query latency.', ['query', 'route'], buckets=LATENCY_BUCKETS)
+DB_ERRORS = Counter('jobstir_supabase_errors_total', 'Failed Supabase queries.', ['query', 'route', 'error'])
+
+PDF_LATENCY = Histogram('jobstir_pdf_extraction_seconds', 'PDF text extraction latency.', ['route'], buckets=LATENCY_BUCKETS)
+PDF_ERRORS = Counter('jobstir_pdf_extraction_errors_total', 'Failed PDF extractions.', ['route', 'error'])
+
+MAIL_LATENCY = Histogram('jobstir_mail_send_seconds', 'SMTP send latency.', ['kind', 'route'], buckets=LATENCY_BUCKETS)
+MAIL_ERRORS = Counter('jobstir_mail_errors_total', 'Failed SMTP sends.', ['kind', 'route', 'error'])
+
+HTTP_LATENCY = Histogram('jobstir_http_request_seconds', 'HTTP request latency.', ['route', 'method', 'status'],
+                         buckets=LATENCY_BUCKETS)
+
+
+def current_route() -> str:
+    """The Flask endpoint being served, or 'background' outside a browser request (e.g. worker.py)."""
+    if has_request_context():
+        return request.endpoint or 'background'
+    return 'background'
+
+
+def observe_llm_call(record):
+    """LLMGateway listener."""
+    model = record.model or 'unknown'
+    route = current_route()
+    if record.cached:
+        LLM_CALLS.labels(record.name, model, route, 'cached').inc()
+        return
+    outcome = 'ok' if record.error is None else type(record.error).__name__
+    LLM_CALLS.labels(record.name, model, route, outcome).inc()
+    LLM_LATENCY.labels(record.name, model, route).observe(record.latency)
+    LLM_QUEUE_WAIT.labels(record.name, model).observe(record.queue_wait)
+    if record.attempts > 1:
+        LLM_RETRIES.labels(record.name, model).inc(record.attempts - 1)
+        LLM_BACKOFF.labels(record.name, model).inc(record.retry_wait)
+    if record.prompt_tokens:
+        LLM_TOKENS.labels(record.name, model, 'prompt').inc(record.prompt_tokens)
+    if record.completion_tokens:
+        LLM_TOKENS.labels(record.name, model, 'completion').inc(record.completion_tokens)
+
+
+def observe_prompt_payload(chain_name: str, baseline_tokens: int, sent_tokens: int, truncated: bool):
+    """PromptSerializer listener."""
+    if baseline_tokens > sent_tokens:
+        PROMPT_TOKENS_SAVED.labels(chain_name).inc(baseline_tokens - sent_tokens)
+
+
+@contextmanager
+def _timed(histogram, errors, labels: dict):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        errors.labels(**labels, error=type(e).__name__).inc()
+        raise
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def track_db(query: str):
+    return _timed(DB_LATENCY, DB_ERRORS, {'query': query, 'route': current_route()})
+
+
+def track_pdf():
+    return _timed(PDF_LATENCY, PDF_ERRORS, {'route': current_route()})
+
+
+def track_mail(kind: str):
+    return _timed(MAIL_LATENCY, MAIL_ERRORS, {'kind': kind, 'route': current_route()})
+
+
+def observe_request(route: str, method: str, status: int, seconds: float):
+    HTTP_LATENCY.labels(route, method, str(status)).observe(seconds)
+
+
+def render_metrics() -> tuple:
+    """Returns (body, content_type) in the Prometheus text format, aggregated across processes when possible."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
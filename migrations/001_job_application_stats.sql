@@ -0,0 +1,88 @@
+-- Per-job application counters for the HR dashboard (see job_stats.py).
+--
+-- The app applies deltas through bump_job_application_stats when an application is inserted,
+-- its exam is submitted or it is approved; `flask reconcile-job-stats` recomputes the rows from
+-- candidate_applications (reconcile_job_application_stats) to repair any drift (e.g. a worker
+-- dying between the write and the bump). The backfill at the end gives every existing job its
+-- historical totals, so the app never has to recount on a page load.
+--
+-- The counts mirror job_stats.STAT_AGGREGATES.
+
+create table if not exists public.job_application_stats (
+    job_id uuid primary key references public.jobs (id) on delete cascade,
+    applications integer not null default 0,
+    recommended integer not null default 0,
+    exams_completed integer not null default 0,
+    pending_review integer not null default 0,
+    approved integer not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+-- Atomic increment, so concurrent workers never lose each other's updates.
+create or replace function public.bump_job_application_stats(
+    p_job_id uuid,
+    p_applications integer default 0,
+    p_recommended integer default 0,
+    p_exams_completed integer default 0,
+    p_pending_review integer default 0,
+    p_approved integer default 0
+) returns void
+language sql
+as $$
+    insert into public.job_application_stats as s
+        (job_id, applications, recommended, exams_completed, pending_review, approved)
+    values (p_job_id, p_applications, p_recommended, p_exams_completed, p_pending_review, p_approved)
+    on conflict (job_id) do update set
+        applications = s.applications + excluded.applications,
+        recommended = s.recommended + excluded.recommended,
+        exams_completed = s.exams_completed + excluded.exams_completed,
+        pending_review = s.pending_review + excluded.pending_review,
+        approved = s.approved + excluded.approved,
+        updated_at = now();
+$$;
+
+-- Recount under the row lock: a bump arriving meanwhile waits and is applied on top of the
+-- recounted totals instead of being overwritten by them.
+create or replace function public.reconcile_job_application_stats(p_job_id uuid)
+returns setof public.job_application_stats
+language plpgsql
+as $$
+begin
+    insert into public.job_application_stats (job_id) values (p_job_id) on conflict (job_id) do nothing;
+    perform 1 from public.job_application_stats where job_id = p_job_id for update;
+    return query
+    update public.job_application_stats s set
+        applications = c.applications,
+        recommended = c.recommended,
+        exams_completed = c.exams_completed,
+        pending_review = c.pending_review,
+        approved = c.approved,
+        updated_at = now()
+    from (
+        select count(*)::integer as applications,
+               (count(*) filter (where substr(eligibility_status, 1, 11) = 'Recommended'))::integer as recommended,
+               (count(*) filter (where exam_taken))::integer as exams_completed,
+               (count(*) filter (where exam_taken and coalesce(eligibility_status, '') <> 'Approved'))::integer as pending_review,
+               (count(*) filter (where eligibility_status = 'Approved'))::integer as approved
+        from public.candidate_applications
+        where job_id = p_job_id
+    ) c
+    where s.job_id = p_job_id
+    returning s.*;
+end;
+$$;
+
+-- Backfill: every job posted before this migration gets its historical totals (jobs without
+-- applications get a row of zeros). Rows already written by bumps are left alone.
+insert into public.job_application_stats
+    (job_id, applications, recommended, exams_completed, pending_review, approved)
+select j.id,
+       count(a.id),
+       count(a.id) filter (where substr(a.eligibility_status, 1, 11) = 'Recommended'),
+       count(a.id) filter (where a.exam_taken),
+       count(a.id) filter (where a.exam_taken and coalesce(a.eligibility_status, '') <> 'Approved'),
+       count(a.id) filter (where a.eligibility_status = 'Approved')
+from public.jobs j
+left join public.candidate_applications a on a.job_id = j.id
+group by j.id
+on conflict (job_id) do nothing;
@@ -0,0 +1,119 @@
+import json
+import logging
+import re
+import threading
+from typing import Callable, Optional
+
+from rate_limiter import estimate_tokens
+
+TRUNCATION_MARK = "…"
+
+# Longest string kept while shrinking a payload to its budget, halved until the payload fits.
+_START_STRING_LIMIT = 1200
+_MIN_STRING_LIMIT = 80
+
+_SPACES = re.compile(r'[ \t ]+')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+def prune_empty(value):
+    """Recursively drops None, empty strings, empty lists and empty dicts. Zero and False are kept."""
+    if isinstance(value, dict):
+        pruned = {}
+        for key, item in value.items():
+            item = prune_empty(item)
+            if item is None or item == "" or item == [] or item == {}:
+                continue
+            pruned[key] = item
+        return pruned
+    if isinstance(value, (list, tuple)):
+        items = [prune_empty(item) for item in value]
+        return [item for item in items if not (item is None or item == "" or item == [] or item == {})]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def truncate_strings(value, max_chars: int):
+    """Shortens every string longer than max_chars (description bullets, summaries, ...)."""
+    if isinstance(value, dict):
+        return {key: truncate_strings(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [truncate_strings(item, max_chars) for item in value]
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars - 1].rstrip() + TRUNCATION_MARK
+    return value
+
+
+def collapse_whitespace(text: str) -> str:
+    """Collapses runs of spaces and blank lines, as left behind by PDF extraction and pasted job descriptions."""
+    text = _SPACES.sub(' ', text)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+
+class PromptSerializer:
+    """
+    Turns chain inputs into compact prompt text and keeps per-chain token accounting.
+
+    JSON payloads are pruned of empty fields and dumped without indentation; if a token budget is
+    given, long strings are shortened until the payload fits. Free text has its whitespace
+    collapsed and is cut at the budget. Savings are measured against what the chain used to send
+    (`json.dumps(..., indent=2)` or the raw text), using the same estimator as the rate limiter.
+    """
+
+    def __init__(self, listener: Optional[Callable[[str, int, int, bool], None]] = None):
+        self.listener = listener
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _record(self, chain_name: str, baseline_tokens: int, sent_tokens: int, truncated: bool):
+        with self._lock:
+            stats = self._stats.setdefault(chain_name, {'calls': 0, 'baseline_tokens': 0, 'sent_tokens': 0, 'truncated': 0})
+            stats['calls'] += 1
+            stats['baseline_tokens'] += baseline_tokens
+            stats['sent_tokens'] += sent_tokens
+            stats['truncated'] += int(truncated)
+        logging.info(f"[{chain_name}] Prompt payload {sent_tokens} tokens ({baseline_tokens - sent_tokens} saved).")
+        if self.listener is not None:
+            self.listener(chain_name, baseline_tokens, sent_tokens, truncated)
+
+    def json(self, chain_name: str, value, token_budget: Optional[int] = None) -> str:
+        baseline_tokens = estimate_tokens(json.dumps(value, indent=2, default=str))
+        pruned = prune_empty(value)
+        text = compact_json(pruned)
+
+        truncated = False
+        limit = _START_STRING_LIMIT
+        while token_budget and estimate_tokens(text) > token_budget and limit >= _MIN_STRING_LIMIT:
+            text = compact_json(truncate_strings(pruned, limit))
+            truncated = True
+            limit //= 2
+
+        self._record(chain_name, baseline_tokens, estimate_tokens(text), truncated)
+        return text
+
+    def text(self, chain_name: str, text: str, token_budget: Optional[int] = None) -> str:
+        text = text or ''
+        baseline_tokens = estimate_tokens(text)
+        compacted = collapse_whitespace(text)
+
+        truncated = False
+        if token_budget and estimate_tokens(compacted) > token_budget:
+            compacted = compacted[:token_budget * 4].rstrip() + TRUNCATION_MARK
+            truncated = True
+
+        self._record(chain_name, baseline_tokens, estimate_tokens(compacted), truncated)
+        return compacted
+
+    def stats(self) -> dict:
+        """Per-chain calls, baseline/sent/saved token totals and how many payloads were truncated."""
+        with self._lock:
+            return {
+                name: dict(stats, saved_tokens=stats['baseline_tokens'] - stats['sent_tokens'])
+                for name, stats in self._stats.items()
+            }
@@ -0,0 +1,223 @@
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+
+class Priority:
+    """Admission priorities; lower values are served first."""
+    INTERACTIVE_CANDIDATE = 0
+    INTERACTIVE_HR = 1
+    BACKGROUND = 2
+
+
+_current_priority = contextvars.ContextVar('llm_priority', default=Priority.BACKGROUND)
+
+
+def get_priority() -> int:
+    return _current_priority.get()
+
+
+def set_priority(priority: int) -> contextvars.Token:
+    """Sets the priority for LLM calls made from the current context. Returns a token for reset_priority()."""
+    return _current_priority.set(priority)
+
+
+def reset_priority(token: contextvars.Token):
+    _current_priority.reset(token)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    token = set_priority(priority)
+    try:
+        yield
+    finally:
+        reset_priority(token)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English/JSON prompt text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class RateLimitScheduler:
+    """
+    Token-bucket admission control for the Groq quota, shared by every thread and process on the host.
+
+    Each model has a request bucket (RPM) and a token bucket (TPM). Bucket state and the wait queue
+    live in a SQLite file, so all gunicorn workers draw from the same budget. Callers queue by
+    (priority, arrival time) and are admitted only when they are at the head of the queue and both
+    buckets can pay for the call, so 429s become the exception rather than the normal control path.
+    """
+
+    def __init__(self, db_path: str, requests_per_minute: int = 30, tokens_per_minute: int = 12000,
+                 model_limits: Optional[dict] = None, max_wait: float = 300.0):
+        self.db_path = db_path
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.model_limits = model_limits or {}
+        self.max_wait = max_wait
+        self._db_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        if not self._db_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS waiters ("
+                "id TEXT PRIMARY KEY, model TEXT NOT NULL, priority INTEGER NOT NULL, "
+                "enqueued_at REAL NOT NULL, heartbeat REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_waiters_queue ON waiters(model, priority, enqueued_at)")
+            self._db_ready = True
+        return conn
+
+    def limits_for(self, model: str) -> tuple:
+        limits = self.model_limits.get(model, {})
+        return (
+            float(limits.get('rpm', self.requests_per_minute)),
+            float(limits.get('tpm', self.tokens_per_minute)),
+        )
+
+    def _bucket(self, conn, name: str, capacity: float, now: float) -> tuple:
+        """Returns (level, blocked_until) after refilling the bucket up to now."""
+        row = conn.execute("SELECT level, updated_at, blocked_until FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            conn.execute("INSERT INTO buckets (name, level, updated_at) VALUES (?, ?, ?)", (name, capacity, now))
+            return capacity, 0.0
+        level, updated_at, blocked_until = row
+        level = min(capacity, level + (now - updated_at) * capacity / 60.0)
+        return level, blocked_until
+
+    def _try_admit(self, waiter_id: str, model: str, tokens: float, now: float) -> float:
+        """One admission attempt. Returns 0 if admitted, otherwise the suggested seconds to wait."""
+        rpm, tpm = self.limits_for(model)
+        # A single call larger than the whole bucket would never fit; charge at most a full bucket.
+        tokens = min(tokens, tpm)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Forget waiters whose process died without cleaning up.
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - 30,))
+            conn.execute("UPDATE waiters SET heartbeat = ? WHERE id = ?", (now, waiter_id))
+            head = conn.execute(
+                "SELECT id FROM waiters WHERE model = ? ORDER BY priority, enqueued_at LIMIT 1", (model,)
+            ).fetchone()
+
+            req_level, req_blocked = self._bucket(conn, f"{model}:requests", rpm, now)
+            tok_level, tok_blocked = self._bucket(conn, f"{model}:tokens", tpm, now)
+            blocked_until = max(req_blocked, tok_blocked)
+
+            if head and head[0] == waiter_id and now >= blocked_until and req_level >= 1 and tok_level >= tokens:
+                conn.execute("UPDATE buckets SET level = ?, updated_at = ? WHERE name = ?", (req_level - 1, now, f"{model}:requests"))
+                conn.execute("UPDATE buckets SET level = ?, updated_at = ? WHERE name = ?", (tok_level - tokens, now, f"{model}:tokens"))
+                conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+                conn.execute("COMMIT")
+                return 0.0
+
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        if head is None or head[0] != waiter_id:
+            return 0.05
+        wait = max(
+            blocked_until - now,
+            (1 - req_level) * 60.0 / rpm,
+            (tokens - tok_level) * 60.0 / tpm,
+        )
+        return min(max(wait, 0.01), 1.0)
+
+    def acquire(self, model: str, tokens: int, priority: Optional[int] = None) -> float:
+        """
+        Blocks until the call may be sent. Returns the seconds spent waiting.
+        If the scheduler itself fails, or waiting exceeds max_wait, the call is let through.
+        """
+        priority = get_priority() if priority is None else priority
+        waiter_id = str(uuid.uuid4())
+        started = time.time()
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT INTO waiters (id, model, priority, enqueued_at, heartbeat) VALUES (?, ?, ?, ?, ?)",
+                    (waiter_id, model, priority, started, started)
+                )
+            finally:
+                conn.close()
+
+            while True:
+                now = time.time()
+                wait = self._try_admit(waiter_id, model, tokens, now)
+                if wait == 0:
+                    return now - started
+                if now - started >= self.max_wait:
+                    logging.warning(f"Rate-limit scheduler waited {self.max_wait}s for {model}; sending call anyway.")
+                    self._remove_waiter(waiter_id)
+                    return now - started
+                time.sleep(wait)
+        except sqlite3.Error as e:
+            logging.warning(f"Rate-limit scheduler unavailable, admitting call without throttling: {e}")
+            self._remove_waiter(waiter_id)
+            return time.time() - started
+
+    def _remove_waiter(self, waiter_id: str):
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+
+    def penalize(self, model: str, seconds: float):
+        """Pauses admissions for a model after the API reported a rate limit anyway."""
+        until = time.time() + seconds
+        rpm, tpm = self.limits_for(model)
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for name, capacity in ((f"{model}:requests", rpm), (f"{model}:tokens", tpm)):
+                    self._bucket(conn, name, capacity, time.time())
+                    conn.execute(
+                        "UPDATE buckets SET level = 0, updated_at = ?, blocked_until = MAX(blocked_until, ?) WHERE name = ?",
+                        (time.time(), until, name)
+                    )
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not record rate-limit penalty: {e}")
+
+
+def create_rate_limit_scheduler() -> Optional[RateLimitScheduler]:
+    """Builds the scheduler from environment settings, or returns None if disabled."""
+    if os.getenv('LLM_RATE_LIMITER', 'True').lower() != 'true':
+        return None
+    db_path = os.getenv('LLM_RATE_LIMITER_DB', os.path.join('cache', 'rate_limiter.sqlite3'))
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return RateLimitScheduler(
+        db_path,
+        requests_per_minute=int(os.getenv('GROQ_RPM', 30)),
+        tokens_per_minute=int(os.getenv('GROQ_TPM', 12000)),
+        # e.g. GROQ_MODEL_LIMITS='{"llama-3.1-8b-instant": {"rpm": 30, "tpm": 6000}}'
+        model_limits=json.loads(os.getenv('GROQ_MODEL_LIMITS', '{}')),
+        max_wait=float(os.getenv('LLM_RATE_LIMITER_MAX_WAIT', 300)),
+    )
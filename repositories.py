@@ -0,0 +1,531 @@
+"""
+Data access for the jobs, candidate_applications, evaluations, contacts and job_application_stats
+tables. Routes go through a `Repositories` instead of building Supabase queries themselves, so the
+same code runs against Supabase or against a local SQLite file (DATA_BACKEND=sqlite), which is
+what benchmarks and load tests use when the live service is not available.
+
+Both backends return rows shaped like Supabase's: plain dicts, JSON columns already parsed,
+exam_taken as a bool. `columns` arguments are tuples of column names; None means every column.
+"""
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+
+from job_stats import STAT_AGGREGATES, STAT_COLUMNS
+
+# What the HR dashboard's applicant table shows, and the orders it can be sorted in.
+# 'name' is the candidate name from the parsed resume.
+APPLICANT_SUMMARY_COLUMNS = ('id', 'name', 'match_score', 'eligibility_status', 'exam_taken', 'exam_score', 'submission_date')
+APPLICANT_SUMMARY_SORTS = ('match_score', 'exam_score', 'submission_date', 'eligibility_status', 'name')
+PAGE_SIZE = 1000
+DATA_BACKENDS = ('supabase', 'sqlite')
+
+
+def _untracked(name: str):
+    return nullcontext()
+
+
+class Repositories:
+    """One repository per table, all backed by the same store."""
+
+    def __init__(self, jobs, applications, evaluations, contacts, job_stats):
+        self.jobs = jobs
+        self.applications = applications
+        self.evaluations = evaluations
+        self.contacts = contacts
+        self.job_stats = job_stats
+
+
+# --- Supabase ---
+
+class _SupabaseTable:
+    table = None
+
+    def __init__(self, client, call: Callable = _untracked):
+        self.client = client
+        self.call = call
+
+    def _run(self, action: str, query) -> list:
+        # Queries are recorded as '<table>.<action>' (e.g. 'jobs.select') in metrics and traces.
+        with self.call(f"{self.table}.{action}"):
+            return query.execute().data or []
+
+    def _select(self, columns: Optional[tuple]):
+        return self.client.table(self.table).select(', '.join(columns) if columns else '*')
+
+    def get(self, row_id, columns: Optional[tuple] = None) -> Optional[dict]:
+        rows = self._run('select', self._select(columns).eq('id', row_id).limit(1))
+        return rows[0] if rows else None
+
+    def by_ids(self, row_ids: Iterable, columns: Optional[tuple] = None) -> list:
+        row_ids = list(row_ids)
+        if not row_ids:
+            return []
+        return self._run('select', self._select(columns).in_('id', row_ids))
+
+    def insert(self, row: dict) -> Optional[dict]:
+        """The inserted row as stored (with its generated id), or None if nothing was written."""
+        rows = self._run('insert', self.client.table(self.table).insert(row))
+        return rows[0] if rows else None
+
+
+class SupabaseJobs(_SupabaseTable):
+    table = 'jobs'
+
+    def all(self, columns: Optional[tuple] = None) -> list:
+        """Every job, newest first."""
+        return self._run('select', self._select(columns).order('date_posted', desc=True))
+
+    def for_hr(self, hr_user_id) -> list:
+        """The jobs an HR user posted, newest first."""
+        return self._run('select', self._select(None).eq('hr_user_id', hr_user_id).order('date_posted', desc=True))
+
+
+class SupabaseApplications(_SupabaseTable):
+    table = 'candidate_applications'
+
+    def for_candidate(self, candidate_user_id) -> list:
+        return self._run('select', self._select(None).eq('candidate_user_id', candidate_user_id))
+
+    def for_job(self, job_id, columns: Optional[tuple] = None, page_size: int = PAGE_SIZE) -> list:
+        """Every application of a job, fetched `page_size` rows per request in id order."""
+        applications = []
+        offset = 0
+        while True:
+            page = self._run('select', self._select(columns).eq('job_id', job_id).order('id')
+                             .range(offset, offset + page_size - 1))
+            applications.extend(page)
+            if len(page) < page_size:
+                return applications
+            offset += page_size
+
+    def summaries_for_job(self, job_id, sort: str, descending: bool, offset: int, limit: int) -> list:
+        """Up to `limit` rows of APPLICANT_SUMMARY_COLUMNS, sorted by one of APPLICANT_SUMMARY_SORTS (nulls last, then id)."""
+        column = 'extracted_info->>name' if sort == 'name' else sort
+        query = self.client.table(self.table).select(
+            'id, name:extracted_info->>name, match_score, eligibility_status, exam_taken, exam_score, submission_date'
+        ).eq('job_id', job_id).order(column, desc=descending, nullsfirst=False).order('id')
+        return self._run('select', query.range(offset, offset + limit - 1))
+
+    def update(self, application_id, values: dict) -> bool:
+        """True if the application exists (and was updated)."""
+        return bool(self._run('update', self.client.table(self.table).update(values).eq('id', application_id)))
+
+    def update_many(self, application_ids: list, values: dict) -> int:
+        """Sets the same values on every listed application in one request; returns how many matched."""
+        return len(self._run('update', self.client.table(self.table).update(values).in_('id', application_ids)))
+
+    def approve(self, application_id) -> bool:
+        """Marks the application Approved; False if it already was, so a double click counts once."""
+        return bool(self._run('update', self.client.table(self.table).update({'eligibility_status': 'Approved'})
+                              .eq('id', application_id).neq('eligibility_status', 'Approved')))
+
+    def record_exam(self, application_id, values: dict) -> bool:
+        """Stores exam results unless an exam was already recorded; False for a duplicate submission."""
+        return bool(self._run('update', self.client.table(self.table).update(values)
+                              .eq('id', application_id).not_.is_('exam_taken', 'true')))
+
+
+class SupabaseEvaluations(_SupabaseTable):
+    table = 'evaluations'
+
+
+class SupabaseContacts(_SupabaseTable):
+    table = 'contacts'
+
+
+class SupabaseJobStats(_SupabaseTable):
+    table = 'job_application_stats'
+
+    def bump(self, job_id, delta: dict):
+        """Adds `delta` to a job's counters atomically (migrations/001_job_application_stats.sql)."""
+        with self.call('job_application_stats.bump'):
+            self.client.rpc('bump_job_application_stats', {
+                'p_job_id': str(job_id), **{f'p_{column}': value for column, value in delta.items()}
+            }).execute()
+
+    def reconcile(self, job_id) -> dict:
+        """Recounts a job's counters from its applications under the row lock; returns the row."""
+        rows = self._run('reconcile', self.client.rpc('reconcile_job_application_stats', {'p_job_id': str(job_id)}))
+        return rows[0] if rows else None
+
+    def get_many(self, job_ids: list) -> list:
+        if not job_ids:
+            return []
+        return self._run('select', self.client.table(self.table).select(
+            'job_id, ' + ', '.join(STAT_COLUMNS)
+        ).in_('job_id', job_ids))
+
+
+def supabase_repositories(client, call: Callable = _untracked) -> Repositories:
+    return Repositories(
+        SupabaseJobs(client, call), SupabaseApplications(client, call), SupabaseEvaluations(client, call),
+        SupabaseContacts(client, call), SupabaseJobStats(client, call)
+    )
+
+
+# --- SQLite ---
+
+# The tables as the app uses them. 'json' columns are stored as text and parsed on read, 'bool'
+# as 0/1; rows get a uuid `id` and a `created_at` (where the table has one) if they come without.
+SQLITE_TABLES = {
+    'jobs': {
+        'id': 'text', 'hr_user_id': 'text', 'company_name': 'text', 'job_title': 'text',
+        'job_description': 'text', 'date_posted': 'text', 'knockout_questions_json': 'text',
+    },
+    'candidate_applications': {
+        'id': 'text', 'job_id': 'text', 'candidate_user_id': 'text', 'submission_date': 'text',
+        'resume_url': 'text', 'eligibility_status': 'text', 'match_score': 'real', 'eligibility_reason': 'text',
+        'extracted_info': 'json', 'exam_questions': 'json', 'knockout_analysis': 'json', 'exam_taken': 'bool',
+        'exam_score': 'real', 'exam_feedback': 'json', 'submitted_answers': 'json',
+    },
+    'evaluations': {
+        'id': 'text', 'created_at': 'text', 'user_id': 'text', 'total_score': 'real', 'skills_score': 'real',
+        'experience_score': 'real', 'education_score': 'real', 'project_score': 'real', 'reasoning': 'text',
+        'job_description': 'text', 'parsed_resume': 'json', 'candidate_name': 'text',
+    },
+    'contacts': {
+        'id': 'text', 'created_at': 'text', 'name': 'text', 'email': 'text', 'message': 'text',
+    },
+    'job_application_stats': {
+        'job_id': 'text', **{column: 'integer' for column in STAT_COLUMNS}, 'updated_at': 'text',
+    },
+}
+SQLITE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_jobs_date_posted ON jobs(date_posted)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_hr_user ON jobs(hr_user_id, date_posted)",
+    "CREATE INDEX IF NOT EXISTS idx_applications_job ON candidate_applications(job_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_applications_candidate ON candidate_applications(candidate_user_id)",
+)
+_SQL_TYPES = {'text': 'TEXT', 'json': 'TEXT', 'bool': 'INTEGER', 'integer': 'INTEGER', 'real': 'REAL'}
+
+
+def _encode(kind: str, value):
+    if value is None:
+        return None
+    if kind == 'json':
+        return json.dumps(value)
+    if kind == 'bool':
+        return int(bool(value))
+    return value
+
+
+def _decode(kind: Optional[str], value):
+    if value is None:
+        return None
+    if kind == 'json':
+        return json.loads(value)
+    if kind == 'bool':
+        return bool(value)
+    if kind == 'real' and float(value).is_integer():
+        return int(value)  # Supabase returns whole scores as ints
+    return value
+
+
+class SQLiteDatabase:
+    """
+    The SQLite file behind the local backend; tables are created on first use. Each thread keeps
+    its own connection (reopened after a fork). ':memory:' keeps the whole database in one
+    connection that calls take turns on, for tests and benchmarks.
+    """
+
+    def __init__(self, db_path: str, call: Callable = _untracked):
+        self.db_path = db_path
+        self.call = call
+        self._db_ready = False
+        self._memory = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if not self._db_ready:
+            if self.db_path != ':memory:':
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            for table, columns in SQLITE_TABLES.items():
+                key = 'job_id' if table == 'job_application_stats' else 'id'
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (" + ', '.join(
+                    f"{column} {_SQL_TYPES[kind]}" + (' PRIMARY KEY' if column == key else '')
+                    for column, kind in columns.items()
+                ) + ")")
+            for statement in SQLITE_INDEXES:
+                conn.execute(statement)
+            self._db_ready = True
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if self.db_path == ':memory:':
+            with self._lock:
+                if self._memory is None:
+                    self._memory = self._open()
+                yield self._memory
+            return
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = self._open()
+            self._local.pid = os.getpid()
+        yield self._local.conn
+
+    def execute(self, name: str, table: str, sql: str, params: Iterable = ()) -> list:
+        """Runs one statement under call(name); returns the rows decoded with `table`'s column types."""
+        kinds = SQLITE_TABLES[table]
+        with self.call(name), self.connection() as conn:
+            rows = conn.execute(sql, tuple(params)).fetchall()
+        return [{key: _decode(kinds.get(key), row[key]) for key in row.keys()} for row in rows]
+
+    def write(self, name: str, sql: str, params: Iterable = ()) -> int:
+        """Runs one statement under call(name); returns the number of rows it changed."""
+        with self.call(name), self.connection() as conn:
+            return conn.execute(sql, tuple(params)).rowcount
+
+    def encode_row(self, table: str, row: dict) -> dict:
+        kinds = SQLITE_TABLES[table]
+        unknown = set(row) - set(kinds)
+        if unknown:
+            raise ValueError(f"{table} has no column(s) {', '.join(sorted(unknown))}")
+        return {column: _encode(kinds[column], value) for column, value in row.items()}
+
+
+def _placeholders(values) -> str:
+    return ', '.join('?' for _ in values)
+
+
+class _SQLiteTable:
+    table = None
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    def _columns(self, columns: Optional[tuple]) -> str:
+        if not columns:
+            return '*'
+        unknown = set(columns) - set(SQLITE_TABLES[self.table])
+        if unknown:
+            raise ValueError(f"{self.table} has no column(s) {', '.join(sorted(unknown))}")
+        return ', '.join(columns)
+
+    def _select(self, columns: Optional[tuple], where: str = '', params: Iterable = (), tail: str = '') -> list:
+        sql = f"SELECT {self._columns(columns)} FROM {self.table}" + (f" WHERE {where}" if where else '') + tail
+        return self.db.execute(f"{self.table}.select", self.table, sql, params)
+
+    def _update(self, values: dict, where: str, params: Iterable) -> int:
+        encoded = self.db.encode_row(self.table, values)
+        sql = f"UPDATE {self.table} SET " + ', '.join(f"{column} = ?" for column in encoded) + f" WHERE {where}"
+        return self.db.write(f"{self.table}.update", sql, [*encoded.values(), *params])
+
+    def get(self, row_id, columns: Optional[tuple] = None) -> Optional[dict]:
+        rows = self._select(columns, "id = ?", (str(row_id),), " LIMIT 1")
+        return rows[0] if rows else None
+
+    def by_ids(self, row_ids: Iterable, columns: Optional[tuple] = None) -> list:
+        row_ids = [str(row_id) for row_id in row_ids]
+        if not row_ids:
+            return []
+        return self._select(columns, f"id IN ({_placeholders(row_ids)})", row_ids)
+
+    def insert(self, row: dict) -> Optional[dict]:
+        row = dict(row)
+        row.setdefault('id', str(uuid.uuid4()))
+        if 'created_at' in SQLITE_TABLES[self.table]:
+            row.setdefault('created_at', datetime.now(timezone.utc).isoformat())
+        encoded = self.db.encode_row(self.table, row)
+        self.db.write(f"{self.table}.insert",
+                      f"INSERT INTO {self.table} ({', '.join(encoded)}) VALUES ({_placeholders(encoded)})",
+                      encoded.values())
+        return {column: row.get(column) for column in SQLITE_TABLES[self.table]}
+
+
+class SQLiteJobs(_SQLiteTable):
+    table = 'jobs'
+
+    def all(self, columns: Optional[tuple] = None) -> list:
+        return self._select(columns, tail=" ORDER BY date_posted DESC")
+
+    def for_hr(self, hr_user_id) -> list:
+        return self._select(None, "hr_user_id = ?", (str(hr_user_id),), " ORDER BY date_posted DESC")
+
+
+class SQLiteApplications(_SQLiteTable):
+    table = 'candidate_applications'
+
+    def for_candidate(self, candidate_user_id) -> list:
+        return self._select(None, "candidate_user_id = ?", (str(candidate_user_id),))
+
+    def for_job(self, job_id, columns: Optional[tuple] = None, page_size: int = PAGE_SIZE) -> list:
+        return self._select(columns, "job_id = ?", (str(job_id),), " ORDER BY id")
+
+    def summaries_for_job(self, job_id, sort: str, descending: bool, offset: int, limit: int) -> list:
+        if sort not in APPLICANT_SUMMARY_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(APPLICANT_SUMMARY_SORTS)}")
+        column = "json_extract(extracted_info, '$.name')" if sort == 'name' else sort
+        sql = (
+            "SELECT id, json_extract(extracted_info, '$.name') AS name, match_score, eligibility_status, "
+            "exam_taken, exam_score, submission_date FROM candidate_applications WHERE job_id = ? "
+            f"ORDER BY {column} {'DESC' if descending else 'ASC'} NULLS LAST, id LIMIT ? OFFSET ?"
+        )
+        return self.db.execute(f"{self.table}.select", self.table, sql, (str(job_id), limit, offset))
+
+    def update(self, application_id, values: dict) -> bool:
+        return self._update(values, "id = ?", (str(application_id),)) > 0
+
+    def update_many(self, application_ids: list, values: dict) -> int:
+        application_ids = [str(application_id) for application_id in application_ids]
+        if not application_ids:
+            return 0
+        return self._update(values, f"id IN ({_placeholders(application_ids)})", application_ids)
+
+    def approve(self, application_id) -> bool:
+        return self._update({'eligibility_status': 'Approved'}, "id = ? AND eligibility_status != 'Approved'",
+                            (str(application_id),)) > 0
+
+    def record_exam(self, application_id, values: dict) -> bool:
+        return self._update(values, "id = ? AND exam_taken IS NOT 1", (str(application_id),)) > 0
+
+
+class SQLiteEvaluations(_SQLiteTable):
+    table = 'evaluations'
+
+
+class SQLiteContacts(_SQLiteTable):
+    table = 'contacts'
+
+
+class SQLiteJobStats(_SQLiteTable):
+    table = 'job_application_stats'
+
+    def bump(self, job_id, delta: dict):
+        columns = ', '.join(STAT_COLUMNS)
+        self.db.write(
+            'job_application_stats.bump',
+            f"INSERT INTO job_application_stats (job_id, {columns}, updated_at) "
+            f"VALUES (?, {_placeholders(STAT_COLUMNS)}, ?) ON CONFLICT(job_id) DO UPDATE SET "
+            + ', '.join(f"{column} = {column} + excluded.{column}" for column in STAT_COLUMNS)
+            + ", updated_at = excluded.updated_at",
+            [str(job_id), *(delta.get(column, 0) for column in STAT_COLUMNS), datetime.now(timezone.utc).isoformat()]
+        )
+
+    def reconcile(self, job_id) -> dict:
+        # One statement: the count and the write happen in the same write transaction.
+        columns = ', '.join(STAT_COLUMNS)
+        self.db.write(
+            'job_application_stats.reconcile',
+            f"INSERT INTO job_application_stats (job_id, {columns}, updated_at) SELECT ?, "
+            + ', '.join(STAT_AGGREGATES[column] for column in STAT_COLUMNS)
+            + ", ? FROM candidate_applications WHERE job_id = ? ON CONFLICT(job_id) DO UPDATE SET "
+            + ', '.join(f"{column} = excluded.{column}" for column in STAT_COLUMNS)
+            + ", updated_at = excluded.updated_at",
+            [str(job_id), datetime.now(timezone.utc).isoformat(), str(job_id)]
+        )
+        return self.get_many([job_id])[0]
+
+    def get_many(self, job_ids: list) -> list:
+        job_ids = [str(job_id) for job_id in job_ids]
+        if not job_ids:
+            return []
+        return self._select(('job_id', *STAT_COLUMNS), f"job_id IN ({_placeholders(job_ids)})", job_ids)
+
+
+def sqlite_repositories(db_path: str, call: Callable = _untracked) -> Repositories:
+    db = SQLiteDatabase(db_path, call)
+    return Repositories(SQLiteJobs(db), SQLiteApplications(db), SQLiteEvaluations(db), SQLiteContacts(db), SQLiteJobStats(db))
+
+
+# --- Request-scoped memoization ---
+
+class MemoizedReads:
+    """
+    Answers get() at most once per row within a scope: `memo()` returns the scope's dict (the app
+    keeps one per request) or None to read through. A cached full row also serves requests for a
+    subset of its columns. Callers get copies, so mutating a row never changes what the next
+    get() returns. Everything else is passed through to the wrapped repository.
+    """
+
+    def __init__(self, repository, memo: Callable[[], Optional[dict]]):
+        self.repository = repository
+        self.memo = memo
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    def get(self, row_id, columns: Optional[tuple] = None) -> Optional[dict]:
+        memo = self.memo()
+        if memo is None:
+            return self.repository.get(row_id, columns)
+        full_key = (self.repository.table, str(row_id), None)
+        if full_key in memo:
+            row = memo[full_key]
+            if row is not None and columns:
+                row = {column: row.get(column) for column in columns}
+        else:
+            key = (self.repository.table, str(row_id), tuple(columns) if columns else None)
+            if key not in memo:
+                memo[key] = self.repository.get(row_id, columns)
+            row = memo[key]
+        return copy.deepcopy(row)
+
+    def forget(self, row_ids: Iterable):
+        """Drops memoized reads of rows this scope has just written."""
+        memo = self.memo()
+        if not memo:
+            return
+        row_ids = {str(row_id) for row_id in row_ids}
+        for key in [key for key in memo if key[0] == self.repository.table and key[1] in row_ids]:
+            del memo[key]
+
+
+class MemoizedApplications(MemoizedReads):
+    def update(self, application_id, values: dict) -> bool:
+        self.forget([application_id])
+        return self.repository.update(application_id, values)
+
+    def update_many(self, application_ids: list, values: dict) -> int:
+        self.forget(application_ids)
+        return self.repository.update_many(application_ids, values)
+
+    def approve(self, application_id) -> bool:
+        self.forget([application_id])
+        return self.repository.approve(application_id)
+
+    def record_exam(self, application_id, values: dict) -> bool:
+        self.forget([application_id])
+        return self.repository.record_exam(application_id, values)
+
+
+def memoized(repositories: Repositories, memo: Callable[[], Optional[dict]]) -> Repositories:
+    """The same repositories with job and application reads memoized per `memo()` scope."""
+    return Repositories(
+        MemoizedReads(repositories.jobs, memo), MemoizedApplications(repositories.applications, memo),
+        repositories.evaluations, repositories.contacts, repositories.job_stats
+    )
+
+
+def create_repositories(supabase_client, call: Callable = _untracked,
+                        memo: Optional[Callable[[], Optional[dict]]] = None) -> Repositories:
+    """
+    Builds the data layer from environment settings. DATA_BACKEND is 'supabase' (the default) or
+    'sqlite', which stores everything in DATA_SQLITE_DB (':memory:' for a throwaway database).
+    `call(name)` wraps every query, for metrics and tracing.
+    """
+    backend = os.getenv('DATA_BACKEND', 'supabase').lower()
+    if backend not in DATA_BACKENDS:
+        # Not a fallback: a typo here must not point a load test at the production database.
+        raise ValueError(f"DATA_BACKEND must be one of {', '.join(DATA_BACKENDS)}, not '{backend}'.")
+    if backend == 'sqlite':
+        db_path = os.getenv('DATA_SQLITE_DB', os.path.join('cache', 'data.sqlite3'))
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        logging.info(f"Using the local SQLite data backend at {db_path}.")
+        repositories = sqlite_repositories(db_path, call)
+    else:
+        repositories = supabase_repositories(supabase_client, call)
+    return memoized(repositories, memo) if memo is not None else repositories
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResumeExtractionCache:
+    """
+    Content-addressed cache for parsed resumes.
+
+    Entries are keyed by a hash of the raw PDF bytes plus the extraction prompt
+    version, so a re-upload of the exact same file never reaches the LLM again.
+    A small in-process LRU sits in front of a SQLite file that is shared by every
+    worker on the host and survives restarts.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 256, max_db_entries: int = 20000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_ready = False
+
+    @staticmethod
+    def make_key(file_content: bytes, prompt_version: str) -> str:
+        """Builds the cache key for a PDF upload under a given prompt version."""
+        digest = hashlib.sha256(file_content).hexdigest()
+        return f"{prompt_version}:{digest}"
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._db_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS resume_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_resume_cache_last_used ON resume_cache(last_used)")
+            conn.commit()
+            self._db_ready = True
+        return conn
+
+    def _remember(self, key: str, payload: str):
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Returns a fresh copy of the cached entry, or None on a miss."""
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+        if payload is not None:
+            return json.loads(payload)
+
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute("SELECT value FROM resume_cache WHERE key = ?", (key,)).fetchone()
+                    if row is None:
+                        return None
+                    conn.execute("UPDATE resume_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Resume cache lookup failed, treating as miss: {e}")
+            return None
+
+        self._remember(key, row[0])
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict):
+        """Stores an entry in both tiers. Storage failures are logged and ignored."""
+        payload = json.dumps(value)
+        self._remember(key, payload)
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO resume_cache (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                        (key, payload, now, now)
+                    )
+                    # Keep the persistent tier bounded by evicting the least recently used rows.
+                    conn.execute(
+                        "DELETE FROM resume_cache WHERE key IN ("
+                        "SELECT key FROM resume_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_db_entries,)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not persist resume cache entry: {e}")
+
+    def clear(self):
+        """Drops every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM resume_cache")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not clear resume cache: {e}")
+
+
+def create_resume_cache() -> ResumeExtractionCache:
+    """Builds the cache from environment settings."""
+    db_path = os.getenv('RESUME_CACHE_DB', os.path.join('cache', 'resume_cache.sqlite3'))
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return ResumeExtractionCache(
+        db_path,
+        max_entries=int(os.getenv('RESUME_CACHE_SIZE', 256)),
+        max_db_entries=int(os.getenv('RESUME_CACHE_DB_SIZE', 20000))
+    )
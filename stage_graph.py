@@ -0,0 +1,114 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+
+class StageGraph:
+    """
+    Runs the stages of a pipeline on a thread pool, starting each stage as soon as its
+    dependencies have finished.
+
+    Each stage function receives a dict with the results of its dependencies. Stages marked
+    `speculative` start immediately but are only waited for if the caller asks for their result;
+    `discard()` cancels them (or ignores their result if they are already running).
+    Speculative stages must not be dependencies of other stages.
+
+    Stages run inside a copy of the caller's context, so Flask's request context stays available.
+    """
+
+    def __init__(self, name: str, max_workers: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.timings = {}
+        self._stages = {}
+        self._futures = {}
+        self._discarded = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._started_at = None
+
+    def add(self, name: str, fn: Callable[[dict], object], deps: Iterable[str] = (), speculative: bool = False):
+        deps = tuple(deps)
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'. Add dependencies first.")
+            if self._stages[dep]['speculative']:
+                raise ValueError(f"Stage '{name}' cannot depend on speculative stage '{dep}'.")
+        self._stages[name] = {'fn': fn, 'deps': deps, 'speculative': speculative}
+        return self
+
+    def _run_stage(self, name: str):
+        stage = self._stages[name]
+        # Dependencies were submitted first, so they already hold a pool thread; waiting here cannot deadlock.
+        inputs = {dep: self._futures[dep].result() for dep in stage['deps']}
+        start = time.perf_counter()
+        try:
+            return stage['fn'](inputs)
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.timings[name] = {
+                    'start_ms': round((start - self._started_at) * 1000, 1),
+                    'duration_ms': round((end - start) * 1000, 1),
+                }
+
+    def start(self):
+        """Submits every stage. Stages are submitted in the order they were added."""
+        self._started_at = time.perf_counter()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers or max(1, len(self._stages)),
+            thread_name_prefix=f"{self.name}-stage"
+        )
+        for name in self._stages:
+            context = contextvars.copy_context()
+            self._futures[name] = self._executor.submit(context.run, self._run_stage, name)
+        return self
+
+    def result(self, name: str):
+        """Blocks until a stage finishes and returns its result (re-raising its exception)."""
+        return self._futures[name].result()
+
+    def discard(self, name: str):
+        """Drops a speculative stage whose result is not needed."""
+        future = self._futures.get(name)
+        if future is None:
+            return
+        self._discarded.add(name)
+        if future.cancel():
+            logging.info(f"[{self.name}] Speculative stage '{name}' cancelled before it started.")
+        else:
+            logging.info(f"[{self.name}] Speculative stage '{name}' result discarded.")
+
+    def close(self):
+        """Cancels stages that have not started and logs the per-stage timings."""
+        if self._executor is None:
+            return
+        for name, future in self._futures.items():
+            if not future.done() and future.cancel():
+                self._discarded.add(name)
+        # Do not wait for discarded speculative work that is already running.
+        self._executor.shutdown(wait=False)
+        self._executor = None
+
+        total_ms = round((time.perf_counter() - self._started_at) * 1000, 1)
+        with self._lock:
+            timings = dict(self.timings)
+        summary = ', '.join(
+            f"{name}={timing['duration_ms']}ms@{timing['start_ms']}ms" + (" (discarded)" if name in self._discarded else "")
+            for name, timing in sorted(timings.items(), key=lambda item: item[1]['start_ms'])
+        )
+        serial_ms = round(sum(timing['duration_ms'] for name, timing in timings.items() if name not in self._discarded), 1)
+        logging.info(f"[{self.name}] Stage timings: {summary}. Wall time {total_ms}ms vs {serial_ms}ms if run serially.")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            for future in self._futures.values():
+                future.cancel()
+        self.close()
+        return False
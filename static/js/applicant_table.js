@@ -0,0 +1,172 @@
+// Applicant tables on the HR dashboard. Each `.applicant-table` loads its job's applicants from
+// its data-applicants-url page by page when first opened; clicking a column header re-sorts on the
+// server, and a row's full analysis is fetched from data-details-url only when it is expanded.
+(function() {
+    function element(tag, attributes, ...children) {
+        const node = document.createElement(tag);
+        Object.entries(attributes || {}).forEach(([name, value]) => {
+            if (name === 'className') {
+                node.className = value;
+            } else {
+                node.setAttribute(name, value);
+            }
+        });
+        children.flat().forEach(child => {
+            if (child !== null && child !== undefined) {
+                node.append(child instanceof Node ? child : String(child));
+            }
+        });
+        return node;
+    }
+
+    function section(title, ...children) {
+        return element('div', { className: 'detail-section' }, element('h5', {}, title), ...children);
+    }
+
+    function field(label, value) {
+        return element('p', {}, element('strong', {}, `${label}: `), value);
+    }
+
+    function renderDetails(details) {
+        const info = details.extracted_info || {};
+        const knockout = details.knockout_analysis;
+        const parts = [
+            section(`AI Evaluation (${details.match_score ?? 'N/A'}%)`, element('p', {}, details.eligibility_reason || 'N/A')),
+        ];
+        if (knockout) {
+            parts.push(section(`Knockout Analysis (${knockout.score}%)`,
+                field('Result', knockout.passed ? 'Passed' : 'Failed'),
+                field('Reason', knockout.reason)));
+        }
+        parts.push(section('Exam Status', details.exam_taken
+            ? [field('Taken', 'Yes'), field('Score', details.exam_score ?? 'N/A')]
+            : field('Taken', 'No')));
+
+        const resume = [];
+        if (info.skills && info.skills.length) {
+            resume.push(field('Skills', info.skills.join(', ')));
+        }
+        if (info.experience && info.experience.length) {
+            resume.push(element('p', {}, element('strong', {}, 'Experience:')),
+                element('ul', {}, info.experience.map(exp => element('li', {}, `${exp.title} at ${exp.location} (${exp.duration})`))));
+        }
+        if (info.education && info.education.length) {
+            resume.push(element('p', {}, element('strong', {}, 'Education:')),
+                element('ul', {}, info.education.map(edu => element('li', {}, `${edu.degree} at ${edu.university}`))));
+        }
+        if (info.projects && info.projects.length) {
+            resume.push(element('p', {}, element('strong', {}, 'Projects:')),
+                element('ul', {}, info.projects.map(project => element('li', {}, `${project.title} `,
+                    element('a', { href: project.insights_url, className: 'text-link' }, 'View Insights')))));
+        }
+        parts.push(section('Extracted Resume', resume));
+        return parts;
+    }
+
+    function setupTable(table) {
+        const toggle = table.querySelector('.applicants-toggle');
+        const body = table.querySelector('.applicant-table-body');
+        const rows = table.querySelector('tbody');
+        const pageLabel = table.querySelector('.applicant-page-label');
+        const previous = table.querySelector('[data-page="prev"]');
+        const next = table.querySelector('[data-page="next"]');
+        const approveUrl = table.dataset.approveUrl;
+        const detailsUrl = table.dataset.detailsUrl;
+        const state = { sort: 'match_score', order: 'desc', page: 1, loaded: false, loading: false };
+
+        async function load() {
+            if (state.loading) {
+                return;
+            }
+            state.loading = true;
+            const params = new URLSearchParams({ sort: state.sort, order: state.order, page: state.page, limit: table.dataset.pageSize });
+            try {
+                const response = await fetch(`${table.dataset.applicantsUrl}?${params}`, { headers: { 'Accept': 'application/json' } });
+                const result = await response.json();
+                if (!response.ok) {
+                    throw new Error(result.error || `HTTP ${response.status}`);
+                }
+                rows.replaceChildren(...result.applicants.map(renderRow));
+                if (!result.applicants.length) {
+                    rows.append(element('tr', {}, element('td', { colspan: 5 }, 'No applicants yet.')));
+                }
+                const pages = result.total ? Math.max(1, Math.ceil(result.total / result.limit)) : null;
+                pageLabel.textContent = pages ? `Page ${result.page} of ${pages}` : `Page ${result.page}`;
+                previous.disabled = result.page <= 1;
+                next.disabled = !result.has_more;
+                state.loaded = true;
+            } catch (error) {
+                rows.replaceChildren(element('tr', {}, element('td', { colspan: 5 }, `Could not load applicants: ${error.message}`)));
+            } finally {
+                state.loading = false;
+            }
+        }
+
+        function renderRow(applicant) {
+            let action;
+            if (applicant.status === 'Approved') {
+                action = element('span', { className: 'status-badge status-pass' }, 'Approved');
+            } else {
+                action = element('form', { action: approveUrl.replace('__APPLICATION_ID__', encodeURIComponent(applicant.id)), method: 'POST' },
+                    element('button', { type: 'submit', className: 'btn-approve' }, 'Approve Candidate'));
+            }
+            const expand = element('button', { type: 'button', className: 'btn-copy' }, 'Details');
+            const row = element('tr', {},
+                element('td', {}, element('strong', {}, applicant.name)),
+                element('td', {}, applicant.match_score ?? 'N/A'),
+                element('td', {}, element('span', { className: 'status-badge' }, applicant.status)),
+                element('td', {}, applicant.exam_taken ? (applicant.exam_score ?? 'N/A') : 'Not taken'),
+                element('td', {}, expand, action));
+
+            let detailsRow = null;
+            expand.addEventListener('click', async () => {
+                if (detailsRow && !detailsRow.dataset.failed) {
+                    detailsRow.hidden = !detailsRow.hidden;
+                    return;
+                }
+                if (detailsRow) {
+                    detailsRow.remove();  // retry a failed load
+                }
+                const cell = element('td', { colspan: 5 }, 'Loading...');
+                detailsRow = element('tr', { className: 'applicant-details' }, cell);
+                row.after(detailsRow);
+                try {
+                    const response = await fetch(detailsUrl.replace('__APPLICATION_ID__', encodeURIComponent(applicant.id)));
+                    const details = await response.json();
+                    if (!response.ok) {
+                        throw new Error(details.error || `HTTP ${response.status}`);
+                    }
+                    cell.replaceChildren(...renderDetails(details));
+                } catch (error) {
+                    cell.textContent = `Could not load details: ${error.message}`;
+                    detailsRow.dataset.failed = 'true';
+                }
+            });
+            return row;
+        }
+
+        toggle.addEventListener('click', () => {
+            body.hidden = !body.hidden;
+            toggle.classList.toggle('active', !body.hidden);
+            if (!body.hidden && !state.loaded) {
+                load();
+            }
+        });
+        table.querySelectorAll('th[data-sort]').forEach(header => {
+            header.style.cursor = 'pointer';
+            header.addEventListener('click', () => {
+                const sort = header.dataset.sort;
+                state.order = state.sort === sort && state.order === 'desc' ? 'asc' : 'desc';
+                state.sort = sort;
+                state.page = 1;
+                load();
+            });
+        });
+        previous.addEventListener('click', () => { state.page -= 1; load(); });
+        next.addEventListener('click', () => { state.page += 1; load(); });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('.applicant-table').forEach(setupTable);
+    });
+})();
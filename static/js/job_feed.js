@@ -0,0 +1,66 @@
+// Infinite job listing: fetches /api/jobs pages as the sentinel element scrolls into view.
+//
+//   jobFeed({ container, sentinel, url, pageSize, cursor, fields, render })
+//
+// `cursor` is the next_cursor of a page the server already rendered (omit it to start from the
+// newest job); `render(job)` returns the element to append for one job.
+function jobFeed(options) {
+    const { container, sentinel, url, pageSize, fields, render } = options;
+    let cursor = options.cursor;
+    let finished = options.cursor === null;
+    let loading = false;
+
+    async function loadNextPage() {
+        if (loading || finished) {
+            return;
+        }
+        loading = true;
+        const params = new URLSearchParams({ limit: pageSize });
+        if (fields) {
+            params.set('fields', fields.join(','));
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        try {
+            const response = await fetch(`${url}?${params}`, { headers: { 'Accept': 'application/json' } });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const page = await response.json();
+            page.jobs.forEach(job => container.appendChild(render(job)));
+            cursor = page.next_cursor;
+            finished = !cursor;
+            container.dispatchEvent(new CustomEvent('jobfeed:page', { detail: { count: page.jobs.length, finished } }));
+        } catch (error) {
+            console.error('Could not load jobs:', error);
+            finished = true;
+        } finally {
+            loading = false;
+        }
+        if (finished) {
+            observer.disconnect();
+            sentinel.hidden = true;
+        } else if (isVisible(sentinel)) {
+            // The page did not fill the viewport; keep going without waiting for a scroll.
+            loadNextPage();
+        }
+    }
+
+    function isVisible(element) {
+        const rect = element.getBoundingClientRect();
+        return rect.top < window.innerHeight && rect.bottom >= 0;
+    }
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextPage();
+        }
+    }, { rootMargin: '400px 0px' });
+
+    if (finished) {
+        sentinel.hidden = true;
+    } else {
+        observer.observe(sentinel);
+    }
+}
@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Optional
+
+
+class TaskQueue:
+    """
+    Durable, SQLite-backed task queue shared by the web workers and the background workers.
+
+    Tasks move through queued -> running -> completed/failed. A running task holds a lease;
+    if its worker dies, the lease expires and another worker picks the task up again.
+    Handlers can record checkpoints so that a retried task skips side effects it already performed.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: int = 600, max_attempts: int = 3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._db_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._db_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, stage TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "checkpoint TEXT NOT NULL DEFAULT '{}', result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, lease_expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks(status, created_at)")
+            self._db_ready = True
+        return conn
+
+    @staticmethod
+    def _row_to_task(row: sqlite3.Row) -> dict:
+        task = dict(row)
+        task['payload'] = json.loads(task['payload'])
+        task['checkpoint'] = json.loads(task['checkpoint'] or '{}')
+        task['result'] = json.loads(task['result']) if task['result'] else None
+        return task
+
+    def enqueue(self, kind: str, payload: dict, task_id: Optional[str] = None) -> str:
+        """Persists a new task and returns its id."""
+        task_id = task_id or str(uuid.uuid4())
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO tasks (id, kind, payload, status, stage, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', 'queued', ?, ?)",
+                (task_id, kind, json.dumps(payload), now, now)
+            )
+        finally:
+            conn.close()
+        return task_id
+
+    def claim(self) -> Optional[dict]:
+        """Atomically claims the oldest runnable task (queued, or running with an expired lease)."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Tasks whose workers died too many times are given up on instead of looping forever.
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', error = 'Worker lost too many times.', updated_at = ? "
+                "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'running', attempts = attempts + 1, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (now + self.lease_seconds, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        task = self._row_to_task(row)
+        task['status'] = 'running'
+        task['attempts'] += 1
+        return task
+
+    def _update(self, task_id: str, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        conn = self._connect()
+        try:
+            conn.execute(f"UPDATE tasks SET {assignments} WHERE id = ?", (*fields.values(), task_id))
+        finally:
+            conn.close()
+
+    def set_stage(self, task_id: str, stage: str):
+        """Records the stage a running task has reached and renews its lease."""
+        self._update(task_id, stage=stage, lease_expires_at=time.time() + self.lease_seconds)
+
+    def save_checkpoint(self, task_id: str, checkpoint: dict):
+        """Stores handler progress that must survive a retry."""
+        self._update(task_id, checkpoint=json.dumps(checkpoint))
+
+    def complete(self, task_id: str, result: dict):
+        self._update(task_id, status='completed', stage='completed', result=json.dumps(result), lease_expires_at=None)
+
+    def fail(self, task_id: str, error: str, result: Optional[dict] = None):
+        self._update(
+            task_id, status='failed', stage='failed', error=error,
+            result=json.dumps(result) if result is not None else None, lease_expires_at=None
+        )
+
+    def get(self, task_id: str) -> Optional[dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_task(row) if row else None
+
+
+def create_task_queue() -> TaskQueue:
+    """Builds the queue from environment settings."""
+    db_path = os.getenv('TASK_QUEUE_DB', os.path.join('cache', 'task_queue.sqlite3'))
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return TaskQueue(
+        db_path,
+        lease_seconds=int(os.getenv('TASK_LEASE_SECONDS', 600)),
+        max_attempts=int(os.getenv('TASK_MAX_ATTEMPTS', 3))
+    )
+
+
+def run_worker(queue: TaskQueue, handlers: dict, poll_interval: float = 1.0, stop_after_idle: Optional[float] = None):
+    """
+    Claims and runs tasks until interrupted.
+    `handlers` maps a task kind to a callable taking the claimed task dict.
+    Handlers report their own outcome through queue.complete/queue.fail;
+    an exception escaping a handler marks the task as failed.
+    """
+    idle_since = time.time()
+    while True:
+        task = queue.claim()
+        if task is None:
+            if stop_after_idle is not None and time.time() - idle_since >= stop_after_idle:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        idle_since = time.time()
+        handler = handlers.get(task['kind'])
+        if handler is None:
+            queue.fail(task['id'], f"No handler registered for task kind '{task['kind']}'.")
+            continue
+
+        logging.info(f"Worker {os.getpid()} running task {task['id']} ({task['kind']}, attempt {task['attempts']}).")
+        try:
+            handler(task)
+        except Exception as e:
+            logging.error(f"Task {task['id']} failed: {e}", exc_info=True)
+            queue.fail(task['id'], str(e))
@@ -0,0 +1,204 @@
+import sqlite3
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from auth_tokens import RefreshLedger, TokenError, TokenExpired, TokenVerifier
+
+SUPABASE_URL = 'https://project.supabase.co'
+ISSUER = f"{SUPABASE_URL}/auth/v1"
+SECRET = 'test-jwt-secret-that-is-long-enough-for-hs256'
+
+
+def make_token(secret=SECRET, algorithm='HS256', headers=None, **overrides):
+    claims = {'sub': 'user-1', 'aud': 'authenticated', 'iss': ISSUER, 'exp': int(time.time()) + 3600}
+    claims.update(overrides)
+    return jwt.encode({key: value for key, value in claims.items() if value is not None}, secret,
+                      algorithm=algorithm, headers=headers)
+
+
+class RemoteUsers:
+    """Stands in for Supabase's auth.get_user and records the tokens it was asked about."""
+
+    def __init__(self, user_id='user-1'):
+        self.user_id = user_id
+        self.calls = []
+
+    def __call__(self, token):
+        self.calls.append(token)
+        return self.user_id
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return RefreshLedger(str(tmp_path / 'auth_refresh.sqlite3'))
+
+
+@pytest.fixture
+def remote():
+    return RemoteUsers()
+
+
+@pytest.fixture
+def verifier(ledger, remote):
+    return TokenVerifier(SUPABASE_URL, 'anon-key', remote, ledger, jwt_secret=SECRET)
+
+
+def test_valid_hs256_token_is_verified_locally(verifier, remote):
+    claims = verifier.verify(make_token())
+    assert claims['sub'] == 'user-1'
+    assert remote.calls == []
+
+
+def test_expired_token_raises_token_expired(verifier, remote):
+    with pytest.raises(TokenExpired):
+        verifier.verify(make_token(exp=int(time.time()) - 10))
+    assert remote.calls == []
+
+
+def test_bad_signature_is_rejected(verifier, remote):
+    with pytest.raises(TokenError) as raised:
+        verifier.verify(make_token(secret='some-other-secret-that-is-long-enough-too'))
+    assert not isinstance(raised.value, TokenExpired)
+    assert remote.calls == []
+
+
+@pytest.mark.parametrize('claims', [
+    {'aud': 'anon'},
+    {'aud': None},
+    {'iss': 'https://other-project.supabase.co/auth/v1'},
+    {'iss': None},
+])
+def test_wrong_audience_or_issuer_is_rejected(verifier, claims):
+    with pytest.raises(TokenError):
+        verifier.verify(make_token(**claims))
+
+
+def test_rejected_token_is_not_cached(verifier):
+    token = make_token(aud='anon')
+    for _ in range(2):
+        with pytest.raises(TokenError):
+            verifier.verify(token)
+
+
+class StaticJWKS:
+    """A PyJWKClient that always returns one key."""
+
+    def __init__(self, public_key):
+        self.key = jwt.PyJWK.from_dict({**jwt.algorithms.RSAAlgorithm.to_jwk(public_key, as_dict=True),
+                                        'alg': 'RS256', 'kid': 'key-1'})
+        self.calls = 0
+
+    def get_signing_key_from_jwt(self, token):
+        self.calls += 1
+        return self.key
+
+
+def test_asymmetric_tokens_are_checked_against_the_jwks(verifier, remote):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwks = verifier._jwks_client = StaticJWKS(private_key.public_key())
+
+    assert verifier.verify(make_token(private_key, 'RS256', headers={'kid': 'key-1'}))['sub'] == 'user-1'
+    assert jwks.calls == 1
+
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(TokenError):
+        verifier.verify(make_token(other_key, 'RS256', headers={'kid': 'key-1'}))
+
+    # HS256 tokens never consult the JWKS.
+    verifier.verify(make_token())
+    assert jwks.calls == 2
+    assert remote.calls == []
+
+
+def test_without_a_secret_hs256_tokens_are_checked_remotely(ledger, remote):
+    verifier = TokenVerifier(SUPABASE_URL, 'anon-key', remote, ledger)
+    token = make_token(sub='claimed-user')
+
+    # The subject comes from auth.get_user, not from the unverified token.
+    assert verifier.verify(token)['sub'] == 'user-1'
+    assert remote.calls == [token]
+
+    # Then it is served from the cache.
+    verifier.verify(token)
+    assert remote.calls == [token]
+
+
+def test_remote_check_rejects_unknown_and_expired_tokens(ledger):
+    with pytest.raises(TokenError):
+        TokenVerifier(SUPABASE_URL, 'anon-key', RemoteUsers(None), ledger).verify(make_token())
+
+    remote = RemoteUsers()
+    with pytest.raises(TokenExpired):
+        TokenVerifier(SUPABASE_URL, 'anon-key', remote, ledger).verify(make_token(exp=int(time.time()) - 10))
+    assert remote.calls == []
+
+
+def renewed_session():
+    return {'access_token': make_token(sub='user-1'), 'refresh_token': 'refresh-2'}
+
+
+def test_expired_session_is_renewed_once_across_workers(ledger, remote, monkeypatch):
+    first = TokenVerifier(SUPABASE_URL, 'anon-key', remote, ledger, jwt_secret=SECRET)
+    second = TokenVerifier(SUPABASE_URL, 'anon-key', remote, ledger, jwt_secret=SECRET)
+    renewed = renewed_session()
+    spent = []
+    monkeypatch.setattr(first, '_refresh_remote', lambda token: spent.append(token) or renewed)
+    monkeypatch.setattr(second, '_refresh_remote', lambda token: pytest.fail("refresh token spent twice"))
+    old = {'access_token': make_token(exp=int(time.time()) - 10), 'refresh_token': 'refresh-1'}
+
+    claims, session = first.authenticate(old)
+    assert session == renewed and claims['sub'] == 'user-1'
+    assert spent == ['refresh-1']
+
+    # Another worker seeing the old cookie picks up the renewed session instead of refreshing.
+    claims, session = second.authenticate(old)
+    assert session == renewed
+
+
+def test_renewed_session_replaces_the_old_one_until_discarded(verifier, ledger):
+    renewed = renewed_session()
+    assert ledger.claim('refresh-1')
+    ledger.complete('refresh-1', renewed)
+    old = {'access_token': make_token(), 'refresh_token': 'refresh-1'}
+
+    _, session = verifier.authenticate(old)
+    assert session == renewed
+
+    # Once the new pair is in the cookie the ledger forgets it; the old cookie no longer finds it.
+    verifier.discard_renewal('refresh-1')
+    _, session = verifier.authenticate(old)
+    assert session is old
+
+
+def test_renewed_sessions_are_not_served_after_retention(tmp_path):
+    ledger = RefreshLedger(str(tmp_path / 'auth_refresh.sqlite3'), retention=60)
+    assert ledger.claim('refresh-1')
+    ledger.complete('refresh-1', renewed_session())
+    assert ledger.lookup('refresh-1') is not None
+
+    ledger.retention = 0
+    assert ledger.lookup('refresh-1') is None
+
+
+def test_failed_refresh_releases_the_claim(verifier, ledger, monkeypatch):
+    def refuse(token):
+        raise TokenError("token refresh failed with HTTP 400")
+    monkeypatch.setattr(verifier, '_refresh_remote', refuse)
+    old = {'access_token': make_token(exp=int(time.time()) - 10), 'refresh_token': 'refresh-1'}
+
+    with pytest.raises(TokenError):
+        verifier.authenticate(old)
+    assert ledger.claim('refresh-1')
+
+
+def test_ledger_errors_surface_as_token_errors(tmp_path, remote):
+    # A directory cannot be opened as a database.
+    verifier = TokenVerifier(SUPABASE_URL, 'anon-key', remote, RefreshLedger(str(tmp_path)), jwt_secret=SECRET)
+    with pytest.raises(TokenError) as raised:
+        verifier.authenticate({'access_token': make_token(), 'refresh_token': 'refresh-1'})
+    assert isinstance(raised.value.__cause__, sqlite3.Error)
+
+    verifier.discard_renewal('refresh-1')  # best effort: logs instead of raising
@@ -0,0 +1,130 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import Priority, RateLimitScheduler, llm_priority
+
+MODEL = 'llama-3.1-8b-instant'
+
+
+class FakeClock:
+    """Replaces the scheduler module's `time`: sleeping advances the clock instead of blocking."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def scheduler(tmp_path, clock):
+    return RateLimitScheduler(str(tmp_path / 'rate_limiter.sqlite3'), requests_per_minute=2, tokens_per_minute=600,
+                              max_wait=300)
+
+
+def add_waiter(scheduler, waiter_id, priority, enqueued_at, model=MODEL):
+    """Queues a waiter the way acquire() does, without blocking on it."""
+    conn = scheduler._connect()
+    try:
+        conn.execute("INSERT INTO waiters (id, model, priority, enqueued_at, heartbeat) VALUES (?, ?, ?, ?, ?)",
+                     (waiter_id, model, priority, enqueued_at, enqueued_at))
+    finally:
+        conn.close()
+
+
+def waiter_count(scheduler) -> int:
+    conn = scheduler._connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_calls_within_budget_are_admitted_immediately(scheduler):
+    assert scheduler.acquire(MODEL, 100) == 0
+    assert scheduler.acquire(MODEL, 100) == 0
+    assert waiter_count(scheduler) == 0
+
+
+def test_request_bucket_refills_at_its_rate(scheduler):
+    scheduler.acquire(MODEL, 10)
+    scheduler.acquire(MODEL, 10)
+    # Two requests per minute: the third waits for one request's worth of refill.
+    assert scheduler.acquire(MODEL, 10) == pytest.approx(30, abs=1)
+
+
+def test_token_bucket_refills_at_its_rate(scheduler):
+    scheduler.acquire(MODEL, 600)
+    # 600 tokens per minute: 300 more tokens take 30 seconds to come back.
+    assert scheduler.acquire(MODEL, 300) == pytest.approx(30, abs=1)
+
+
+def test_models_have_separate_budgets(tmp_path, clock):
+    scheduler = RateLimitScheduler(str(tmp_path / 'rate_limiter.sqlite3'), requests_per_minute=1,
+                                   model_limits={'other-model': {'rpm': 1}})
+    scheduler.acquire(MODEL, 10)
+    assert scheduler.acquire('other-model', 10) == 0
+    assert scheduler.limits_for('other-model') == (1.0, 12000.0)
+
+
+def test_head_of_queue_is_admitted_by_priority_then_arrival(tmp_path, clock):
+    # Budget for every call, so only queue order decides.
+    scheduler = RateLimitScheduler(str(tmp_path / 'rate_limiter.sqlite3'), requests_per_minute=100)
+    now = clock.time()
+    add_waiter(scheduler, 'background', Priority.BACKGROUND, now)
+    add_waiter(scheduler, 'hr', Priority.INTERACTIVE_HR, now + 1)
+    add_waiter(scheduler, 'candidate-late', Priority.INTERACTIVE_CANDIDATE, now + 3)
+    add_waiter(scheduler, 'candidate-early', Priority.INTERACTIVE_CANDIDATE, now + 2)
+
+    admitted = []
+    for _ in range(4):
+        for waiter_id in ('background', 'hr', 'candidate-late', 'candidate-early'):
+            if waiter_id not in admitted and scheduler._try_admit(waiter_id, MODEL, 10, clock.time()) == 0:
+                admitted.append(waiter_id)
+    assert admitted == ['candidate-early', 'candidate-late', 'hr', 'background']
+
+
+def test_waiter_behind_the_head_is_held_back(scheduler, clock):
+    add_waiter(scheduler, 'candidate', Priority.INTERACTIVE_CANDIDATE, clock.time())
+    add_waiter(scheduler, 'background', Priority.BACKGROUND, clock.time())
+    assert scheduler._try_admit('background', MODEL, 10, clock.time()) > 0
+    assert scheduler._try_admit('candidate', MODEL, 10, clock.time()) == 0
+    assert scheduler._try_admit('background', MODEL, 10, clock.time()) == 0
+
+
+def test_abandoned_waiters_do_not_block_the_queue(scheduler, clock):
+    add_waiter(scheduler, 'dead-process', Priority.INTERACTIVE_CANDIDATE, clock.time())
+    clock.sleep(31)
+    with llm_priority(Priority.BACKGROUND):
+        assert scheduler.acquire(MODEL, 10) == 0
+    assert waiter_count(scheduler) == 0
+
+
+def test_penalized_model_is_held_back(scheduler, clock):
+    scheduler.penalize(MODEL, 45)
+    waited = scheduler.acquire(MODEL, 10)
+    assert waited >= 45
+    # Other models keep their own budget.
+    assert scheduler.acquire('other-model', 10) == 0
+
+
+def test_max_wait_lets_the_call_through(tmp_path, clock):
+    scheduler = RateLimitScheduler(str(tmp_path / 'rate_limiter.sqlite3'), requests_per_minute=1, max_wait=5)
+    scheduler.acquire(MODEL, 10)
+    assert scheduler.acquire(MODEL, 10) == pytest.approx(5, abs=1)
+    assert waiter_count(scheduler) == 0
+
+
+def test_scheduler_failure_admits_the_call(tmp_path, clock):
+    # A directory cannot be opened as a database.
+    assert RateLimitScheduler(str(tmp_path)).acquire(MODEL, 10) == 0
@@ -0,0 +1,135 @@
+import pytest
+
+import task_queue
+from task_queue import TaskQueue, run_worker
+
+
+class FakeClock:
+    """Replaces the queue module's `time`, so leases expire when a test says so."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(task_queue, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return TaskQueue(str(tmp_path / 'task_queue.sqlite3'), lease_seconds=60, max_attempts=3)
+
+
+def test_claim_and_complete(queue, clock):
+    first = queue.enqueue('candidate_application', {'n': 1})
+    clock.advance(1)
+    queue.enqueue('candidate_application', {'n': 2})
+
+    task = queue.claim()
+    assert task['id'] == first  # oldest first
+    assert task['payload'] == {'n': 1}
+    assert task['status'] == 'running' and task['attempts'] == 1
+
+    queue.complete(first, {'application_id': 'app-1'})
+    stored = queue.get(first)
+    assert stored['status'] == 'completed'
+    assert stored['result'] == {'application_id': 'app-1'}
+    assert stored['lease_expires_at'] is None
+
+    assert queue.claim()['payload'] == {'n': 2}
+    assert queue.claim() is None
+
+
+def test_running_task_is_not_claimed_twice_while_its_lease_holds(queue, clock):
+    queue.enqueue('candidate_application', {})
+    assert queue.claim() is not None
+    clock.advance(59)
+    assert queue.claim() is None
+
+
+def test_set_stage_renews_the_lease(queue, clock):
+    task_id = queue.enqueue('candidate_application', {})
+    queue.claim()
+    clock.advance(50)
+    queue.set_stage(task_id, 'screening')
+    clock.advance(50)
+    assert queue.claim() is None
+    assert queue.get(task_id)['stage'] == 'screening'
+
+
+def test_expired_lease_is_reclaimed_with_its_checkpoint(queue, clock):
+    task_id = queue.enqueue('candidate_application', {})
+    queue.claim()
+    queue.save_checkpoint(task_id, {'resume_url': 'https://storage/resume.pdf'})
+    clock.advance(61)  # the worker died without renewing its lease
+
+    task = queue.claim()
+    assert task['id'] == task_id
+    assert task['attempts'] == 2
+    assert task['checkpoint'] == {'resume_url': 'https://storage/resume.pdf'}
+
+
+def test_task_is_failed_after_max_attempts(queue, clock):
+    task_id = queue.enqueue('candidate_application', {})
+    for attempt in range(1, 4):
+        task = queue.claim()
+        assert task['attempts'] == attempt
+        clock.advance(61)
+
+    assert queue.claim() is None
+    stored = queue.get(task_id)
+    assert stored['status'] == 'failed'
+    assert stored['error'] == 'Worker lost too many times.'
+
+
+def test_run_worker_marks_a_raising_handler_failed(queue):
+    task_id = queue.enqueue('candidate_application', {})
+
+    def handler(task):
+        raise RuntimeError("resume parser crashed")
+
+    run_worker(queue, {'candidate_application': handler}, poll_interval=1, stop_after_idle=0)
+    stored = queue.get(task_id)
+    assert stored['status'] == 'failed'
+    assert stored['error'] == 'resume parser crashed'
+
+
+def test_run_worker_fails_tasks_without_a_handler(queue):
+    task_id = queue.enqueue('unknown_kind', {})
+    run_worker(queue, {}, poll_interval=1, stop_after_idle=0)
+    assert queue.get(task_id)['status'] == 'failed'
+
+
+def test_retried_task_skips_checkpointed_side_effects(queue, clock):
+    task_id = queue.enqueue('candidate_application', {'email': 'c@example.com'})
+    sent = []
+
+    def handler(task):
+        checkpoint = dict(task['checkpoint'])
+        if not checkpoint.get('notified'):
+            sent.append(task['payload']['email'])
+            checkpoint['notified'] = True
+            queue.save_checkpoint(task['id'], checkpoint)
+        queue.complete(task['id'], {'attempts': task['attempts']})
+
+    # First attempt: the notification goes out, then the worker dies before completing.
+    task = queue.claim()
+    sent.append(task['payload']['email'])
+    queue.save_checkpoint(task_id, {'notified': True})
+    clock.advance(61)
+
+    run_worker(queue, {'candidate_application': handler}, poll_interval=1, stop_after_idle=0)
+    assert sent == ['c@example.com']
+    assert queue.get(task_id)['result'] == {'attempts': 2}
@@ -0,0 +1,155 @@
+"""
+Lightweight per-request span tracing.
+
+A Trace lives in a context variable for the duration of a request (or background task). Code
+wraps interesting work in `span(name)`; spans started in StageGraph threads land in the same trace
+because those threads run in a copy of the request context. When no trace is active, `span()`
+returns a shared no-op context manager, so a disabled tracer costs one ContextVar lookup.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+_SERVER_TIMING_NAME = re.compile(r'[^A-Za-z0-9_.\-]')
+MAX_SERVER_TIMING_SPANS = 40
+
+
+class Trace:
+    __slots__ = ('name', 'started', 'started_at', 'spans', 'attributes')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.spans = []  # (name, start_ms, duration_ms, thread); list.append is atomic across threads
+        self.attributes = {}
+
+    def add(self, name: str, start: float, duration: float):
+        self.spans.append((name, (start - self.started) * 1000, duration * 1000, threading.current_thread().name))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self, total_ms: float) -> str:
+        """The spans as a Server-Timing header value, in start order, plus the total."""
+        entries = []
+        for index, (name, start_ms, duration_ms, _) in enumerate(sorted(self.spans, key=lambda s: s[1])):
+            if index >= MAX_SERVER_TIMING_SPANS:
+                break
+            entries.append(f'{_SERVER_TIMING_NAME.sub("_", name)};dur={duration_ms:.1f};desc="@{start_ms:.0f}ms"')
+        entries.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(entries)
+
+    def to_dict(self, total_ms: float) -> dict:
+        return {
+            'trace': self.name,
+            'started_at': self.started_at,
+            'total_ms': round(total_ms, 1),
+            **self.attributes,
+            'spans': [
+                {'name': name, 'start_ms': round(start_ms, 1), 'duration_ms': round(duration_ms, 1), 'thread': thread}
+                for name, start_ms, duration_ms, thread in sorted(self.spans, key=lambda s: s[1])
+            ],
+        }
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.add(self.name if exc_type is None else f"{self.name}.error", self.start, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """Times the enclosed block as a span of the current trace (a no-op when tracing is off)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+def record_span(name: str, duration: float):
+    """Adds a span that just finished and took `duration` seconds (for callback-style instrumentation)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        end = time.perf_counter()
+        trace.add(name, end - duration, duration)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def start_trace(name: str):
+    """Starts a trace in the current context. Returns (trace, token) for finish_trace()."""
+    trace = Trace(name)
+    return trace, _current_trace.set(trace)
+
+
+class SlowTraceLog:
+    """Appends traces slower than `threshold_ms` to a size-rotated JSONL file."""
+
+    def __init__(self, path: str, threshold_ms: float, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self._logger = logging.getLogger('jobstir.slow_requests')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if not self._logger.handlers:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(handler)
+
+    def finish(self, trace: Trace, token) -> float:
+        """Ends the trace, logs it if it was slow, and returns its total duration in ms."""
+        _current_trace.reset(token)
+        total_ms = trace.elapsed_ms()
+        if total_ms >= self.threshold_ms:
+            self._logger.info(json.dumps(trace.to_dict(total_ms), default=str))
+        return total_ms
+
+
+def create_slow_trace_log() -> Optional[SlowTraceLog]:
+    """Builds the tracer's slow log from environment settings, or returns None if tracing is disabled."""
+    if os.getenv('TRACING_ENABLED', 'False').lower() != 'true':
+        return None
+    return SlowTraceLog(
+        os.getenv('SLOW_REQUEST_LOG', os.path.join('logs', 'slow_requests.jsonl')),
+        threshold_ms=float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 5000)),
+        max_bytes=int(os.getenv('SLOW_REQUEST_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backup_count=int(os.getenv('SLOW_REQUEST_LOG_BACKUPS', 5)),
+    )
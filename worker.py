@@ -0,0 +1,49 @@
+"""
+Background worker for applications accepted with ASYNC_APPLICATIONS=true.
+
+Usage:
+    python worker.py --processes 2
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+
+from task_queue import run_worker
+
+# Write metrics where the web server's /metrics endpoint aggregates them (see gunicorn.conf.py).
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(os.getcwd(), 'cache', 'prometheus'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def _work(poll_interval: float):
+    # Import inside the child so every process builds its own clients and connections.
+    from app import application_queue, TASK_HANDLERS
+    run_worker(application_queue, TASK_HANDLERS, poll_interval=poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run JobStir background task workers.")
+    parser.add_argument('--processes', type=int, default=1, help="Number of worker processes to start.")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.processes <= 1:
+        _work(args.poll_interval)
+        return
+
+    workers = [
+        multiprocessing.Process(target=_work, args=(args.poll_interval,), daemon=False)
+        for _ in range(args.processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(process.pid)
+
+
+if __name__ == '__main__':
+    main()
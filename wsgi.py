@@ -0,0 +1,9 @@
+"""
+WSGI entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+Set WARM_UP=true to load the LLM SDKs, PyMuPDF, the Supabase client and the embedding model in
+the background once a worker starts, instead of on its first requests.
+"""
+from app import create_app
+
+app = create_app()